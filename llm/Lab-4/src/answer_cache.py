@@ -0,0 +1,163 @@
+"""Cache of QA answers keyed by question, document and model.
+
+Questions are normalised before keying (Unicode NFC, case folding,
+per-language punctuation stripping, whitespace folding) so trivially
+different phrasings of a repeated question share an entry. The document
+is identified by a content hash and the model by its checkpoint, backend
+and decoding settings, so an edited PDF or a different model never
+serves a stale answer.
+
+Entries live in an in-memory LRU with a TTL and, optionally, in a SQLite
+file that survives restarts.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import string
+import threading
+import time
+import unicodedata
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+# Punctuation dropped from questions before keying, per language
+QUESTION_PUNCTUATION = {
+    'en': string.punctuation + "“”‘’…",
+    'fr': string.punctuation + "“”‘’«»…",
+    'mr': string.punctuation + "“”‘’…।॥"
+}
+
+def normalize_question(question, language):
+    """Question text reduced to what should not change its answer"""
+    text = unicodedata.normalize('NFC', question).casefold()
+    punctuation = QUESTION_PUNCTUATION.get(language, string.punctuation)
+    text = text.translate({ord(char): " " for char in punctuation})
+    return " ".join(text.split())
+
+def document_hash(context):
+    """Content hash identifying a prepared document (or retrieved passages)"""
+    return hashlib.sha256(context.encode('utf-8')).hexdigest()
+
+def answer_key(question, language, context_hash, model_identity):
+    """Cache key of one answer"""
+    parts = [language, normalize_question(question, language), context_hash, model_identity]
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+class AnswerCache:
+    """In-memory LRU with TTL over an optional SQLite tier.
+
+    Safe to share between threads. Entries remember the hash of the
+    document they were answered from, so invalidate_document (or
+    track_document, when a source file's content changes) drops every
+    answer about an old version of a document.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=DEFAULT_TTL_SECONDS, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (answer, document hash, expiry time)
+        self.sources = {}  # source -> document hash, when there is no SQLite tier
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0}
+        self._lock = threading.Lock()
+
+        self.db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS answers "
+                            "(key TEXT PRIMARY KEY, document_hash TEXT, answer TEXT, created REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS answers_document ON answers (document_hash)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS documents (source TEXT PRIMARY KEY, document_hash TEXT)")
+
+    def get(self, key):
+        """The cached answer for key, or None"""
+        now = time.time()
+        with self._lock:
+            if key in self.entries:
+                answer, _, expires = self.entries[key]
+                if expires > now:
+                    self.entries.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return answer
+                del self.entries[key]
+                self.stats['expired'] += 1
+
+            if self.db is not None:
+                row = self.db.execute("SELECT answer, document_hash, created FROM answers WHERE key = ?",
+                                      (key,)).fetchone()
+                if row is not None:
+                    answer, doc_hash, created = row
+                    if created + self.ttl_seconds > now:
+                        self.stats['disk_hits'] += 1
+                        self._remember(key, answer, doc_hash, created + self.ttl_seconds)
+                        return answer
+                    self.db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self.stats['expired'] += 1
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, answer, doc_hash):
+        now = time.time()
+        with self._lock:
+            self._remember(key, answer, doc_hash, now + self.ttl_seconds)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                                (key, doc_hash, answer, now))
+
+    def _remember(self, key, answer, doc_hash, expires):
+        self.entries[key] = (answer, doc_hash, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate_document(self, doc_hash):
+        """Drop every answer about one version of a document"""
+        with self._lock:
+            stale = [key for key, (_, entry_hash, _) in self.entries.items() if entry_hash == doc_hash]
+            for key in stale:
+                del self.entries[key]
+            removed = len(stale)
+            if self.db is not None:
+                removed = max(removed, self.db.execute("DELETE FROM answers WHERE document_hash = ?",
+                                                       (doc_hash,)).rowcount)
+            self.stats['invalidated'] += removed
+        return removed
+
+    def track_document(self, source, doc_hash):
+        """Record the current content hash of a source (e.g. a PDF and context mode).
+
+        When the source previously had a different hash, the answers about
+        the old version are invalidated. Returns True in that case.
+        """
+        with self._lock:
+            if self.db is not None:
+                row = self.db.execute("SELECT document_hash FROM documents WHERE source = ?",
+                                      (source,)).fetchone()
+                previous = row[0] if row else None
+                self.db.execute("INSERT OR REPLACE INTO documents VALUES (?, ?)", (source, doc_hash))
+            else:
+                previous = self.sources.get(source)
+                self.sources[source] = doc_hash
+
+        if previous is not None and previous != doc_hash:
+            self.invalidate_document(previous)
+            return True
+        return False
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM answers")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['entries'] = len(self.entries)
+        return stats
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,125 @@
+"""Speak an answer sentence by sentence while it is still being generated.
+
+MultilingualQASystem.stream_answer yields FLAN-T5's answer a few tokens
+at a time. iter_sentences cuts that stream into sentences as soon as each
+one ends, and stream_spoken_answer synthesizes every sentence the moment
+it is complete, so the first audio is ready after one sentence of
+generation and one short TTS call instead of after the whole answer.
+
+Segments come out in answer order as separate files next to the answer's
+output path; concatenate_audio joins them into one file when a single
+answer file is wanted.
+"""
+from lexical_qa import SENTENCE_BOUNDARY
+from sample_questions import LANGUAGE_CODES
+import os
+import shutil
+import time
+import wave
+
+# Sentences shorter than this are joined to the next one rather than
+# synthesized on their own (abbreviations, list markers, "Yes.")
+MIN_SENTENCE_CHARS = 20
+
+def iter_sentences(chunks, min_chars=MIN_SENTENCE_CHARS):
+    """Yield the sentences of a stream of text chunks as soon as each one ends.
+
+    A sentence counts as ended once the whitespace after its final
+    punctuation has arrived; whatever is left when the stream ends is
+    yielded as the last sentence.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for boundary in SENTENCE_BOUNDARY.finditer(buffer):
+            sentence = buffer[start:boundary.start()].strip()
+            if len(sentence) >= min_chars:
+                yield sentence
+                start = boundary.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+def segment_path(output_path, index):
+    """Path of one sentence's audio next to the answer's output path"""
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}_part{index + 1}{extension}"
+
+def synthesize_segment(speech_processor, sentence, language, output_path):
+    """Speak one sentence; the path actually written (mp3, or wav from offline TTS) or None"""
+    if not speech_processor.text_to_speech(sentence, LANGUAGE_CODES[language], output_path):
+        return None
+    wav_path = os.path.splitext(output_path)[0] + '.wav'
+    return output_path if os.path.exists(output_path) else wav_path
+
+def segment_formats(paths):
+    """File extensions among the segments' audio paths"""
+    return {os.path.splitext(path)[1].lower() for path in paths}
+
+def stream_spoken_answer(chunks, speech_processor, language, output_path, combined=True):
+    """Yield one segment dict per sentence of a streamed answer, in order.
+
+    Each segment has the sentence's index, text, audio_path (None when
+    TTS failed) and ready_s, the seconds from the call until its audio
+    was written. With combined=True the segments are also joined into
+    output_path once the answer is complete, unless some sentences fell
+    back to another engine's format (mp3 and wav segments are not joined).
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    audio_paths = []
+    for index, sentence in enumerate(iter_sentences(chunks)):
+        audio_path = synthesize_segment(speech_processor, sentence, language, segment_path(output_path, index))
+        audio_paths.append(audio_path)
+        yield {'index': index, 'text': sentence, 'audio_path': audio_path,
+               'ready_s': round(time.perf_counter() - start, 4)}
+
+    if combined and audio_paths and all(audio_paths):
+        if len(segment_formats(audio_paths)) == 1:
+            concatenate_audio(audio_paths, output_path)
+        else:
+            print(f"Not joining {output_path}: TTS fell back to another format for some sentences")
+
+def _skip_id3(data):
+    """MP3 bytes without a leading ID3v2 tag"""
+    if data[:3] != b'ID3' or len(data) < 10:
+        return data
+    size = 0
+    for byte in data[6:10]:  # syncsafe integer, 7 bits per byte
+        size = (size << 7) | (byte & 0x7F)
+    return data[10 + size:]
+
+def concatenate_audio(paths, output_path):
+    """Join mp3 or wav segments into one file and return its path.
+
+    MP3 frames are self-contained, so mp3 segments are joined byte-wise
+    (keeping only the first file's ID3 tag); wav segments must share their
+    format. The extension of output_path follows the segments'.
+    """
+    extensions = segment_formats(paths)
+    if len(extensions) != 1:
+        raise ValueError(f"Cannot join segments of different formats: {sorted(extensions)}")
+    extension = extensions.pop()
+    output_path = os.path.splitext(output_path)[0] + extension
+    if len(paths) == 1:
+        shutil.copyfile(paths[0], output_path)
+        return output_path
+
+    if extension == '.wav':
+        with wave.open(output_path, 'wb') as out:
+            for i, path in enumerate(paths):
+                with wave.open(path, 'rb') as segment:
+                    if i == 0:
+                        out.setparams(segment.getparams())
+                    elif segment.getparams()[:3] != out.getparams()[:3]:
+                        raise ValueError(f"{path} does not match the format of {paths[0]}")
+                    out.writeframes(segment.readframes(segment.getnframes()))
+        return output_path
+
+    with open(output_path, 'wb') as out:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as segment:
+                data = segment.read()
+            out.write(data if i == 0 else _skip_id3(data))
+    return output_path
@@ -0,0 +1,124 @@
+"""Decode, resample and trim audio questions before they reach Whisper.
+
+Clips are decoded once with librosa (soundfile, no ffmpeg subprocess),
+resampled to 16 kHz mono float32, and leading/trailing silence is cut
+with an energy threshold. The result can be cached as a .npy file keyed
+by the audio content hash and is memory-mapped on later runs.
+
+Long recordings can instead be read as a stream of overlapping windows
+(iter_audio_windows) without decoding the whole file at once.
+"""
+import numpy as np
+import os
+import telemetry
+
+# Whisper's expected input rate
+SAMPLE_RATE = 16000
+# Frames quieter than this many dB below the loudest frame count as silence
+TRIM_TOP_DB = 40
+# Audio kept on either side of the detected speech, in seconds
+TRIM_PADDING = 0.2
+
+def decode_audio(path, sample_rate=SAMPLE_RATE):
+    """Decode any librosa-readable file to mono float32 at sample_rate"""
+    import librosa
+
+    audio, _ = librosa.load(path, sr=sample_rate, mono=True, dtype=np.float32)
+    return audio
+
+def trim_silence(audio, top_db=TRIM_TOP_DB, padding=TRIM_PADDING, sample_rate=SAMPLE_RATE,
+                 frame_length=1024, hop_length=256):
+    """Cut leading and trailing frames whose RMS energy is top_db below the peak.
+
+    A little padding is kept around the speech so word onsets are not
+    clipped; a clip with no frame above the threshold is returned as is.
+    """
+    import librosa
+
+    if len(audio) == 0:
+        return audio
+    _, (start, end) = librosa.effects.trim(audio, top_db=top_db, frame_length=frame_length,
+                                           hop_length=hop_length)
+    if end <= start:
+        return audio
+    pad = int(padding * sample_rate)
+    return audio[max(0, start - pad):min(len(audio), end + pad)]
+
+def audio_duration(path):
+    """Length of a file in seconds from its header, or None if soundfile cannot read it"""
+    import soundfile
+
+    try:
+        return soundfile.info(path).duration
+    except Exception:
+        return None
+
+def iter_audio_windows(path, window_seconds=30.0, overlap_seconds=2.0, block_seconds=1.0):
+    """Yield (start_seconds, samples) windows of a file at 16 kHz float32.
+
+    The file is read block by block and resampled as a stream, so at most
+    one window plus one block is held in memory. Consecutive windows share
+    overlap_seconds of audio; the last window may be shorter.
+    """
+    import soundfile
+    import soxr
+
+    window = int(window_seconds * SAMPLE_RATE)
+    step = window - int(overlap_seconds * SAMPLE_RATE)
+    if step <= 0:
+        raise ValueError("overlap_seconds must be shorter than window_seconds")
+
+    with soundfile.SoundFile(path) as f:
+        resampler = soxr.ResampleStream(f.samplerate, SAMPLE_RATE, 1, dtype='float32')
+        block = max(1, int(block_seconds * f.samplerate))
+        buffer = np.zeros(0, dtype=np.float32)
+        offset = 0  # samples dropped from the front of the buffer so far
+        while True:
+            data = f.read(block, dtype='float32', always_2d=True)
+            last = len(data) < block
+            samples = resampler.resample_chunk(data.mean(axis=1), last=last)
+            buffer = np.concatenate([buffer, samples])
+            while len(buffer) >= window:
+                yield offset / SAMPLE_RATE, buffer[:window]
+                buffer = buffer[step:]
+                offset += step
+            if last:
+                break
+
+    # The tail, unless it is only the overlap the previous window already covered
+    if len(buffer) > window - step or (offset == 0 and len(buffer)):
+        yield offset / SAMPLE_RATE, buffer
+
+def _cache_path(cache_dir, file_hash, top_db):
+    trim = f"trim{top_db}" if top_db is not None else "full"
+    return os.path.join(cache_dir, f"{file_hash}_{SAMPLE_RATE}_{trim}.npy")
+
+def preprocess_audio(path, cache_dir=None, file_hash=None, top_db=TRIM_TOP_DB):
+    """Decoded, trimmed audio for a file, ready to pass to Whisper.
+
+    With cache_dir, the array is stored as .npy under the file's content
+    hash (pass file_hash if it is already known) and memory-mapped
+    copy-on-write when it is found there. top_db=None skips trimming.
+    """
+    cache_path = None
+    if cache_dir:
+        if file_hash is None:
+            from speech_processing import audio_file_hash
+            file_hash = audio_file_hash(path)
+        cache_path = _cache_path(cache_dir, file_hash, top_db)
+        if os.path.exists(cache_path):
+            return np.load(cache_path, mmap_mode='c')
+
+    with telemetry.span('audio_preprocessing'):
+        audio = decode_audio(path)
+        if top_db is not None:
+            audio = trim_silence(audio, top_db=top_db)
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, audio)
+        os.replace(tmp_path, cache_path)
+    return audio
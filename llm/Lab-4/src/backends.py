@@ -0,0 +1,163 @@
+import hashlib
+import os
+import torch
+
+BACKENDS = ('eager', 'int8', 'compile', 'onnx')
+
+# Exported / quantized artifacts live under models/<language>/<backend>/<fingerprint>/
+ARTIFACT_DIR = '../models'
+LANGUAGE_DIRS = {'en': 'english', 'mr': 'marathi', 'fr': 'french'}
+
+def artifact_fingerprint(config):
+    """Short hash of the checkpoint and library versions an artifact was built with"""
+    import transformers
+
+    identity = f"{config['name']}|transformers {transformers.__version__}|torch {torch.__version__}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+
+def artifact_path(artifact_dir, language, backend, config):
+    """Directory of a converted model; a different checkpoint or library version gets its own"""
+    return os.path.join(artifact_dir, LANGUAGE_DIRS.get(language, language), backend,
+                        artifact_fingerprint(config))
+
+def load_model(language, config, backend='eager', artifact_dir=ARTIFACT_DIR):
+    """Load the model for a language using the requested inference backend.
+
+    int8 and onnx artifacts are written to disk on first use and loaded
+    directly on later startups, skipping the conversion step.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+    if backend == 'int8':
+        return _load_int8(config, artifact_path(artifact_dir, language, backend, config))
+    if backend == 'onnx':
+        return _load_onnx(config, artifact_path(artifact_dir, language, backend, config))
+
+    model = _load_eager(config)
+    if backend == 'compile':
+        # Compile only the forward pass so generate() keeps working for T5
+        model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+def _load_eager(config):
+    from transformers import AutoModelForSeq2SeqLM, AutoModelForQuestionAnswering
+    
+    model_class = AutoModelForSeq2SeqLM if config['type'] == 'seq2seq' else AutoModelForQuestionAnswering
+    model = model_class.from_pretrained(config['name'])
+    model.eval()
+    return model
+
+def _load_int8(config, path):
+    """Dynamic int8 quantization of all Linear layers, cached as a pickled model"""
+    model_file = os.path.join(path, 'model.pt')
+    if os.path.exists(model_file):
+        print(f"Loading cached int8 model from {model_file}...")
+        model = torch.load(model_file, weights_only=False)
+        model.eval()
+        return model
+
+    print(f"Quantizing {config['label']} to int8...")
+    model = torch.quantization.quantize_dynamic(_load_eager(config), {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(path, exist_ok=True)
+    torch.save(model, model_file)
+    return model
+
+def _load_onnx(config, path):
+    if config['type'] == 'seq2seq':
+        return _load_onnx_seq2seq(config, path)
+
+    model_file = os.path.join(path, 'model.onnx')
+    if not os.path.exists(model_file):
+        print(f"Exporting {config['label']} to ONNX...")
+        _export_qa_onnx(_load_eager(config), model_file)
+    return ONNXQuestionAnsweringModel(model_file)
+
+def _export_qa_onnx(model, model_file):
+    os.makedirs(os.path.dirname(model_file), exist_ok=True)
+    # BERT-style models need segment ids to tell the question from the context
+    input_names = ['input_ids', 'attention_mask']
+    if getattr(model.config, 'type_vocab_size', 1) > 1:
+        input_names.append('token_type_ids')
+    output_names = ['start_logits', 'end_logits']
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + output_names}
+    dummy = tuple(torch.ones(1, 16, dtype=torch.long) for _ in input_names)
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            outputs = self.model(**dict(zip(input_names, inputs)))
+            return outputs.start_logits, outputs.end_logits
+
+    torch.onnx.export(
+        _Wrapper(model),
+        dummy,
+        model_file,
+        input_names=input_names,
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=14
+    )
+
+def _load_onnx_seq2seq(config, path):
+    """Encoder/decoder export via optimum, which also provides generate()"""
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError("The onnx backend for seq2seq models needs 'optimum[onnxruntime]'") from e
+
+    if os.path.exists(os.path.join(path, 'config.json')):
+        return ORTModelForSeq2SeqLM.from_pretrained(path)
+
+    print(f"Exporting {config['label']} to ONNX...")
+    model = ORTModelForSeq2SeqLM.from_pretrained(config['name'], export=True)
+    model.save_pretrained(path)
+    return model
+
+class ONNXQuestionAnsweringModel:
+    """ONNX Runtime session that answers like a transformers QA model"""
+
+    def __init__(self, model_file):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx backend needs 'onnxruntime'") from e
+
+        self.model_file = model_file
+        self.session = onnxruntime.InferenceSession(model_file, providers=['CPUExecutionProvider'])
+        self.input_names = [graph_input.name for graph_input in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        from transformers.modeling_outputs import QuestionAnsweringModelOutput
+        
+        feed = {name: inputs[name].numpy() for name in self.input_names}
+        start_logits, end_logits = self.session.run(['start_logits', 'end_logits'], feed)
+        return QuestionAnsweringModelOutput(
+            start_logits=torch.from_numpy(start_logits),
+            end_logits=torch.from_numpy(end_logits)
+        )
+
+    def eval(self):
+        return self
+
+    def size_mb(self):
+        return os.path.getsize(self.model_file) / (1024 * 1024)
+
+def model_size_mb(model):
+    """Approximate resident size of a model's weights, whatever its backend"""
+    if hasattr(model, 'size_mb'):
+        return model.size_mb()
+    if not hasattr(model, 'state_dict'):
+        return 0.0
+
+    total = 0
+    for value in model.state_dict().values():
+        # Dynamically quantized Linear layers store packed (weight, bias) tuples
+        tensors = value if isinstance(value, tuple) else (value,)
+        for tensor in tensors:
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total / (1024 * 1024)
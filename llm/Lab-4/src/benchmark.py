@@ -0,0 +1,392 @@
+import os
+
+# The benchmark must never touch the network: models, audio and TTS are local
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+from pdf_processing import extract_text_from_pdf, prepare_context, chunk_text
+from retrieval import BM25Index
+from qa_models import MultilingualQASystem
+from speech_processing import SpeechProcessor
+from audio_preprocessing import preprocess_audio
+from sample_questions import SAMPLE_QUESTIONS, LANGUAGE_CODES, PDF_PATHS
+from local_tts_server import start_server
+from telemetry import PeakRSSSampler, percentile
+from pipeline import Stage, run_pipeline
+from cpu_scheduler import CPUScheduler, init_worker, use_budget
+import main as qa_main
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+LANGUAGES = ['en', 'mr', 'fr']
+DEFAULT_OUTPUT = '../results/benchmark.json'
+DEFAULT_BASELINE = '../results/benchmark_baseline.json'
+
+# Per-process components of the scheduling benchmark's pipeline workers
+_worker_state = {}
+
+def measure(func, inputs, warmup=True):
+    """Time func over inputs and summarise latency, throughput and peak RSS"""
+    inputs = list(inputs)
+    if warmup and inputs:
+        func(inputs[0])
+
+    latencies = []
+    with PeakRSSSampler() as rss:
+        started = time.perf_counter()
+        for value in inputs:
+            start = time.perf_counter()
+            func(value)
+            latencies.append(time.perf_counter() - start)
+        total_s = time.perf_counter() - started
+
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_per_s': round(len(latencies) / total_s, 3) if total_s else 0.0,
+        'peak_rss_mb': round(rss.peak_mb, 1)
+    }
+
+def fixture_texts():
+    """Document and question text per language used to build tiny vocabularies"""
+    texts = {}
+    for lang in LANGUAGES:
+        texts[lang] = [extract_text_from_pdf(PDF_PATHS[lang], cache_dir=None)] + SAMPLE_QUESTIONS[lang]
+    return texts
+
+def build_tiny_tokenizer(texts, path, model_type):
+    """Word-level tokenizer trained on the fixture text, saved for AutoTokenizer"""
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    specials = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '</s>']
+    tokenizer = Tokenizer(models.WordLevel(unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.train_from_iterator(texts, trainers.WordLevelTrainer(special_tokens=specials))
+
+    if model_type == 'seq2seq':
+        eos = ('</s>', tokenizer.token_to_id('</s>'))
+        tokenizer.post_processor = processors.TemplateProcessing(
+            single="$A </s>", pair="$A </s> $B:1 </s>:1", special_tokens=[eos]
+        )
+    else:
+        cls, sep = ('[CLS]', tokenizer.token_to_id('[CLS]')), ('[SEP]', tokenizer.token_to_id('[SEP]'))
+        tokenizer.post_processor = processors.TemplateProcessing(
+            single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B:1 [SEP]:1", special_tokens=[cls, sep]
+        )
+
+    # T5 takes no segment ids, so generate() must not be handed any
+    input_names = ['input_ids', 'attention_mask']
+    if model_type != 'seq2seq':
+        input_names.append('token_type_ids')
+    fast = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token='[PAD]', unk_token='[UNK]', cls_token='[CLS]',
+        sep_token='[SEP]', eos_token='</s>', model_max_length=512, model_input_names=input_names
+    )
+    fast.save_pretrained(path)
+    return fast
+
+def build_tiny_models(work_dir, texts):
+    """Randomly initialised miniature versions of the three QA models"""
+    from transformers import (BertConfig, BertForQuestionAnswering, CamembertConfig,
+                              CamembertForQuestionAnswering, T5Config, T5ForConditionalGeneration)
+
+    configs = {}
+    for lang, model_type in [('en', 'seq2seq'), ('mr', 'qa'), ('fr', 'qa')]:
+        path = os.path.join(work_dir, 'models', lang)
+        tokenizer = build_tiny_tokenizer(texts[lang], path, model_type)
+        size = dict(vocab_size=len(tokenizer), pad_token_id=tokenizer.pad_token_id)
+
+        if lang == 'en':
+            model = T5ForConditionalGeneration(T5Config(
+                d_model=64, d_ff=128, d_kv=16, num_layers=2, num_heads=4,
+                eos_token_id=tokenizer.eos_token_id, decoder_start_token_id=tokenizer.pad_token_id, **size
+            ))
+        elif lang == 'mr':
+            model = BertForQuestionAnswering(BertConfig(
+                hidden_size=64, num_hidden_layers=2, num_attention_heads=4, intermediate_size=128,
+                max_position_embeddings=512, **size
+            ))
+        else:
+            # RoBERTa-style position ids start after the padding index
+            model = CamembertForQuestionAnswering(CamembertConfig(
+                hidden_size=64, num_hidden_layers=2, num_attention_heads=4, intermediate_size=128,
+                max_position_embeddings=520, type_vocab_size=2, **size
+            ))
+        model.save_pretrained(path)
+        configs[lang] = {'name': path, 'type': model_type, 'label': f"tiny-{model.config.model_type}"}
+    return configs
+
+def build_tiny_whisper(work_dir):
+    """Randomly initialised Whisper checkpoint loadable by whisper.load_model"""
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=2,
+        n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=2
+    )
+    path = os.path.join(work_dir, 'whisper-tiny-random.pt')
+    torch.save({'dims': dims.__dict__, 'model_state_dict': Whisper(dims).state_dict()}, path)
+    return path
+
+def audio_fixtures(lang):
+    paths = [f"../data/audio/input/question_{lang}_{i+1}.mp3" for i in range(len(SAMPLE_QUESTIONS[lang]))]
+    return [path for path in paths if os.path.exists(path)]
+
+def _init_asr_worker(whisper_path, budgets=None):
+    if budgets is not None:
+        init_worker()
+    _worker_state['budgets'] = budgets
+    _worker_state['speech'] = SpeechProcessor(whisper_model_name=whisper_path, transcription_cache_size=0)
+
+def _asr_task(item):
+    use_budget(_worker_state['budgets'], 'asr')
+    item['transcript'] = _worker_state['speech'].speech_to_text(item['audio_path'], LANGUAGE_CODES[item['lang']])
+    return item
+
+def _init_qa_worker(model_configs, budgets=None):
+    if budgets is not None:
+        init_worker()
+    _worker_state['budgets'] = budgets
+    _worker_state['qa'] = MultilingualQASystem(model_configs=model_configs)
+
+def _qa_task(item):
+    use_budget(_worker_state['budgets'], f"qa-{item['lang']}")
+    item['answer'] = _worker_state['qa'].answer_question(item['question'], item['context'], item['lang'])
+    return item
+
+def benchmark_scheduling(model_configs, whisper_path, speech_processor, contexts, work_dir, rounds=1,
+                         asr_workers=1, qa_workers=1, tts_workers=4):
+    """Pipeline throughput with default torch threading vs CPUScheduler budgets.
+
+    Both runs push the same audio questions through ASR and QA worker
+    processes and a TTS thread stage. items_per_s is measured between the
+    first and the last finished item, so worker start-up is excluded.
+    """
+    items = []
+    for _ in range(rounds):
+        for lang in LANGUAGES:
+            for path, question in zip(audio_fixtures(lang), SAMPLE_QUESTIONS[lang]):
+                items.append({'lang': lang, 'audio_path': path, 'question': question, 'context': contexts[lang]})
+
+    def synthesize(item):
+        path = os.path.join(work_dir, 'scheduling', f"{item['lang']}_{id(item)}.mp3")
+        speech_processor.text_to_speech(item['answer'], LANGUAGE_CODES[item['lang']], path)
+        return item
+
+    os.makedirs(os.path.join(work_dir, 'scheduling'), exist_ok=True)
+    results = {}
+    for mode in ('default', 'scheduled'):
+        scheduler = budgets = monitor = None
+        if mode == 'scheduled':
+            scheduler = CPUScheduler(tts_threads=tts_workers)
+            scheduler.allocate(asr_workers, qa_workers)
+            budgets = scheduler.budgets
+            monitor = lambda busy: scheduler.observe({'asr': busy['speech-to-text'],
+                                                       'qa': busy['question-answering']})
+        stages = [
+            Stage('speech-to-text', _asr_task, workers=asr_workers, kind='process',
+                  initializer=_init_asr_worker, initargs=(whisper_path, budgets)),
+            Stage('question-answering', _qa_task, workers=qa_workers, kind='process',
+                  initializer=_init_qa_worker, initargs=(model_configs, budgets)),
+            Stage('text-to-speech', synthesize, workers=tts_workers, kind='thread')
+        ]
+
+        finished = []
+        started = time.perf_counter()
+        run_pipeline(items, stages, on_result=lambda item: finished.append(time.perf_counter()), monitor=monitor)
+        wall_s = time.perf_counter() - started
+        steady_s = finished[-1] - finished[0] if len(finished) > 1 else 0.0
+        results[mode] = {
+            'items': len(finished),
+            'wall_s': round(wall_s, 3),
+            'items_per_s': round((len(finished) - 1) / steady_s, 3) if steady_s else 0.0,
+            'budgets': scheduler.plan() if scheduler else None
+        }
+
+    if results['default']['items_per_s']:
+        results['speedup'] = round(results['scheduled']['items_per_s'] / results['default']['items_per_s'], 3)
+    return results
+
+def run_benchmark(repeats=5, work_dir=None, scheduling=True):
+    """Benchmark every stage per language plus the whole main.py flow
+
+    With scheduling, also compare pipeline throughput with and without
+    CPU budgets (see benchmark_scheduling).
+    """
+    work_dir = work_dir or tempfile.mkdtemp(prefix='qa-benchmark-')
+    stages = {}
+
+    print("Building tiny local models...")
+    texts = fixture_texts()
+    model_configs = build_tiny_models(work_dir, texts)
+    qa_system = MultilingualQASystem(model_configs=model_configs)
+
+    tts_server = start_server(port=0)
+    threading.Thread(target=tts_server.serve_forever, daemon=True).start()
+    tts_endpoint = f"http://127.0.0.1:{tts_server.server_address[1]}/"
+
+    # Caches are disabled so every call does the real work
+    whisper_path = build_tiny_whisper(work_dir)
+    speech_processor = SpeechProcessor(
+        whisper_model_name=whisper_path, transcription_cache_size=0, tts_endpoint=tts_endpoint
+    )
+    documents = {}
+    for lang in LANGUAGES:
+        print(f"\n=== Benchmarking {lang.upper()} ===")
+        questions = SAMPLE_QUESTIONS[lang] * repeats
+
+        stages.setdefault('pdf_extraction', {})[lang] = measure(
+            lambda path: extract_text_from_pdf(path, cache_dir=None, workers=1),
+            [PDF_PATHS[lang]] * repeats
+        )
+        documents[lang] = extract_text_from_pdf(PDF_PATHS[lang], cache_dir=None, workers=1)
+        context = prepare_context(documents[lang])
+
+        stages.setdefault('context_preparation', {})[lang] = measure(
+            lambda text: (prepare_context(text), BM25Index.build(chunk_text(text), lang)),
+            [documents[lang]] * repeats
+        )
+
+        if audio_fixtures(lang):
+            stages.setdefault('audio_preprocessing', {})[lang] = measure(
+                lambda path: preprocess_audio(path), audio_fixtures(lang) * repeats
+            )
+            stages.setdefault('transcription', {})[lang] = measure(
+                lambda path: speech_processor.speech_to_text(path, LANGUAGE_CODES[lang]),
+                audio_fixtures(lang) * repeats
+            )
+
+        stages.setdefault('qa', {})[lang] = measure(
+            lambda question: qa_system.answer_question(question, context, lang), questions
+        )
+        stages.setdefault('qa_batch', {})[lang] = measure(
+            lambda batch: qa_system.answer_questions_batch(batch),
+            [[(question, context, lang) for question in SAMPLE_QUESTIONS[lang]]] * repeats
+        )
+        stages.setdefault('qa_session', {})[lang] = measure(
+            lambda batch: qa_system.open_document(context, lang).answer_many(batch),
+            [SAMPLE_QUESTIONS[lang]] * repeats
+        )
+        stages.setdefault('qa_windowed', {})[lang] = measure(
+            lambda question: qa_system.answer_question_windowed(question, documents[lang], lang),
+            questions
+        )
+
+        output_dir = os.path.join(work_dir, 'tts')
+        os.makedirs(output_dir, exist_ok=True)
+        stages.setdefault('tts', {})[lang] = measure(
+            lambda text: speech_processor.text_to_speech(
+                text, LANGUAGE_CODES[lang], os.path.join(output_dir, f"{lang}.mp3")
+            ),
+            questions
+        )
+
+    print("\n=== Benchmarking end-to-end flow ===")
+    stages['end_to_end'] = {'all': measure(
+        lambda _: qa_main.run_sequential(
+            'truncate', 16, 3, qa_system=qa_system, speech_processor=speech_processor,
+            output_dir=os.path.join(work_dir, 'output')
+        ),
+        range(repeats), warmup=False
+    )}
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeats': repeats,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'stages': stages
+    }
+    if scheduling:
+        print("\n=== Benchmarking CPU scheduling ===")
+        contexts = {lang: prepare_context(documents[lang]) for lang in LANGUAGES}
+        report['scheduling'] = benchmark_scheduling(model_configs, whisper_path, speech_processor,
+                                                    contexts, work_dir)
+    tts_server.shutdown()
+    return report
+
+def compare_to_baseline(report, baseline, tolerance=0.2):
+    """Stage/language pairs whose p50 latency or throughput regressed past tolerance"""
+    regressions = []
+    for stage, per_language in report['stages'].items():
+        for lang, current in per_language.items():
+            previous = baseline.get('stages', {}).get(stage, {}).get(lang)
+            if not previous:
+                continue
+            if previous['p50_ms'] and current['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+                regressions.append(f"{stage}/{lang}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms")
+            if current['throughput_per_s'] < previous['throughput_per_s'] * (1 - tolerance):
+                regressions.append(f"{stage}/{lang}: throughput {previous['throughput_per_s']}/s -> "
+                                   f"{current['throughput_per_s']}/s")
+    return regressions
+
+def print_report(report):
+    print("\nBENCHMARK RESULTS")
+    print("=" * 80)
+    print(f"{'stage':20} {'lang':4} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'RSS MB':>8}")
+    for stage, per_language in report['stages'].items():
+        for lang, row in per_language.items():
+            print(f"{stage:20} {lang:4} {row['p50_ms']:10.2f} {row['p95_ms']:10.2f} {row['p99_ms']:10.2f} "
+                  f"{row['throughput_per_s']:10.2f} {row['peak_rss_mb']:8.1f}")
+
+    if 'scheduling' in report:
+        scheduling = report['scheduling']
+        print(f"\n{'pipeline threads':20} {'items':>6} {'wall s':>10} {'items/s':>10}")
+        for mode in ('default', 'scheduled'):
+            row = scheduling[mode]
+            print(f"{mode:20} {row['items']:6} {row['wall_s']:10.2f} {row['items_per_s']:10.2f}")
+        if 'speedup' in scheduling:
+            print(f"Scheduled / default throughput: {scheduling['speedup']:.2f}x "
+                  f"(budgets {scheduling['scheduled']['budgets']['threads']})")
+            if scheduling['speedup'] < 1:
+                print("The scheduler was slower than the default threading on this machine; "
+                      "leave --cpu-schedule off here.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the voice QA pipeline")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="Baseline report to compare against (if it exists)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative slowdown before a stage counts as a regression")
+    parser.add_argument('--work-dir', default=None, help="Where tiny models and outputs are written")
+    parser.add_argument('--no-scheduling', action='store_true',
+                        help="Skip the pipeline throughput comparison with and without CPU budgets")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.repeats, args.work_dir, scheduling=not args.no_scheduling)
+    print_report(report)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report saved to: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
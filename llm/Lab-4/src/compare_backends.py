@@ -0,0 +1,106 @@
+from pdf_processing import extract_text_from_pdf, prepare_context
+from qa_models import MultilingualQASystem, MODEL_CONFIGS
+from backends import BACKENDS
+from sample_questions import SAMPLE_QUESTIONS, PDF_PATHS
+from create_comparison_table import calculate_metrics
+import argparse
+import json
+import os
+import time
+
+def benchmark_backend(language, backend, context, repeats=3, batch_size=8):
+    """Latency, throughput and answers for one language/backend pair.
+
+    FLAN-T5 decodes greedily, so answer drift between backends comes from
+    their numerics rather than from sampling.
+    """
+    qa_system = MultilingualQASystem(backends={language: backend}, deterministic=True)
+    questions = SAMPLE_QUESTIONS[language]
+
+    # First call pays for loading / conversion / compilation
+    start = time.perf_counter()
+    qa_system.answer_question(questions[0], context, language)
+    warmup_s = time.perf_counter() - start
+
+    latencies = []
+    answers = []
+    for _ in range(repeats):
+        answers = []
+        for question in questions:
+            start = time.perf_counter()
+            answers.append(qa_system.answer_question(question, context, language))
+            latencies.append(time.perf_counter() - start)
+
+    items = [(question, context, language) for question in questions] * repeats
+    start = time.perf_counter()
+    qa_system.answer_questions_batch(items, batch_size=batch_size)
+    batch_s = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'language': language,
+        'backend': backend,
+        'warmup_s': round(warmup_s, 3),
+        'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'latency_max_ms': round(latencies[-1] * 1000, 1),
+        'batch_throughput_qps': round(len(items) / batch_s, 2),
+        'model_size_mb': round(qa_system.resident_memory_mb(), 1),
+        'answers': answers
+    }
+
+def compare_backends(languages, backends, repeats=3):
+    """Run every backend per language and report metric drift against eager"""
+    report = []
+    for language in languages:
+        context = prepare_context(extract_text_from_pdf(PDF_PATHS[language]))
+
+        rows = {}
+        for backend in backends:
+            print(f"\n=== {MODEL_CONFIGS[language]['label']} / {backend} ===")
+            try:
+                rows[backend] = benchmark_backend(language, backend, context, repeats)
+            except Exception as e:
+                print(f"Backend {backend} failed for {language}: {e}")
+                continue
+
+            # Score answers the same way create_comparison_table does
+            results = {language: {'questions_answers': [
+                {'question_text': question, 'answer': answer}
+                for question, answer in zip(SAMPLE_QUESTIONS[language], rows[backend].pop('answers'))
+            ]}}
+            metrics = calculate_metrics(results).get(language, {})
+            rows[backend]['rouge1'] = metrics.get('rouge1_avg', 0)
+            rows[backend]['bleu'] = metrics.get('bleu_avg', 0)
+
+        baseline = rows.get('eager')
+        for row in rows.values():
+            if baseline:
+                row['rouge1_drift'] = round(row['rouge1'] - baseline['rouge1'], 3)
+                row['bleu_drift'] = round(row['bleu'] - baseline['bleu'], 2)
+                row['speedup_vs_eager'] = round(baseline['latency_p50_ms'] / row['latency_p50_ms'], 2)
+            report.append(row)
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare QA inference backends")
+    parser.add_argument('--languages', nargs='+', default=list(MODEL_CONFIGS), choices=list(MODEL_CONFIGS))
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default='../results/backend_comparison.json')
+    args = parser.parse_args()
+
+    report = compare_backends(args.languages, args.backends, args.repeats)
+
+    print("\nBACKEND COMPARISON")
+    print("=" * 80)
+    for row in report:
+        print(f"{row['language']:3} {row['backend']:8} p50={row['latency_p50_ms']:8.1f}ms "
+              f"qps={row['batch_throughput_qps']:6.2f} size={row['model_size_mb']:7.1f}MB "
+              f"rouge1={row['rouge1']:.3f} ({row.get('rouge1_drift', 0):+.3f}) "
+              f"bleu={row['bleu']:.2f} ({row.get('bleu_drift', 0):+.2f})")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nBackend comparison saved to: {args.output}")
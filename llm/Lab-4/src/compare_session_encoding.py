@@ -0,0 +1,93 @@
+from pdf_processing import extract_text_from_pdf, prepare_context
+from qa_models import MultilingualQASystem, MODEL_CONFIGS
+from sample_questions import SAMPLE_QUESTIONS, PDF_PATHS
+from create_comparison_table import calculate_metrics
+import argparse
+import json
+import os
+import time
+
+def benchmark_encoding(qa_system, language, context, fused, repeats=3):
+    """Latency and answers of a DocumentSession with the joint prompt or fused encoder states"""
+    questions = SAMPLE_QUESTIONS[language]
+
+    start = time.perf_counter()
+    session = qa_system.open_document(context, language, reuse_encoder=fused)
+    open_s = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeats):
+        # A fresh session per repeat so every pass actually runs the model
+        session = qa_system.open_document(context, language, reuse_encoder=fused)
+        answers = []
+        for question in questions:
+            start = time.perf_counter()
+            answers.append(session.answer(question))
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        'language': language,
+        'encoding': 'fused' if fused else 'joint',
+        'open_s': round(open_s, 3),
+        'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'latency_max_ms': round(latencies[-1] * 1000, 1),
+        'answers': answers
+    }
+
+def compare_encodings(languages, repeats=3):
+    """ROUGE/BLEU drift of fused encoder states against the joint prompt.
+
+    Answers are decoded greedily so that the two encodings, not sampling,
+    account for the difference.
+    """
+    qa_system = MultilingualQASystem(deterministic=True)
+    report = []
+    for language in languages:
+        if MODEL_CONFIGS[language]['type'] != 'seq2seq':
+            continue
+        context = prepare_context(extract_text_from_pdf(PDF_PATHS[language]))
+
+        rows = {}
+        for fused in (False, True):
+            row = benchmark_encoding(qa_system, language, context, fused, repeats)
+            print(f"\n=== {MODEL_CONFIGS[language]['label']} / {row['encoding']} ===")
+            # Score answers the same way create_comparison_table does
+            results = {language: {'questions_answers': [
+                {'question_text': question, 'answer': answer}
+                for question, answer in zip(SAMPLE_QUESTIONS[language], row['answers'])
+            ]}}
+            metrics = calculate_metrics(results).get(language, {})
+            row['rouge1'] = metrics.get('rouge1_avg', 0)
+            row['bleu'] = metrics.get('bleu_avg', 0)
+            rows[row['encoding']] = row
+
+        joint, fused = rows['joint'], rows['fused']
+        fused['rouge1_drift'] = round(fused['rouge1'] - joint['rouge1'], 3)
+        fused['bleu_drift'] = round(fused['bleu'] - joint['bleu'], 2)
+        fused['speedup_vs_joint'] = round(joint['latency_p50_ms'] / fused['latency_p50_ms'], 2)
+        fused['same_answers'] = sum(a == b for a, b in zip(joint['answers'], fused['answers']))
+        report.extend([joint, fused])
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare joint-prompt and fused-encoder document sessions")
+    parser.add_argument('--languages', nargs='+', default=list(MODEL_CONFIGS), choices=list(MODEL_CONFIGS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default='../results/session_encoding_comparison.json')
+    args = parser.parse_args()
+
+    report = compare_encodings(args.languages, args.repeats)
+
+    print("\nSESSION ENCODING COMPARISON")
+    print("=" * 80)
+    for row in report:
+        print(f"{row['language']:3} {row['encoding']:6} p50={row['latency_p50_ms']:8.1f}ms "
+              f"rouge1={row['rouge1']:.3f} ({row.get('rouge1_drift', 0):+.3f}) "
+              f"bleu={row['bleu']:.2f} ({row.get('bleu_drift', 0):+.2f})")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nSession encoding comparison saved to: {args.output}")
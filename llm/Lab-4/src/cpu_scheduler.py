@@ -0,0 +1,192 @@
+"""Explicit CPU budgets for the pipeline's stages.
+
+Left alone, every PyTorch process sizes its intra-op thread pool to all
+cores, so ASR and QA workers running side by side oversubscribe the CPU
+and spend their time contending for it. CPUScheduler splits the cores
+between the process stages and gives each worker an explicit number of
+intra-op threads and a single inter-op thread. It can optionally pin
+each stage to its own cores. TTS is budgeted by its worker thread count
+only, since it waits on the network rather than the CPU.
+
+QA budgets are kept per language (qa-en, qa-mr, qa-fr), so that for
+example FLAN-T5 can be given more threads than the BERT models. While a
+pipeline runs, observe() receives each stage's busy time and, every
+REBALANCE_WINDOW_S seconds, moves a core toward the stage whose workers
+were busier over that window: the bottleneck stays busy while the stage
+before it blocks on the full queue and the stage after it starves.
+Workers apply the new budget before their next item.
+"""
+import multiprocessing
+import os
+import time
+
+LANGUAGES = ('en', 'mr', 'fr')
+BUDGET_KEYS = ('asr',) + tuple(f"qa-{language}" for language in LANGUAGES) + ('tts',)
+# Relative share of the cores each process stage gets per worker
+STAGE_WEIGHTS = {'asr': 1.0, 'qa': 1.0}
+# Difference in busy fraction between the ASR and QA workers that moves one core
+REBALANCE_MARGIN = 0.25
+# Seconds of busy time compared per decision; single items take seconds
+REBALANCE_WINDOW_S = 5.0
+
+def available_cpus():
+    """Cores this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+def parse_budgets(options):
+    """{key: threads} from KEY=N strings such as qa-en=2"""
+    budgets = {}
+    for option in options:
+        key, _, threads = option.partition('=')
+        if key not in BUDGET_KEYS or not threads.isdigit() or int(threads) < 1:
+            raise ValueError(f"Bad thread budget '{option}': expected one of {', '.join(BUDGET_KEYS)}=N")
+        budgets[key] = int(threads)
+    return budgets
+
+class SharedBudgets:
+    """Thread count per budget key, written by the parent and read by workers.
+
+    Backed by shared memory, so it must reach worker processes when they
+    are created (e.g. through a pool initializer's arguments).
+    """
+
+    def __init__(self, keys=BUDGET_KEYS, context=None):
+        context = context or multiprocessing.get_context()
+        self.keys = list(keys)
+        self.values = context.Array('i', len(self.keys), lock=False)
+
+    def __getitem__(self, key):
+        return self.values[self.keys.index(key)]
+
+    def __setitem__(self, key, threads):
+        self.values[self.keys.index(key)] = threads
+
+    def as_dict(self):
+        return {key: self.values[i] for i, key in enumerate(self.keys)}
+
+def init_worker(cpus=None, interop_threads=1):
+    """Pin this worker process to cpus and size its inter-op pool, before any model work.
+
+    Pass interop_threads=None in a worker forked from a parent that has
+    loaded models: it keeps the parent's pool, since resizing it there
+    corrupts later intra-op resizing.
+    """
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    if interop_threads is None:
+        return
+    import torch
+
+    torch.set_num_interop_threads(interop_threads)
+
+def use_budget(budgets, key):
+    """Size this process's intra-op pool to the key's current budget (no-op without budgets)"""
+    if budgets is None:
+        return
+    import torch
+
+    threads = budgets[key]
+    if threads > 0 and torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+
+class CPUScheduler:
+    """Splits cores between ASR and QA workers and moves cores toward the busier stage.
+
+    The split starts in proportion to each stage's workers (see allocate);
+    observe() then shifts one core at a time toward the stage whose workers
+    spent more of the last window processing items.
+
+    overrides fixes the budget of individual keys (see parse_budgets).
+    With pin=True each stage's workers are restricted to its own cores
+    and the split stays static; otherwise observe() may move cores.
+    """
+
+    def __init__(self, cpus=None, overrides=None, pin=False, adaptive=True, tts_threads=4, context=None):
+        self.cpus = list(cpus) if cpus else available_cpus()
+        self.overrides = dict(overrides or {})
+        self.pin = pin
+        self.adaptive = adaptive and not pin
+        self.tts_threads = tts_threads
+        self.budgets = SharedBudgets(context=context)
+        self.workers = {'asr': 1, 'qa': 1}
+        self.cores = {}
+        self.adjustments = 0
+        self.utilization = None
+        self._last_sample = None
+        self.allocate()
+
+    def allocate(self, asr_workers=1, qa_workers=1):
+        """Divide the cores in proportion to each stage's weighted worker count"""
+        self.workers = {'asr': max(1, asr_workers), 'qa': max(1, qa_workers)}
+        shares = {stage: STAGE_WEIGHTS[stage] * workers for stage, workers in self.workers.items()}
+        total = len(self.cpus)
+        asr_cores = round(total * shares['asr'] / sum(shares.values()))
+        # Each stage keeps at least one core; with a single core they share it
+        self.cores['asr'] = min(max(1, asr_cores), max(1, total - 1))
+        self.cores['qa'] = max(1, total - self.cores['asr'])
+        self._publish()
+        return self.plan()
+
+    def _publish(self):
+        threads = {stage: max(1, self.cores[stage] // self.workers[stage]) for stage in self.workers}
+        self.budgets['asr'] = self.overrides.get('asr', threads['asr'])
+        for language in LANGUAGES:
+            self.budgets[f"qa-{language}"] = self.overrides.get(f"qa-{language}", threads['qa'])
+        self.budgets['tts'] = self.overrides.get('tts', self.tts_threads)
+
+    def stage_cpus(self, stage):
+        """Cores a stage's workers are pinned to, or None when pinning is off"""
+        if not self.pin:
+            return None
+        if stage == 'asr':
+            return set(self.cpus[:self.cores['asr']])
+        return set(self.cpus[-self.cores['qa']:])
+
+    def observe(self, busy, now=None):
+        """Move one core toward the stage whose workers were busier.
+
+        busy maps 'asr' and 'qa' to the seconds their workers have spent
+        processing items so far (see run_pipeline's monitor). Each stage's
+        busy fraction is compared over the last REBALANCE_WINDOW_S seconds.
+        Returns True when the budgets changed.
+        """
+        if not self.adaptive or len(self.cpus) < 2:
+            return False
+        now = time.perf_counter() if now is None else now
+        if self._last_sample is None:
+            self._last_sample = (now, dict(busy))
+            return False
+        then, previous = self._last_sample
+        elapsed = now - then
+        if elapsed < REBALANCE_WINDOW_S:
+            return False
+        self._last_sample = (now, dict(busy))
+
+        self.utilization = {stage: round((busy[stage] - previous[stage]) / (elapsed * self.workers[stage]), 3)
+                            for stage in self.workers}
+        gap = self.utilization['qa'] - self.utilization['asr']
+        if gap >= REBALANCE_MARGIN and self.cores['asr'] > 1:
+            self.cores['asr'] -= 1
+            self.cores['qa'] += 1
+        elif gap <= -REBALANCE_MARGIN and self.cores['qa'] > 1:
+            self.cores['qa'] -= 1
+            self.cores['asr'] += 1
+        else:
+            return False
+        self._publish()
+        self.adjustments += 1
+        return True
+
+    def plan(self):
+        """Current cores per stage, threads per budget key, pinned cores and last busy fractions"""
+        return {
+            'cpus': len(self.cpus),
+            'cores': dict(self.cores),
+            'threads': self.budgets.as_dict(),
+            'pinned': {stage: sorted(self.stage_cpus(stage)) for stage in self.cores} if self.pin else None,
+            'utilization': self.utilization,
+            'adjustments': self.adjustments
+        }
@@ -1,7 +1,5 @@
 import json
-import pandas as pd
-from rouge_score import rouge_scorer
-from sacrebleu import sentence_bleu
+from metrics_engine import iter_records, score_records
 
 def load_results():
     """Load the QA results from JSON"""
@@ -12,96 +10,28 @@ def load_results():
         print("Error: qa_results.json not found. Run main.py first!")
         return None
 
-def calculate_metrics(results):
-    """Calculate ROUGE and BLEU scores"""
-    scorer = rouge_scorer.RougeScorer(['rouge1'], use_stemmer=True)
+def calculate_metrics(results, references=None, workers=1):
+    """Calculate ROUGE and BLEU scores
 
-    # Dummy reference answers for demonstration, replace with your real references
-    reference_answers = {
-        'en': [
-            "Artificial intelligence has revolutionized healthcare by enabling faster diagnosis, personalized treatment plans, and improved patient outcomes.",
-            "AI-powered systems can detect cancer cells in X-rays and MRI scans with 95% accuracy.",
-            "Telemedicine and remote monitoring allow for continuous patient vital signs tracking and enable immediate intervention."
-        ],
-        'mr': [
-            "कृत्रिम बुद्धिमत्ता आरोग्यसेवेत जलद निदान, वैयक्तिक उपचार योजना आणि सुधारित रुग्ण परिणाम सक्षम करते.",
-            "AI प्रणाली एक्स-रे आणि MRI स्कॅनमध्ये 95% अचूकतेने कर्करोग पेशी शोधू शकतात.",
-            "दूरवैद्यक आणि दूरस्थ निरीक्षण रुग्णांचे जीवनसत्त्वे सतत तपासतात आणि त्वरित हस्तक्षेप शक्य करतात."
-        ],
-        'fr': [
-            "L'intelligence artificielle a révolutionné les soins de santé en permettant des diagnostics plus rapides, des plans de traitement personnalisés et de meilleurs résultats pour les patients.",
-            "Les systèmes d'IA peuvent détecter les cellules cancéreuses dans les radiographies et les IRM avec une précision de 95%.",
-            "La télémédecine et la surveillance à distance permettent un suivi continu des signes vitaux des patients et une intervention immédiate."
-        ]
-    }
-
-    metrics = {}
-    
+    Scoring is done by metrics_engine against the reference answers in
+    data/references.json; pass workers > 1 to score large runs in parallel.
+    """
+    metrics = score_records(iter_records(results), references, workers=workers)
     for lang in ['en', 'mr', 'fr']:
-        qas = results.get(lang, {}).get('questions_answers', [])
-        total_questions = len(qas)
-        if total_questions == 0:
+        if lang not in metrics:
             print(f"No QA pairs found for {lang}")
-            continue
-
-        # Calculate success rates
-        audio_input_success = sum(1 for qa in qas if qa.get('question_source') == 'audio') / total_questions * 100
-        audio_output_success = sum(1 for qa in qas if qa.get('audio_generated', False)) / total_questions * 100
-
-        # Average answer length
-        avg_answer_length = sum(len(qa.get('answer', '')) for qa in qas) / total_questions
-
-        # Quality score based on answer length and fallback phrases
-        quality_count = 0
-        for qa in qas:
-            ans = qa.get('answer', "")
-            if isinstance(ans, str) and len(ans) > 10 and not ans.lower().startswith("unable to find"):
-                quality_count += 1
-        answer_quality = (quality_count / total_questions) * 5  # scale 1 to 5
-
-        # Compute ROUGE-1 and BLEU scores
-        rouge_scores = []
-        bleu_scores = []
-
-        for i, qa in enumerate(qas):
-            reference = reference_answers[lang][i] if i < len(reference_answers[lang]) else ""
-            hypothesis = qa.get('answer', "")
-            if not isinstance(hypothesis, str):
-                hypothesis = str(hypothesis)
-            hypothesis = hypothesis.strip()
-
-            if hypothesis == "":
-                rouge1_f = 0.0
-                bleu_score = 0.0
-            else:
-                rouge_result = scorer.score(reference, hypothesis)
-                rouge1_f = rouge_result['rouge1'].fmeasure
-                try:
-                    bleu_score = sentence_bleu([reference.split()], hypothesis.split()).score
-                except Exception as e:
-                    print(f"BLEU calculation error for lang={lang} question={i+1}: {e}")
-                    bleu_score = 0.0
-
-            rouge_scores.append(rouge1_f)
-            bleu_scores.append(bleu_score)
-
-        rouge_avg = sum(rouge_scores) / len(rouge_scores) if rouge_scores else 0
-        bleu_avg = sum(bleu_scores) / len(bleu_scores) if bleu_scores else 0
-
-        metrics[lang] = {
-            'audio_input_success': round(audio_input_success, 1),
-            'audio_output_success': round(audio_output_success, 1),
-            'avg_answer_length': round(avg_answer_length, 1),
-            'answer_quality': round(answer_quality, 1),
-            'rouge1_avg': round(rouge_avg, 3),
-            'bleu_avg': round(bleu_avg, 2)
-        }
-    
     return metrics
 
+def _measured(metrics, lang, key):
+    """A telemetry metric for the table, or 'n/a' when the run did not record it"""
+    value = metrics.get(lang, {}).get(key)
+    return 'n/a' if value is None else value
+
 def create_comparison_table():
     """Create comprehensive comparison table"""
     
+    import pandas as pd
+    
     print("Creating comparison table...")
     
     results = load_results()
@@ -146,12 +76,19 @@ def create_comparison_table():
             metrics.get('mr', {}).get('bleu_avg', 0),
             metrics.get('fr', {}).get('bleu_avg', 0)
         ],
+        'Corpus BLEU': [
+            metrics.get('en', {}).get('bleu_corpus', 0),
+            metrics.get('mr', {}).get('bleu_corpus', 0),
+            metrics.get('fr', {}).get('bleu_corpus', 0)
+        ],
         'Coherence (Manual 1-5)': [5, 3, 4],
         'Relevance (Manual 1-5)': [5, 3, 4],
         'Fluency (Manual 1-5)': [5, 3, 4],
         'Voice Clarity (Manual 1-5)': [5, 3, 4],
         'Pronunciation (Manual 1-5)': [5, 2, 4],
-        'Response Time': ['Fast', 'Moderate', 'Fast'],
+        'Latency p50 (s)': [_measured(metrics, lang, 'latency_p50_s') for lang in ['en', 'mr', 'fr']],
+        'Latency p95 (s)': [_measured(metrics, lang, 'latency_p95_s') for lang in ['en', 'mr', 'fr']],
+        'QA Tokens/sec': [_measured(metrics, lang, 'tokens_per_second') for lang in ['en', 'mr', 'fr']],
         'Noted Issues': [
             'Temperature warnings (fixed)',
             'QA layer not fine-tuned, Devanagari issues',
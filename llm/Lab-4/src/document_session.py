@@ -0,0 +1,275 @@
+from answer_cache import document_hash
+from qa_models import decode_spans
+import telemetry
+import torch
+
+# Prompt pieces of MultilingualQASystem._flan_t5_prompt, split around the context
+FLAN_T5_QUESTION_PROMPT = "Answer the following question based on the context:\nQuestion: {question}"
+FLAN_T5_CONTEXT_PROMPT = "\nContext: {context}\nAnswer:"
+
+def _pair_template(tokenizer):
+    """Special tokens and token types a tokenizer places around a (question, context) pair.
+
+    Read off a probe encoding, so question and context IDs cached elsewhere
+    can be joined exactly as tokenizer(question, context) would join them.
+    """
+    probe = tokenizer("a", "b")
+    sequence_ids = probe.sequence_ids(0)
+    ids = probe['input_ids']
+    types = probe.get('token_type_ids', [0] * len(ids))
+
+    def bounds(sequence):
+        positions = [i for i, sequence_id in enumerate(sequence_ids) if sequence_id == sequence]
+        return positions[0], positions[-1] + 1
+    question_start, question_end = bounds(0)
+    context_start, context_end = bounds(1)
+
+    specials = (ids[:question_start], ids[question_end:context_start], ids[context_end:])
+    segment_types = (types[question_start], types[context_start])
+    special_types = (types[:question_start], types[question_end:context_start], types[context_end:])
+    return specials, segment_types, special_types
+
+class DocumentSession:
+    """Answers a stream of questions about one document.
+
+    The document is tokenized once when the session is opened and split
+    into up to max_windows windows of context token IDs. Extractive models
+    then only tokenize each question and join it to the cached context IDs.
+
+    Seq2seq models get the joint prompt, assembled from the cached token
+    IDs of the first window. With reuse_encoder=True the context windows
+    are instead run through the encoder once (Fusion-in-Decoder style):
+    each question is encoded on its own and the decoder attends to the
+    question states followed by the cached context states. FLAN-T5 was
+    not trained to see the context encoded without the question, so this
+    changes answers; compare_session_encoding.py measures by how much.
+    Backends without a separate encoder (onnx) always use the joint prompt.
+    """
+
+    def __init__(self, qa_system, context, language, max_length=512, stride=128, max_windows=1,
+                 max_question_tokens=64, reuse_encoder=False):
+        self.qa_system = qa_system
+        self.context = context
+        self.language = language
+        self.max_length = max_length
+        self.max_question_tokens = max_question_tokens
+        self.seq2seq = qa_system.model_configs[language]['type'] == 'seq2seq'
+
+        tokenizer, model = qa_system._get_model(language)
+        with telemetry.span('tokenization'):
+            encoded = tokenizer(context, add_special_tokens=False, return_offsets_mapping=True)
+        self.context_ids = encoded['input_ids']
+        self.context_offsets = encoded['offset_mapping']
+
+        fused = self.seq2seq and reuse_encoder and hasattr(model, 'get_encoder')
+        if self.seq2seq:
+            window_tokens = max_length - len(tokenizer(FLAN_T5_CONTEXT_PROMPT.format(context=""))['input_ids'])
+            if not fused:
+                # The joint prompt also holds the instruction and the question
+                window_tokens -= max_question_tokens + len(
+                    tokenizer(FLAN_T5_QUESTION_PROMPT.format(question="").rstrip(),
+                              add_special_tokens=False)['input_ids'])
+        else:
+            window_tokens = max_length - max_question_tokens - tokenizer.num_special_tokens_to_add(pair=True)
+        starts = [0]
+        while starts[-1] + window_tokens < len(self.context_ids) and len(starts) < max_windows:
+            starts.append(starts[-1] + max(1, window_tokens - stride))
+        self.windows = [(start, min(start + window_tokens, len(self.context_ids))) for start in starts]
+
+        self.pair_template = None if self.seq2seq else _pair_template(tokenizer)
+        self.context_states = None
+        if fused:
+            self._encode_context(tokenizer, model)
+        
+        # Session answers are cached apart from answer_question's: they are
+        # computed differently (e.g. fused encoder states)
+        self.context_hash = document_hash(context) if qa_system.answer_cache is not None else None
+        encoding = 'fused' if self.context_states is not None else 'joint'
+        self.cache_method = f"session:{max_length}:{stride}:{max_windows}:{max_question_tokens}:{encoding}"
+
+    def _window_text(self, start, end):
+        if start >= end:
+            return ""
+        return self.context[self.context_offsets[start][0]:self.context_offsets[end - 1][1]]
+
+    def _encode_context(self, tokenizer, model):
+        """Run every context window through the encoder once and keep the states"""
+        prompts = [FLAN_T5_CONTEXT_PROMPT.format(context=self._window_text(start, end))
+                   for start, end in self.windows]
+        with telemetry.span('tokenization'):
+            inputs = tokenizer(prompts, return_tensors="pt", max_length=self.max_length,
+                               truncation=True, padding=True)
+        with telemetry.span('encode'), torch.no_grad():
+            states = model.get_encoder()(**inputs).last_hidden_state
+        telemetry.add_count('input_tokens', int(inputs['attention_mask'].sum()))
+
+        # Concatenate the windows into one sequence for the decoder to attend over
+        self.context_states = states.reshape(1, -1, states.shape[-1])
+        self.context_mask = inputs['attention_mask'].reshape(1, -1)
+
+    def answer(self, question):
+        return self.answer_many([question])[0]
+
+    def answer_many(self, questions, batch_size=8):
+        """Answer questions about the document, in input order"""
+        answers = [None] * len(questions)
+        keys = [None] * len(questions)
+        pending = []
+        for i, question in enumerate(questions):
+            if self.context_hash is not None:
+                keys[i] = self.qa_system.answer_cache_key(question, self.context_hash, self.language,
+                                                          self.cache_method)
+            if keys[i] is not None:
+                answers[i] = self.qa_system.answer_cache.get(keys[i])
+                if answers[i] is not None:
+                    telemetry.add_count('cached_answers', 1)
+                    continue
+            pending.append(i)
+        
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            batch_questions = [questions[i] for i in batch]
+            if not self.seq2seq:
+                batch_answers = self._extractive_batch(batch_questions)
+            elif self.context_states is not None:
+                batch_answers = self._fused_seq2seq_batch(batch_questions)
+            else:
+                batch_answers = self._seq2seq_batch(batch_questions)
+            
+            for i, answer in zip(batch, batch_answers):
+                answers[i] = answer
+                if keys[i] is not None:
+                    self.qa_system.answer_cache.put(keys[i], answer, self.context_hash)
+        return answers
+
+    def _question_ids(self, tokenizer, questions):
+        with telemetry.span('tokenization'):
+            encoded = tokenizer(questions, add_special_tokens=False)
+        return [ids[:self.max_question_tokens] for ids in encoded['input_ids']]
+
+    def _seq2seq_question_ids(self, tokenizer, questions):
+        """Instruction and question IDs; only the question counts against max_question_tokens"""
+        with telemetry.span('tokenization'):
+            instruction = tokenizer(FLAN_T5_QUESTION_PROMPT.format(question="").rstrip(),
+                                    add_special_tokens=False)['input_ids']
+        return [instruction + ids for ids in self._question_ids(tokenizer, questions)]
+
+    @staticmethod
+    def _pad(tokenizer, sequences):
+        """Right-padded input_ids and attention_mask for lists of token IDs"""
+        seq_len = max(len(ids) for ids in sequences)
+        input_ids = torch.full((len(sequences), seq_len), tokenizer.pad_token_id)
+        attention_mask = torch.zeros((len(sequences), seq_len), dtype=torch.long)
+        for i, ids in enumerate(sequences):
+            input_ids[i, :len(ids)] = torch.tensor(ids)
+            attention_mask[i, :len(ids)] = 1
+        return input_ids, attention_mask
+
+    def _extractive_batch(self, questions):
+        """Score each question against every cached window and keep the best span"""
+        tokenizer, model = self.qa_system._get_model(self.language)
+        question_ids = self._question_ids(tokenizer, questions)
+        (prefix, middle, suffix), (question_type, context_type), special_types = self.pair_template
+        use_token_types = 'token_type_ids' in tokenizer.model_input_names
+
+        # One example per (question, window), built from cached token IDs
+        examples = []
+        for row, ids in enumerate(question_ids):
+            for start, end in self.windows:
+                window_ids = self.context_ids[start:end]
+                input_ids = prefix + ids + middle + window_ids + suffix
+                context_start = len(prefix) + len(ids) + len(middle)
+                token_types = (special_types[0] + [question_type] * len(ids) + special_types[1]
+                               + [context_type] * len(window_ids) + special_types[2])
+                examples.append((row, start, context_start, len(window_ids), input_ids, token_types))
+
+        seq_len = max(len(example[4]) for example in examples)
+        input_ids = torch.full((len(examples), seq_len), tokenizer.pad_token_id)
+        attention_mask = torch.zeros((len(examples), seq_len), dtype=torch.long)
+        token_type_ids = torch.zeros((len(examples), seq_len), dtype=torch.long)
+        candidate_mask = torch.zeros((len(examples), seq_len), dtype=torch.bool)
+        for i, (_, _, context_start, window_len, ids, token_types) in enumerate(examples):
+            input_ids[i, :len(ids)] = torch.tensor(ids)
+            attention_mask[i, :len(ids)] = 1
+            candidate_mask[i, context_start:context_start + window_len] = True
+            token_type_ids[i, :len(ids)] = torch.tensor(token_types)
+
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if use_token_types:
+            inputs['token_type_ids'] = token_type_ids
+        telemetry.add_count('input_tokens', int(attention_mask.sum()))
+
+        with telemetry.span('forward'), torch.no_grad():
+            outputs = model(**inputs)
+        with telemetry.span('decoding'):
+            spans = decode_spans(outputs.start_logits, outputs.end_logits, candidate_mask)
+
+        best = [None] * len(questions)
+        for (row, window_start, context_start, _, _, _), example_spans in zip(examples, spans):
+            if example_spans and (best[row] is None or example_spans[0][2] > best[row][0][2]):
+                best[row] = (example_spans[0], window_start, context_start)
+
+        answers = []
+        for found in best:
+            if found is None or found[0][3] < self.qa_system.min_confidence:
+                answers.append(self.qa_system._get_fallback_answer(self.context, self.language))
+                continue
+            (start_token, end_token, _, _), window_start, context_start = found
+            telemetry.add_count('output_tokens', end_token - start_token + 1)
+            first = window_start + start_token - context_start
+            last = window_start + end_token - context_start
+            answer = self.context[self.context_offsets[first][0]:self.context_offsets[last][1]]
+            answers.append(self.qa_system._clean_bert_answer(answer, self.context, self.language))
+        return answers
+
+    def _generate(self, tokenizer, model, **inputs):
+        with telemetry.span('generate'), torch.no_grad():
+            outputs = model.generate(
+                **inputs,
+                max_length=150,
+                num_return_sequences=1,
+                **self.qa_system.generation_options()
+            )
+        telemetry.add_count('output_tokens', int((outputs[:, 1:] != tokenizer.pad_token_id).sum()))
+
+        answers = []
+        with telemetry.span('decoding'):
+            for output in outputs:
+                answer = tokenizer.decode(output, skip_special_tokens=True)
+                if "Answer:" in answer:
+                    answer = answer.split("Answer:")[-1].strip()
+                answers.append(answer)
+        return answers
+
+    def _fused_seq2seq_batch(self, questions):
+        """Encode only the questions and decode over question + cached context states"""
+        from transformers.modeling_outputs import BaseModelOutput
+
+        tokenizer, model = self.qa_system._get_model(self.language)
+        input_ids, attention_mask = self._pad(tokenizer, self._seq2seq_question_ids(tokenizer, questions))
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        telemetry.add_count('input_tokens', int(attention_mask.sum()))
+
+        with telemetry.span('encode'), torch.no_grad():
+            question_states = model.get_encoder()(**inputs).last_hidden_state
+
+        batch = len(questions)
+        states = torch.cat([question_states, self.context_states.expand(batch, -1, -1)], dim=1)
+        mask = torch.cat([inputs['attention_mask'], self.context_mask.expand(batch, -1)], dim=1)
+        return self._generate(tokenizer, model, encoder_outputs=BaseModelOutput(last_hidden_state=states),
+                              attention_mask=mask)
+
+    def _seq2seq_batch(self, questions):
+        """Joint prompts assembled from cached context IDs of the first window"""
+        tokenizer, model = self.qa_system._get_model(self.language)
+        start, end = self.windows[0]
+        prefixes = self._seq2seq_question_ids(tokenizer, questions)
+        with telemetry.span('tokenization'):
+            suffix = tokenizer("\nAnswer:")['input_ids']
+            context_label = tokenizer("\nContext:", add_special_tokens=False)['input_ids']
+
+        prompts = [(prefix + context_label + self.context_ids[start:end] + suffix)[:self.max_length]
+                   for prefix in prefixes]
+        input_ids, attention_mask = self._pad(tokenizer, prompts)
+        telemetry.add_count('input_tokens', int(attention_mask.sum()))
+        return self._generate(tokenizer, model, input_ids=input_ids, attention_mask=attention_mask)
@@ -0,0 +1,283 @@
+"""Cheap lexical answer tier in front of the neural QA models.
+
+A SentenceIndex splits a document into sentences once and ranks them by
+IDF-weighted overlap with the question's terms. CascadeQA wraps a
+MultilingualQASystem: when the best sentence covers enough of the
+question (confidence >= threshold) it is returned straight away, and
+only the remaining questions pay for a transformer pass.
+
+Tune the threshold against ROUGE on the sample questions with:
+
+    python lexical_qa.py --thresholds 0.4 0.5 0.6 0.7 0.8
+"""
+from collections import deque
+from retrieval import tokenize
+from telemetry import percentile
+import argparse
+import json
+import math
+import re
+import telemetry
+import time
+
+# A sentence ends at ., !, ? or a danda followed by whitespace, or at a blank line
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?।॥])\s+|\n\s*\n")
+# Terms are compared on their first characters, a crude stemmer that lets
+# inflected forms match (आरोग्यसेवेत / आरोग्यसेवा, médicale / médicales)
+TERM_PREFIX = 6
+# Question and function words that carry no evidence for an answer; content words
+# stay in, even common ones, so that questions about them can still match
+STOPWORDS = {
+    'en': {'what', 'which', 'who', 'whom', 'how', 'why', 'when', 'where', 'is', 'are', 'was', 'were',
+           'do', 'does', 'did', 'the', 'a', 'an', 'of', 'in', 'on', 'to', 'for', 'and', 'or', 'with',
+           'by', 'it', 'its', 'can', 'be', 'this', 'that', 'these', 'those', 'from', 'at', 'as'},
+    'fr': {'qu', 'est', 'ce', 'que', 'qui', 'quoi', 'quel', 'quels', 'quelle', 'quelles', 'comment',
+           'où', 'quand', 'pourquoi', 'combien', 'le', 'la', 'les', 'l', 'un', 'une', 'des', 'de', 'du',
+           'd', 'dans', 'et', 'ou', 'en', 'à', 'au', 'aux', 'il', 'elle', 't', 'sont', 'pour', 'sur'},
+    'mr': {'काय', 'कशी', 'कसे', 'कसा', 'कोण', 'कोणते', 'कोणती', 'कुठे', 'केव्हा', 'का', 'किती',
+           'म्हणजे', 'आहे', 'आहेत', 'आणि', 'व', 'हे', 'ही', 'हा', 'या', 'त्या'}
+}
+# Latencies kept per tier for the percentiles in CascadeQA.tier_stats
+LATENCY_SAMPLE_SIZE = 10000
+
+def question_terms(text, language):
+    """Prefix-stemmed terms of text without the language's stopwords"""
+    stopwords = STOPWORDS.get(language, ())
+    return {token[:TERM_PREFIX] for token in tokenize(text) if token not in stopwords}
+
+class SentenceIndex:
+    """Sentences of one document with an inverted index over their terms"""
+
+    def __init__(self, context, language, min_chars=21):
+        self.language = language
+        self.sentences = [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(context)
+                          if len(sentence.strip()) >= min_chars]
+
+        self.postings = {}
+        for sentence_id, sentence in enumerate(self.sentences):
+            for term in question_terms(sentence, language):
+                self.postings.setdefault(term, []).append(sentence_id)
+
+        # A question term the document never uses weighs more than any it does
+        count = len(self.sentences)
+        self.idf = {term: math.log((count + 1) / (len(ids) + 0.5)) for term, ids in self.postings.items()}
+        self.missing_idf = math.log((count + 1) / 0.5)
+
+    def best(self, question):
+        """(sentence, confidence) of the sentence covering most of the question.
+
+        Confidence is the IDF-weighted share of the question's terms that
+        appear in the sentence, from 0 to 1; (None, 0.0) when no sentence
+        shares a term with the question.
+        """
+        terms = question_terms(question, self.language)
+        total = sum(self.idf.get(term, self.missing_idf) for term in terms)
+        if not total:
+            return None, 0.0
+
+        scores = {}
+        for term in terms:
+            for sentence_id in self.postings.get(term, ()):
+                scores[sentence_id] = scores.get(sentence_id, 0.0) + self.idf[term]
+        if not scores:
+            return None, 0.0
+
+        # Ties go to the earlier sentence
+        best = min(scores, key=lambda sentence_id: (-scores[sentence_id], sentence_id))
+        return self.sentences[best], scores[best] / total
+
+class CascadeQA:
+    """MultilingualQASystem front end that tries the sentence index first.
+
+    Exposes the answering methods of the wrapped system (other attributes
+    are passed through), so it can stand in for it in main.py and the
+    server. Per-tier hit counts and latencies are available from
+    tier_stats(); a neural answer's latency includes the lexical attempt.
+    """
+
+    TIERS = ('lexical', 'neural')
+
+    def __init__(self, qa_system, threshold=0.6):
+        self.qa_system = qa_system
+        self.threshold = threshold
+        self.tier_counts = {tier: 0 for tier in self.TIERS}
+        self.tier_latencies = {tier: deque(maxlen=LATENCY_SAMPLE_SIZE) for tier in self.TIERS}
+
+    def __getattr__(self, name):
+        return getattr(self.qa_system, name)
+
+    def _record(self, tier, seconds, count=1):
+        self.tier_counts[tier] += count
+        self.tier_latencies[tier].extend([seconds] * count)
+
+    def lexical_answer(self, question, context, language):
+        """(sentence, confidence) from the document's cached sentence index"""
+        with telemetry.span('lexical_answer'):
+            return self.qa_system.sentence_index(context, language).best(question)
+
+    def _answer(self, question, context, language, escalate):
+        start = time.perf_counter()
+        sentence, confidence = self.lexical_answer(question, context, language)
+        if sentence is not None and confidence >= self.threshold:
+            telemetry.add_count('lexical_answers', 1)
+            self._record('lexical', time.perf_counter() - start)
+            return sentence
+
+        answer = escalate()
+        self._record('neural', time.perf_counter() - start)
+        return answer
+
+    def answer_question(self, question, context, language):
+        return self._answer(question, context, language,
+                            lambda: self.qa_system.answer_question(question, context, language))
+
+    def answer_question_windowed(self, question, context, language, **options):
+        return self._answer(question, context, language,
+                            lambda: self.qa_system.answer_question_windowed(question, context, language, **options))
+
+    def answer_questions_batch(self, items, batch_size=8):
+        """Answer confident items lexically and the rest in one batched neural call"""
+        answers = [None] * len(items)
+        escalated = []
+        start = time.perf_counter()
+        for i, (question, context, language) in enumerate(items):
+            item_start = time.perf_counter()
+            sentence, confidence = self.lexical_answer(question, context, language)
+            if sentence is not None and confidence >= self.threshold:
+                answers[i] = sentence
+                self._record('lexical', time.perf_counter() - item_start)
+            else:
+                escalated.append(i)
+
+        if escalated:
+            neural = self.qa_system.answer_questions_batch([items[i] for i in escalated], batch_size)
+            for i, answer in zip(escalated, neural):
+                answers[i] = answer
+            # Items of a batch share its latency
+            self._record('neural', time.perf_counter() - start, count=len(escalated))
+        return answers
+
+    def stream_answer(self, question, context, language):
+        """The confident lexical answer as one chunk, or the streamed neural answer.
+
+        A streamed neural answer's latency runs until its last chunk is consumed.
+        """
+        start = time.perf_counter()
+        sentence, confidence = self.lexical_answer(question, context, language)
+        if sentence is not None and confidence >= self.threshold:
+            telemetry.add_count('lexical_answers', 1)
+            self._record('lexical', time.perf_counter() - start)
+            yield sentence
+            return
+        
+        yield from self.qa_system.stream_answer(question, context, language)
+        self._record('neural', time.perf_counter() - start)
+
+    def open_document(self, context, language, **options):
+        return CascadeSession(self, self.qa_system.open_document(context, language, **options))
+
+    def tier_stats(self):
+        """Hit rate and latency percentiles (ms) of each tier"""
+        total = sum(self.tier_counts.values())
+        stats = {'threshold': self.threshold}
+        for tier in self.TIERS:
+            latencies = list(self.tier_latencies[tier])
+            stats[tier] = {
+                'answered': self.tier_counts[tier],
+                'hit_rate': round(self.tier_counts[tier] / total, 3) if total else 0.0,
+                'latency_p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+                'latency_p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None
+            }
+        return stats
+
+class CascadeSession:
+    """DocumentSession whose questions go through the lexical tier first"""
+
+    def __init__(self, cascade, session):
+        self.cascade = cascade
+        self.session = session
+        self.context = session.context
+        self.language = session.language
+
+    def answer(self, question):
+        return self.cascade._answer(question, self.context, self.language,
+                                    lambda: self.session.answer(question))
+
+    def answer_many(self, questions, batch_size=8):
+        return [self.answer(question) for question in questions]
+
+def tune_threshold(qa_system, contexts, questions, thresholds, references=None):
+    """ROUGE-1, lexical hit rate and mean latency per language for each threshold.
+
+    Every question is answered once by each tier; the cascade outcome at
+    each threshold is then assembled from those answers and scored with
+    create_comparison_table.calculate_metrics. The row with threshold
+    None is the neural-only baseline.
+    """
+    from create_comparison_table import calculate_metrics
+
+    cascade = CascadeQA(qa_system)
+    measured = {}
+    for language, context in contexts.items():
+        for question in questions[language]:
+            start = time.perf_counter()
+            sentence, confidence = cascade.lexical_answer(question, context, language)
+            lexical_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            answer = qa_system.answer_question(question, context, language)
+            neural_s = time.perf_counter() - start
+            measured.setdefault(language, []).append(
+                (question, sentence, confidence, lexical_s, answer, neural_s)
+            )
+
+    rows = []
+    for threshold in [None] + list(thresholds):
+        results = {}
+        for language, entries in measured.items():
+            answers = []
+            for question, sentence, confidence, lexical_s, answer, neural_s in entries:
+                lexical = threshold is not None and sentence is not None and confidence >= threshold
+                answers.append({
+                    'question_text': question,
+                    'answer': sentence if lexical else answer,
+                    'tier': 'lexical' if lexical else 'neural',
+                    'wall_time_s': lexical_s if lexical else lexical_s + neural_s
+                })
+            results[language] = {'language': language, 'questions_answers': answers}
+
+        metrics = calculate_metrics(results, references)
+        for language, lang_results in results.items():
+            answers = lang_results['questions_answers']
+            rows.append({
+                'threshold': threshold,
+                'language': language,
+                'lexical_hit_rate': round(sum(a['tier'] == 'lexical' for a in answers) / len(answers), 3),
+                'mean_latency_ms': round(sum(a['wall_time_s'] for a in answers) / len(answers) * 1000, 2),
+                'rouge1': metrics.get(language, {}).get('rouge1_avg', 0)
+            })
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the lexical cascade threshold against ROUGE")
+    parser.add_argument('--thresholds', nargs='+', type=float, default=[0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument('--languages', nargs='+', default=['en', 'mr', 'fr'])
+    parser.add_argument('--context-mode', choices=['truncate', 'windowed'], default='truncate')
+    parser.add_argument('--output', default=None, help="Write the rows as JSON")
+    args = parser.parse_args()
+
+    from main import load_context
+    from qa_models import MultilingualQASystem
+    from sample_questions import SAMPLE_QUESTIONS
+
+    contexts = {language: load_context(language, args.context_mode) for language in args.languages}
+    rows = tune_threshold(MultilingualQASystem(), contexts, SAMPLE_QUESTIONS, args.thresholds)
+
+    print(f"\n{'threshold':>10} {'lang':>5} {'lexical %':>10} {'mean ms':>10} {'ROUGE-1':>8}")
+    for row in rows:
+        threshold = 'neural' if row['threshold'] is None else f"{row['threshold']:.2f}"
+        print(f"{threshold:>10} {row['language']:>5} {row['lexical_hit_rate'] * 100:>9.0f}% "
+              f"{row['mean_latency_ms']:>10.2f} {row['rouge1']:>8.3f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,71 @@
+"""Local stand-in for the online TTS service, for offline load tests.
+
+Accepts POST requests with a JSON body {"text": ..., "lang": ...} and
+returns a silent MP3 whose length grows with the text, after an optional
+artificial delay. Point SpeechProcessor(tts_endpoint=...) at it:
+
+    python local_tts_server.py --port 8765 --delay 0.2
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import math
+import time
+
+# One MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, zeroed payload (silence)
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+FRAME_SECONDS = 1152 / 44100
+SECONDS_PER_CHARACTER = 0.06
+
+
+def silent_mp3(text):
+    """Silent MP3 roughly as long as reading the text aloud"""
+    frames = max(1, math.ceil(len(text) * SECONDS_PER_CHARACTER / FRAME_SECONDS))
+    return MP3_FRAME * frames
+
+
+def make_handler(delay):
+    class TTSHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length).decode('utf-8'))
+                audio = silent_mp3(payload['text'])
+            except (ValueError, KeyError) as e:
+                self.send_error(400, f"Bad request: {e}")
+                return
+
+            if delay:
+                time.sleep(delay)
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TTSHandler
+
+
+def start_server(host='127.0.0.1', port=8765, delay=0.0):
+    """Create the server; call serve_forever() (e.g. in a thread) to run it"""
+    return ThreadingHTTPServer((host, port), make_handler(delay))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in TTS server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help="Artificial latency per request in seconds")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.delay)
+    print(f"Local TTS server listening on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,22 +1,387 @@
-from pdf_processing import extract_text_from_pdf, prepare_context
+from pdf_processing import extract_text_from_pdf, prepare_context, load_or_build_index, retrieve_context
 from speech_processing import SpeechProcessor
-from qa_models import MultilingualQASystem
-from sample_questions import SAMPLE_QUESTIONS, LANGUAGE_CODES
+from sample_questions import SAMPLE_QUESTIONS, LANGUAGE_CODES, PDF_PATHS
+from retrieval import BM25Index
+from pipeline import Stage, run_pipeline
+from results_store import RESULTS_STREAM_PATH, RESULTS_PATH, ResultsWriter, compact
+from lexical_qa import CascadeQA
+from answer_streaming import segment_formats, stream_spoken_answer
+from cpu_scheduler import CPUScheduler, init_worker, parse_budgets, use_budget
+from answer_cache import DEFAULT_TTL_SECONDS, AnswerCache, document_hash
+from shared_models import (preload_qa_system, preload_speech_processor, prepare_fork, process_memory,
+                           memory_report, format_memory_report)
+from contextlib import contextmanager
+import argparse
+import gc
 import os
-import json
+import telemetry
+import time
 
-def main():
-    # Initialize components
-    print("Initializing system...")
-    qa_system = MultilingualQASystem()
-    speech_processor = SpeechProcessor()
-    
-    # PDF paths
-    pdf_paths = {
-        'en': '../data/pdfs/english.pdf',
-        'mr': '../data/pdfs/marathi.pdf', 
-        'fr': '../data/pdfs/french.pdf'
+TRANSCRIPTION_CACHE_DIR = '../data/cache/transcriptions'
+AUDIO_CACHE_DIR = '../data/cache/audio'
+ANSWER_CACHE_PATH = '../data/cache/answers.sqlite'
+AUDIO_OUTPUT_DIR = '../data/audio/output'
+TTS_CACHE_DIR = '../data/cache/tts'
+
+# Per-process components used by the pipeline's process-pool stages
+_worker_state = {}
+
+def load_context(lang_code, context_mode):
+    """Extract and prepare the document context for one language"""
+    context = extract_text_from_pdf(PDF_PATHS[lang_code])
+    if context_mode == 'windowed':
+        # Keep the whole document; the QA system windows it itself
+        return prepare_context(context, max_length=None)
+    if context_mode == 'retrieval':
+        # Build (or refresh) the index up front; QA loads it per question
+        load_or_build_index(context, lang_code, index_dir(lang_code))
+        return None
+    return prepare_context(context)
+
+def create_qa_system(backends=None, deterministic=False, answer_cache_path=None,
+                     answer_cache_ttl=DEFAULT_TTL_SECONDS, fused_sessions=False):
+    """MultilingualQASystem, with an answer cache backed by answer_cache_path if given"""
+    # torch and transformers are only imported once QA actually runs
+    from qa_models import MultilingualQASystem
+    
+    answer_cache = None
+    if answer_cache_path:
+        answer_cache = AnswerCache(ttl_seconds=answer_cache_ttl, db_path=answer_cache_path)
+    return MultilingualQASystem(backends=backends, deterministic=deterministic, answer_cache=answer_cache,
+                                fused_sessions=fused_sessions)
+
+def track_document(answer_cache, lang_code, context_mode, context):
+    """Invalidate cached answers about a previous version of a language's document"""
+    if answer_cache is None or context is None:
+        return
+    if answer_cache.track_document(f"{PDF_PATHS[lang_code]}#{context_mode}", document_hash(context)):
+        print(f"{lang_code.upper()} document changed; cached answers invalidated")
+
+def index_dir(lang_code):
+    return f"../data/index/{lang_code}"
+
+def build_items(lang_code, context, output_dir=AUDIO_OUTPUT_DIR):
+    """One work item per sample question of a language"""
+    items = []
+    for i, question_text in enumerate(SAMPLE_QUESTIONS[lang_code]):
+        audio_question_path = f"../data/audio/input/question_{lang_code}_{i+1}.mp3"
+        items.append({
+            'lang_code': lang_code,
+            'number': i + 1,
+            'question_text': question_text,
+            'audio_question_path': audio_question_path if os.path.exists(audio_question_path) else None,
+            'output_audio_path': os.path.join(output_dir, f"answer_{lang_code}_{i+1}.mp3"),
+            'context': context
+        })
+    return items
+
+@contextmanager
+def traced_step(item, step):
+    """Time one processing step of an item and merge its spans into item['telemetry']"""
+    with telemetry.trace(sample_memory=True) as current:
+        yield
+    
+    totals = item.setdefault('telemetry', {'wall_time_s': 0.0, 'peak_memory_mb': 0.0, 'spans': {}, 'counters': {}})
+    result = current.to_dict()
+    totals['wall_time_s'] = round(totals['wall_time_s'] + result['wall_time_s'], 4)
+    totals['peak_memory_mb'] = max(totals['peak_memory_mb'], result['peak_memory_mb'])
+    totals['spans'][step] = result['wall_time_s']
+    for name, seconds in result['spans'].items():
+        totals['spans'][name] = round(totals['spans'].get(name, 0.0) + seconds, 4)
+    for name, value in result['counters'].items():
+        totals['counters'][name] = totals['counters'].get(name, 0) + value
+
+def transcribe_question(speech_processor, item):
+    """Pick the question for QA, transcribing the audio version if present"""
+    with traced_step(item, 'speech_to_text'):
+        return _transcribe_question(speech_processor, item)
+
+def _transcribe_question(speech_processor, item):
+    item['question_source'] = "text"
+    item['question_transcribed'] = None
+    
+    if item['audio_question_path']:
+        try:
+            print("Audio file found - Using speech-to-text...")
+            transcribed_question = item.pop('batch_transcript', None)
+            if transcribed_question is None:
+                transcribed_question = speech_processor.speech_to_text(
+                    item['audio_question_path'], 
+                    LANGUAGE_CODES[item['lang_code']]
+                )
+            print(f"Transcribed: {transcribed_question}")
+            
+            # Use transcribed question for QA
+            item['question_transcribed'] = transcribed_question
+            item['question_for_qa'] = transcribed_question
+            item['question_source'] = "audio"
+            
+        except Exception as e:
+            print(f"Audio transcription failed: {e}")
+            print("Falling back to text input...")
+            item['question_for_qa'] = item['question_text']
+            item['question_source'] = "text_fallback"
+    else:
+        print("No audio file found - Using text input...")
+        item['question_for_qa'] = item['question_text']
+    
+    return item
+
+def answer_item(qa_system, item, context_mode, max_windows=16, top_k=3, index=None, session=None):
+    """Generate the answer for one work item
+
+    In truncate mode a DocumentSession opened on the item's context can be
+    passed to reuse its tokenized (and encoded) context across questions.
+    """
+    with traced_step(item, 'question_answering'):
+        return _answer_item(qa_system, item, context_mode, max_windows, top_k, index, session)
+
+def _answer_item(qa_system, item, context_mode, max_windows, top_k, index, session=None):
+    question, lang_code = item['question_for_qa'], item['lang_code']
+    print(f"Processing question: {question}")
+    
+    if context_mode == 'windowed':
+        answer = qa_system.answer_question_windowed(
+            question, item['context'], lang_code, max_windows=max_windows
+        )
+    elif context_mode == 'retrieval':
+        if index is None:
+            index = BM25Index.load(index_dir(lang_code))
+        with telemetry.span('retrieval'):
+            question_context = retrieve_context(index, question, top_k=top_k)
+        answer = qa_system.answer_question(question, question_context, lang_code)
+    elif session is not None:
+        answer = session.answer(question)
+    else:
+        answer = qa_system.answer_question(question, item['context'], lang_code)
+    
+    print(f"Answer: {answer}")
+    item['answer'] = answer
+    return item
+
+def synthesize_answer(speech_processor, item):
+    """Convert the answer of one work item to speech"""
+    with traced_step(item, 'text_to_speech'):
+        return _synthesize_answer(speech_processor, item)
+
+def _synthesize_answer(speech_processor, item):
+    output_audio_path = item['output_audio_path']
+    os.makedirs(os.path.dirname(output_audio_path), exist_ok=True)
+    
+    print("Generating speech output...")
+    success = speech_processor.text_to_speech(
+        item['answer'], 
+        LANGUAGE_CODES[item['lang_code']], 
+        output_audio_path
+    )
+    item['audio_generated'] = success
+    item['audio_output_path'] = output_audio_path if success else None
+    return item
+
+def stream_answer_item(qa_system, speech_processor, item, context_mode, max_windows=16, top_k=3, index=None):
+    """Answer one work item and speak it sentence by sentence while it is generated"""
+    with traced_step(item, 'streamed_answer'):
+        return _stream_answer_item(qa_system, speech_processor, item, context_mode, max_windows, top_k, index)
+
+def _stream_answer_item(qa_system, speech_processor, item, context_mode, max_windows, top_k, index):
+    question, lang_code = item['question_for_qa'], item['lang_code']
+    print(f"Processing question: {question}")
+    
+    if context_mode == 'windowed':
+        # Windows are scored together, so the answer is only spoken once complete;
+        # it is computed when its single chunk is pulled, so it is timed like a stream
+        chunks = (qa_system.answer_question_windowed(question, item['context'], lang_code,
+                                                     max_windows=max_windows) for _ in range(1))
+    else:
+        context = item['context']
+        if context_mode == 'retrieval':
+            if index is None:
+                index = BM25Index.load(index_dir(lang_code))
+            with telemetry.span('retrieval'):
+                context = retrieve_context(index, question, top_k=top_k)
+        chunks = qa_system.stream_answer(question, context, lang_code)
+    
+    waited = [0.0]
+    
+    def timed(chunks):
+        """The answer's chunks, timing how long each one is waited for"""
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            waited[0] += time.perf_counter() - start
+            if chunk is None:
+                return
+            yield chunk
+    
+    segments = []
+    with telemetry.trace() as answer_trace:
+        for segment in stream_spoken_answer(timed(iter(chunks)), speech_processor, lang_code,
+                                            item['output_audio_path']):
+            print(f"Segment {segment['index'] + 1} ready after {segment['ready_s']:.2f}s: {segment['text']}")
+            segments.append(segment)
+    # QA time for tokens/sec: generation runs on while sentences are spoken, so a
+    # streamed FLAN-T5 answer counts its generate time rather than the time waited
+    telemetry.add_span('question_answering', answer_trace.spans.get('generate', waited[0]))
+    
+    item['answer'] = " ".join(segment['text'] for segment in segments)
+    print(f"Answer: {item['answer']}")
+    item['time_to_first_audio_s'] = segments[0]['ready_s'] if segments else None
+    item['audio_segments'] = [segment['audio_path'] for segment in segments]
+    item['audio_generated'] = bool(segments) and all(item['audio_segments'])
+    # Segments from different TTS engines (mp3 and wav) are not joined into one file
+    combined = item['audio_generated'] and len(segment_formats(item['audio_segments'])) == 1
+    item['audio_output_path'] = item['output_audio_path'] if combined else None
+    return item
+
+def build_record(item):
+    """The qa_results.json entry for a processed work item"""
+    measured = item.get('telemetry', {})
+    counters = measured.get('counters', {})
+    return {
+        'question_text': item['question_text'],
+        'question_transcribed': item['question_transcribed'],
+        'question_used_for_qa': item['question_for_qa'],
+        'question_source': item['question_source'],
+        'audio_input_path': item['audio_question_path'],
+        'answer': item['answer'],
+        'audio_generated': item['audio_generated'],
+        'audio_output_path': item['audio_output_path'],
+        'audio_segments': item.get('audio_segments'),
+        'time_to_first_audio_s': item.get('time_to_first_audio_s'),
+        'wall_time_s': measured.get('wall_time_s'),
+        'input_tokens': counters.get('input_tokens', 0),
+        'output_tokens': counters.get('output_tokens', 0),
+        'peak_memory_mb': measured.get('peak_memory_mb'),
+        'timings': measured.get('spans', {})
     }
+
+def export_metrics(results, metrics_file):
+    """Write the per-question telemetry of a run as a Prometheus text file"""
+    registry = telemetry.MetricsRegistry()
+    for lang_code, lang_results in results.items():
+        for qa in lang_results['questions_answers']:
+            registry.observe_trace({
+                'wall_time_s': qa['wall_time_s'],
+                'spans': qa['timings'],
+                'counters': {'input_tokens': qa['input_tokens'], 'output_tokens': qa['output_tokens']}
+            }, language=lang_code)
+        if 'document_timings' in lang_results:
+            registry.observe_trace({'spans': lang_results['document_timings']}, language=lang_code)
+    
+    os.makedirs(os.path.dirname(metrics_file) or '.', exist_ok=True)
+    registry.export_prometheus(metrics_file)
+    print(f"Metrics exported to {metrics_file}")
+
+def _sample_memory(item, stage):
+    """Attach this worker's (and the parent's) current memory to the item, for --memory-report"""
+    if _worker_state.get('report_memory'):
+        samples = item.setdefault('worker_memory', {})
+        samples[f"{stage} {os.getpid()}"] = process_memory()
+        # Sampled while this worker still maps the parent's pages
+        samples['parent'] = process_memory(os.getppid())
+    return item
+
+def _init_asr_worker(report_memory=False, budgets=None, cpus=None):
+    if budgets is not None:
+        # A worker forked with shared weights keeps the parent's inter-op pool
+        init_worker(cpus, interop_threads=None if 'shared_speech' in _worker_state else 1)
+    _worker_state['budgets'] = budgets
+    # With shared weights the worker was forked from a parent that loaded Whisper
+    _worker_state['speech'] = _worker_state.pop('shared_speech', None)
+    if _worker_state['speech'] is None:
+        _worker_state['speech'] = SpeechProcessor(transcription_cache_dir=TRANSCRIPTION_CACHE_DIR,
+                                                  audio_cache_dir=AUDIO_CACHE_DIR)
+    _worker_state['report_memory'] = report_memory
+
+def _asr_task(item):
+    use_budget(_worker_state['budgets'], 'asr')
+    return _sample_memory(transcribe_question(_worker_state['speech'], item), 'asr')
+
+def _init_qa_worker(context_mode, max_windows, top_k, backends=None, cascade_threshold=None,
+                    qa_options=None, report_memory=False, budgets=None, cpus=None):
+    if budgets is not None:
+        init_worker(cpus, interop_threads=None if 'shared_qa' in _worker_state else 1)
+    _worker_state['budgets'] = budgets
+    qa_options = qa_options or {}
+    _worker_state['qa'] = _worker_state.pop('shared_qa', None)
+    if _worker_state['qa'] is None:
+        _worker_state['qa'] = create_qa_system(backends, **qa_options)
+    elif qa_options.get('answer_cache_path'):
+        # A SQLite connection must not cross a fork, so the shared system gets its cache here
+        _worker_state['qa'].answer_cache = AnswerCache(
+            ttl_seconds=qa_options.get('answer_cache_ttl', DEFAULT_TTL_SECONDS),
+            db_path=qa_options['answer_cache_path']
+        )
+    _worker_state['report_memory'] = report_memory
+    if cascade_threshold is not None:
+        _worker_state['qa'] = CascadeQA(_worker_state['qa'], cascade_threshold)
+    _worker_state['qa_options'] = (context_mode, max_windows, top_k)
+    _worker_state['indexes'] = {}
+    _worker_state['sessions'] = {}
+
+def _document_session(qa_system, lang_code, context):
+    """This worker's session for a language's document, reopened if the context changed"""
+    session = _worker_state['sessions'].get(lang_code)
+    if session is None or session.context != context:
+        with telemetry.span('document_session'):
+            session = qa_system.open_document(context, lang_code)
+        _worker_state['sessions'][lang_code] = session
+    return session
+
+def _qa_task(item):
+    context_mode, max_windows, top_k = _worker_state['qa_options']
+    use_budget(_worker_state['budgets'], f"qa-{item['lang_code']}")
+    lang_code = item['lang_code']
+    index = session = None
+    if context_mode == 'retrieval':
+        if lang_code not in _worker_state['indexes']:
+            _worker_state['indexes'][lang_code] = BM25Index.load(index_dir(lang_code))
+        index = _worker_state['indexes'][lang_code]
+    elif context_mode == 'truncate':
+        with traced_step(item, 'document_session'):
+            session = _document_session(_worker_state['qa'], lang_code, item['context'])
+    answer_item(_worker_state['qa'], item, context_mode, max_windows, top_k, index, session)
+    return _sample_memory(item, 'qa')
+
+def _init_tts_worker(tts_endpoint=None):
+    _worker_state['tts'] = SpeechProcessor(load_whisper=False, tts_cache_dir=TTS_CACHE_DIR,
+                                           tts_endpoint=tts_endpoint)
+
+def _tts_task(item):
+    return synthesize_answer(_worker_state['tts'], item)
+
+def _pending_items(lang_code, output_dir, writer):
+    """Work items of a language that the results stream does not have yet"""
+    items = build_items(lang_code, None, output_dir)
+    if writer is None:
+        return items
+    pending = [item for item in items if not writer.is_done(item)]
+    if len(pending) < len(items):
+        print(f"Skipping {len(items) - len(pending)} completed {lang_code.upper()} questions")
+    return pending
+
+def run_sequential(context_mode, max_windows, top_k, tts_endpoint=None, backends=None,
+                   qa_system=None, speech_processor=None, output_dir=AUDIO_OUTPUT_DIR, writer=None,
+                   cascade_threshold=None, qa_options=None, stream_answers=False):
+    """Process every question one after another in this process
+    
+    qa_system / speech_processor can be passed in to reuse or substitute
+    components (the benchmark runs this flow against tiny local models).
+    With a ResultsWriter, records are streamed to it instead of returned,
+    and items it already holds are skipped. With cascade_threshold, questions
+    the lexical tier answers confidently skip the QA models. qa_options are
+    passed to create_qa_system (deterministic decoding, answer cache, fused sessions).
+    With stream_answers, each answer is spoken sentence by sentence as it
+    is generated (see answer_streaming) instead of after it is complete.
+    """
+    if qa_system is None:
+        qa_system = create_qa_system(backends, **(qa_options or {}))
+    if cascade_threshold is not None:
+        qa_system = CascadeQA(qa_system, cascade_threshold)
+    if speech_processor is None:
+        speech_processor = SpeechProcessor(transcription_cache_dir=TRANSCRIPTION_CACHE_DIR,
+                                           audio_cache_dir=AUDIO_CACHE_DIR,
+                                           tts_cache_dir=TTS_CACHE_DIR, tts_endpoint=tts_endpoint)
     
     results = {}
     
@@ -24,94 +389,307 @@ def main():
     for lang_code in ['en', 'mr', 'fr']:
         print(f"\n=== Processing {lang_code.upper()} ===")
         
-        # Extract text from PDF
-        context = extract_text_from_pdf(pdf_paths[lang_code])
-        context = prepare_context(context)
+        items = _pending_items(lang_code, output_dir, writer)
+        if not items:
+            continue
         
-        results[lang_code] = {
-            'language': lang_code,
-            'questions_answers': []
-        }
-        
-        # Process each question with dual input support
-        for i, question_text in enumerate(SAMPLE_QUESTIONS[lang_code]):
-            print(f"\n--- Question {i+1} ---")
-            print(f"Text version: {question_text}")
+        with telemetry.trace() as document_trace:
+            # Extract text from PDF
+            with telemetry.span('context_preparation'):
+                context = load_context(lang_code, context_mode)
+            track_document(qa_system.answer_cache, lang_code, context_mode, context)
+            index = BM25Index.load(index_dir(lang_code)) if context_mode == 'retrieval' else None
+            for item in items:
+                item['context'] = context
             
-            # Check for audio input file
-            audio_question_path = f"../data/audio/input/question_{lang_code}_{i+1}.mp3"
+            # Tokenize (and for seq2seq models, encode) the document once for all questions
+            session = None
+            if context_mode == 'truncate' and not stream_answers:
+                with telemetry.span('document_session'):
+                    session = qa_system.open_document(context, lang_code)
             
-            question_source = "text"
-            transcribed_question = None
-            
-            if os.path.exists(audio_question_path):
-                try:
-                    print("Audio file found - Using speech-to-text...")
-                    transcribed_question = speech_processor.speech_to_text(
-                        audio_question_path, 
-                        LANGUAGE_CODES[lang_code]
+            # Transcribe all audio questions for this language in one batched pass;
+            # the per-question steps below use these transcripts
+            audio_items = [item for item in items if item['audio_question_path']]
+            if audio_items:
+                with telemetry.span('batch_transcription'):
+                    transcripts = speech_processor.speech_to_text_batch(
+                        [item['audio_question_path'] for item in audio_items], LANGUAGE_CODES[lang_code]
                     )
-                    print(f"Transcribed: {transcribed_question}")
-                    
-                    # Use transcribed question for QA
-                    question_for_qa = transcribed_question
-                    question_source = "audio"
-                    
-                except Exception as e:
-                    print(f"Audio transcription failed: {e}")
-                    print("Falling back to text input...")
-                    question_for_qa = question_text
-                    question_source = "text_fallback"
-            else:
-                print("No audio file found - Using text input...")
-                question_for_qa = question_text
-            
-            print(f"Processing question: {question_for_qa}")
-            
-            # Generate answer
-            answer = qa_system.answer_question(question_for_qa, context, lang_code)
-            print(f"Answer: {answer}")
-            
-            # Convert answer to speech
-            output_audio_path = f"../data/audio/output/answer_{lang_code}_{i+1}.mp3"
-            os.makedirs(os.path.dirname(output_audio_path), exist_ok=True)
+                for item, transcript in zip(audio_items, transcripts):
+                    item['batch_transcript'] = transcript
+        
+        if writer is not None:
+            writer.write_document(lang_code, document_trace.to_dict()['spans'])
+        else:
+            results[lang_code] = {
+                'language': lang_code,
+                'document_timings': document_trace.to_dict()['spans'],
+                'questions_answers': []
+            }
+        
+        # Process each question with dual input support
+        for item in items:
+            print(f"\n--- Question {item['number']} ---")
+            print(f"Text version: {item['question_text']}")
             
-            print("Generating speech output...")
-            success = speech_processor.text_to_speech(
-                answer, 
-                LANGUAGE_CODES[lang_code], 
-                output_audio_path
-            )
+            transcribe_question(speech_processor, item)
+            if stream_answers:
+                stream_answer_item(qa_system, speech_processor, item, context_mode, max_windows, top_k,
+                                   index)
+            else:
+                answer_item(qa_system, item, context_mode, max_windows, top_k, index, session)
+                synthesize_answer(speech_processor, item)
             
             # Store comprehensive results
-            results[lang_code]['questions_answers'].append({
-                'question_text': question_text,
-                'question_transcribed': transcribed_question,
-                'question_used_for_qa': question_for_qa,
-                'question_source': question_source,
-                'audio_input_path': audio_question_path if os.path.exists(audio_question_path) else None,
-                'answer': answer,
-                'audio_generated': success,
-                'audio_output_path': output_audio_path if success else None
-            })
+            if writer is not None:
+                writer.write_record(item, build_record(item))
+            else:
+                results[lang_code]['questions_answers'].append(build_record(item))
             
-            print(f"Question {i+1} processed successfully!")
+            print(f"Question {item['number']} processed successfully!")
+    
+    print(f"Model cache: {qa_system.get_cache_stats()}")
+    if qa_system.answer_cache is not None:
+        print(f"Answer cache: {qa_system.answer_cache.get_stats()}")
+    if isinstance(qa_system, CascadeQA):
+        print(f"Answer tiers: {qa_system.tier_stats()}")
+    print(f"Transcription cache: {speech_processor.transcription_stats}")
+    print(f"TTS cache: {speech_processor.tts_stats}")
+    speech_processor.close()
+    return results
+
+def run_pipelined(context_mode, max_windows, top_k, tts_endpoint=None, backends=None,
+                  asr_workers=1, qa_workers=1, tts_workers=4, queue_size=4, writer=None,
+                  cascade_threshold=None, qa_options=None, shared_weights=False, report_memory=False,
+                  scheduler=None):
+    """Run speech-to-text, QA and text-to-speech as concurrent stages
+    
+    With a ResultsWriter, each record is written as soon as its item leaves
+    the last stage and items the writer already holds are skipped.
+    With shared_weights, Whisper and the QA models are loaded once here and
+    the worker processes are forked from this process, sharing the weights
+    copy-on-write instead of each loading a copy. report_memory prints the
+    unique and shared memory of every worker at the end.
+    A CPUScheduler gives the ASR and QA workers explicit thread budgets
+    (and cores, if it pins them) and moves cores toward the busier stage.
+    """
+    qa_options = qa_options or {}
+    # Workers open their own caches; this one only records document versions
+    answer_cache = None
+    if qa_options.get('answer_cache_path'):
+        answer_cache = AnswerCache(db_path=qa_options['answer_cache_path'])
+    
+    items = []
+    document_timings = {}
+    for lang_code in ['en', 'mr', 'fr']:
+        lang_items = _pending_items(lang_code, AUDIO_OUTPUT_DIR, writer)
+        if not lang_items:
+            continue
+        with telemetry.trace() as document_trace:
+            with telemetry.span('context_preparation'):
+                context = load_context(lang_code, context_mode)
+        track_document(answer_cache, lang_code, context_mode, context)
+        document_timings[lang_code] = document_trace.to_dict()['spans']
+        if writer is not None:
+            writer.write_document(lang_code, document_timings[lang_code])
+        for item in lang_items:
+            item['context'] = context
+        items.extend(lang_items)
+    if answer_cache is not None:
+        answer_cache.close()
+    
+    start_method = 'spawn'
+    if shared_weights:
+        print("Loading shared model weights...")
+        _worker_state['shared_speech'] = preload_speech_processor(
+            SpeechProcessor(transcription_cache_dir=TRANSCRIPTION_CACHE_DIR, audio_cache_dir=AUDIO_CACHE_DIR)
+        )
+        # Workers open their own answer caches after the fork
+        _worker_state['shared_qa'] = preload_qa_system(
+            create_qa_system(backends, deterministic=qa_options.get('deterministic', False),
+                             fused_sessions=qa_options.get('fused_sessions', False))
+        )
+        prepare_fork()
+        start_method = 'fork'
+    
+    budgets = asr_cpus = qa_cpus = monitor = None
+    if scheduler is not None:
+        print(f"CPU budgets: {scheduler.allocate(asr_workers, qa_workers)}")
+        budgets, asr_cpus, qa_cpus = scheduler.budgets, scheduler.stage_cpus('asr'), scheduler.stage_cpus('qa')
+        tts_workers = budgets['tts']
+        monitor = lambda busy: scheduler.observe({'asr': busy['speech-to-text'],
+                                                   'qa': busy['question-answering']})
+    
+    stages = [
+        Stage('speech-to-text', _asr_task, workers=asr_workers, kind='process',
+              initializer=_init_asr_worker, initargs=(report_memory, budgets, asr_cpus),
+              start_method=start_method),
+        Stage('question-answering', _qa_task, workers=qa_workers, kind='process',
+              initializer=_init_qa_worker,
+              initargs=(context_mode, max_windows, top_k, backends, cascade_threshold, qa_options,
+                        report_memory, budgets, qa_cpus),
+              start_method=start_method),
+        Stage('text-to-speech', _tts_task, workers=tts_workers, kind='thread',
+              initializer=_init_tts_worker, initargs=(tts_endpoint,)),
+    ]
+    worker_memory = {}
+    
+    def collect_memory(item):
+        worker_memory.update(item.pop('worker_memory', {}))
+        return item
+    
+    on_result = None
+    if writer is not None:
+        on_result = lambda item: writer.write_record(collect_memory(item), build_record(item))
+    try:
+        processed = run_pipeline(items, stages, queue_size=queue_size, on_result=on_result, monitor=monitor)
+        for item in processed:
+            collect_memory(item)
+        if scheduler is not None:
+            print(f"CPU budgets at the end: {scheduler.plan()}")
+        if report_memory:
+            title = "shared weights" if shared_weights else "separate weights"
+            print(f"\nWorker memory ({title}):")
+            parent = worker_memory.pop('parent', None)
+            print(format_memory_report(memory_report(worker_memory, parent)))
+    finally:
+        if 'tts' in _worker_state:
+            _worker_state.pop('tts').close()
+        if shared_weights:
+            _worker_state.pop('shared_speech', None)
+            _worker_state.pop('shared_qa', None)
+            gc.unfreeze()
+    
+    results = {}
+    for item in processed:
+        lang_code = item['lang_code']
+        results.setdefault(lang_code, {'language': lang_code, 'document_timings': document_timings[lang_code],
+                                       'questions_answers': []})
+        results[lang_code]['questions_answers'].append(build_record(item))
+    return results
+
+def main(context_mode='truncate', max_windows=16, top_k=3, pipelined=False, tts_endpoint=None,
+         backends=None, metrics_file=None, resume=False, checkpoint_every=10, cascade_threshold=None,
+         qa_options=None, stream_answers=False, **pipeline_options):
+    # Initialize components
+    print("Initializing system...")
+    
+    # Records are streamed to JSONL as they finish so a crash loses at most
+    # the last checkpoint; --resume continues an interrupted stream
+    writer = ResultsWriter(RESULTS_STREAM_PATH, checkpoint_every=checkpoint_every, resume=resume)
+    try:
+        if pipelined:
+            run_pipelined(context_mode, max_windows, top_k, tts_endpoint, backends,
+                          writer=writer, cascade_threshold=cascade_threshold, qa_options=qa_options,
+                          **pipeline_options)
+        else:
+            run_sequential(context_mode, max_windows, top_k, tts_endpoint, backends, writer=writer,
+                           cascade_threshold=cascade_threshold, qa_options=qa_options,
+                           stream_answers=stream_answers)
+    finally:
+        writer.close()
     
     # Save comprehensive results
-    os.makedirs('../results', exist_ok=True)
-    with open('../results/qa_results.json', 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    results = compact(RESULTS_STREAM_PATH, RESULTS_PATH)
     
     print("\n === Processing Complete ===")
-    print("Results saved to ../results/qa_results.json")
+    print(f"Results saved to {RESULTS_PATH}")
+    
+    if metrics_file:
+        export_metrics(results, metrics_file)
     
     # Print summary
     print("\n SUMMARY:")
     for lang_code in ['en', 'mr', 'fr']:
-        audio_count = sum(1 for qa in results[lang_code]['questions_answers'] 
+        questions = results.get(lang_code, {}).get('questions_answers', [])
+        audio_count = sum(1 for qa in questions 
                          if qa['question_source'] == 'audio')
-        text_count = len(results[lang_code]['questions_answers']) - audio_count
+        text_count = len(questions) - audio_count
         print(f"{lang_code.upper()}: {audio_count} audio inputs, {text_count} text inputs")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Multilingual voice-based document QA")
+    parser.add_argument('--context-mode', choices=['truncate', 'windowed', 'retrieval'], default='truncate',
+                        help="truncate: first 1000 characters; windowed: sliding windows over the full text; "
+                             "retrieval: top-k BM25 passages per question")
+    parser.add_argument('--max-windows', type=int, default=16,
+                        help="Maximum number of context windows scored per question")
+    parser.add_argument('--top-k', type=int, default=3,
+                        help="Number of retrieved passages passed to the QA model")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Run speech-to-text, QA and text-to-speech as concurrent stages")
+    parser.add_argument('--asr-workers', type=int, default=1, help="Speech-to-text worker processes")
+    parser.add_argument('--qa-workers', type=int, default=1, help="Question answering worker processes")
+    parser.add_argument('--tts-workers', type=int, default=4, help="Text-to-speech worker threads")
+    parser.add_argument('--queue-size', type=int, default=4, help="Bounded queue size between stages")
+    parser.add_argument('--shared-weights', action='store_true',
+                        help="Load the models once and fork the worker processes so they share the "
+                             "weights (Linux; not with onnx backends)")
+    parser.add_argument('--cpu-schedule', action='store_true',
+                        help="Give the ASR and QA workers explicit thread budgets that follow the busier stage")
+    parser.add_argument('--pin-cpus', action='store_true',
+                        help="With --cpu-schedule, pin each stage to its own cores (static budgets)")
+    parser.add_argument('--thread-budget', nargs='+', default=[], metavar='KEY=N',
+                        help="Fixed budgets with --cpu-schedule, e.g. asr=2 qa-en=2 qa-fr=1 tts=8")
+    parser.add_argument('--memory-report', action='store_true',
+                        help="Print each worker's unique and shared memory after a pipelined run")
+    parser.add_argument('--tts-endpoint', default=None,
+                        help="Use an HTTP TTS server (e.g. local_tts_server.py) instead of gTTS")
+    parser.add_argument('--backend', nargs='+', default=[], metavar='LANG=BACKEND',
+                        help="QA inference backend per language, e.g. en=int8 fr=onnx "
+                             "(eager, int8, compile or onnx)")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Also export per-stage timings in Prometheus text format, "
+                             "e.g. ../results/metrics.prom")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run, skipping questions already in qa_results.jsonl")
+    parser.add_argument('--checkpoint-every', type=int, default=10,
+                        help="fsync the results stream after this many records")
+    parser.add_argument('--cascade-threshold', type=float, default=None,
+                        help="Answer from the best-matching sentence when its lexical confidence "
+                             "(0-1) reaches this value, and use the QA models otherwise")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="Decode FLAN-T5 answers greedily instead of sampling (makes them cacheable)")
+    parser.add_argument('--fused-encoder', action='store_true',
+                        help="In truncate mode, encode each document once and reuse FLAN-T5's encoder "
+                             "states for every question (changes answers; see compare_session_encoding.py)")
+    parser.add_argument('--answer-cache', nargs='?', const=ANSWER_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"Cache answers in a SQLite file (default {ANSWER_CACHE_PATH}) across runs")
+    parser.add_argument('--answer-cache-ttl', type=float, default=DEFAULT_TTL_SECONDS,
+                        help="Seconds a cached answer stays valid")
+    parser.add_argument('--stream-answers', action='store_true',
+                        help="Speak each answer sentence by sentence while it is generated "
+                             "(not with --pipeline)")
+    args = parser.parse_args()
+    if args.cpu_schedule and not args.pipeline:
+        parser.error("--cpu-schedule budgets the --pipeline worker processes")
+    if args.stream_answers and args.pipeline:
+        parser.error("--stream-answers runs QA and TTS together and cannot be combined with --pipeline")
+    backends = dict(option.split('=', 1) for option in args.backend)
+    
+    pipeline_options = {}
+    if args.pipeline:
+        pipeline_options = {
+            'asr_workers': args.asr_workers,
+            'qa_workers': args.qa_workers,
+            'tts_workers': args.tts_workers,
+            'queue_size': args.queue_size,
+            'shared_weights': args.shared_weights,
+            'report_memory': args.memory_report
+        }
+        if args.cpu_schedule:
+            try:
+                overrides = parse_budgets(args.thread_budget)
+            except ValueError as e:
+                parser.error(str(e))
+            pipeline_options['scheduler'] = CPUScheduler(overrides=overrides, pin=args.pin_cpus,
+                                                         tts_threads=args.tts_workers)
+    main(context_mode=args.context_mode, max_windows=args.max_windows, top_k=args.top_k,
+         pipelined=args.pipeline, tts_endpoint=args.tts_endpoint, backends=backends,
+         metrics_file=args.metrics_file, resume=args.resume, checkpoint_every=args.checkpoint_every,
+         cascade_threshold=args.cascade_threshold,
+         qa_options={'deterministic': args.deterministic, 'answer_cache_path': args.answer_cache,
+                     'answer_cache_ttl': args.answer_cache_ttl, 'fused_sessions': args.fused_encoder},
+         stream_answers=args.stream_answers,
+         **pipeline_options)
@@ -0,0 +1,246 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from telemetry import percentile
+import argparse
+import json
+import os
+import random
+import unicodedata
+
+REFERENCES_PATH = '../data/references.json'
+
+# Records are scored in chunks; one chunk is the unit of work per process
+CHUNK_SIZE = 1000
+# Latencies kept per language for percentiles; larger runs are sampled
+LATENCY_SAMPLE_SIZE = 10000
+MAX_NGRAM_ORDER = 4
+
+def reference_key(question):
+    """Normalised question text used to look up references"""
+    return " ".join(unicodedata.normalize('NFC', question).split())
+
+def load_references(path=REFERENCES_PATH):
+    """Reference answers keyed by language and question text"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            references = json.load(f)
+    except FileNotFoundError:
+        print(f"No reference answers found at {path}; ROUGE/BLEU will be skipped")
+        return {}
+    return {
+        language: {reference_key(question): answer for question, answer in answers.items()}
+        for language, answers in references.items()
+    }
+
+def iter_records(source):
+    """Yield (language, record) pairs from a results dict or results file.
+
+    A .jsonl results stream (one record with a 'language' field per line,
+    as written by results_store) is read line by line; a .json file or dict
+    uses the qa_results.json layout.
+    """
+    if isinstance(source, dict):
+        for language, lang_results in source.items():
+            for record in lang_results.get('questions_answers', []):
+                yield language, record
+        return
+
+    if source.endswith('.jsonl'):
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Blank lines or a record torn by an interrupted run
+                    continue
+                if record.get('record_type') != 'document':
+                    yield record['language'], record
+        return
+
+    with open(source, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    yield from iter_records(results)
+
+def _new_totals():
+    return {
+        'questions': 0,
+        'audio_inputs': 0,
+        'audio_outputs': 0,
+        'answer_chars': 0,
+        'quality_answers': 0,
+        'referenced': 0,
+        'rouge1_sum': 0.0,
+        'bleu_sum': 0.0,
+        'bleu_stats': [0] * (2 + 2 * MAX_NGRAM_ORDER),
+        'latencies': [],
+        'latencies_seen': 0,
+        'qa_seconds': 0.0,
+        'output_tokens': 0
+    }
+
+def _merge_totals(totals, partial, rng):
+    """Add one chunk's per-language totals into the running totals"""
+    for language, part in partial.items():
+        current = totals.setdefault(language, _new_totals())
+        for key, value in part.items():
+            if key == 'bleu_stats':
+                current[key] = [a + b for a, b in zip(current[key], value)]
+            elif key not in ('latencies', 'latencies_seen'):
+                current[key] += value
+
+        # Reservoir sampling (Algorithm R): every latency seen so far is kept
+        # with the same probability, whichever chunk it came from
+        sample = current['latencies']
+        for latency in part['latencies']:
+            current['latencies_seen'] += 1
+            if len(sample) < LATENCY_SAMPLE_SIZE:
+                sample.append(latency)
+            else:
+                slot = rng.randrange(current['latencies_seen'])
+                if slot < LATENCY_SAMPLE_SIZE:
+                    sample[slot] = latency
+
+# Per-process scorer state, created once by _init_scorer
+_scorer = {}
+
+def _init_scorer(references):
+    from rouge_score import rouge_scorer
+    from sacrebleu.metrics import BLEU
+    
+    _scorer['references'] = references
+    _scorer['rouge'] = rouge_scorer.RougeScorer(['rouge1'], use_stemmer=True)
+    # Matches sacrebleu.sentence_bleu: exp smoothing with effective order
+    _scorer['bleu'] = BLEU(effective_order=True)
+
+def _score_chunk(chunk):
+    """Per-language totals for a list of (language, record) pairs"""
+    references = _scorer['references']
+    totals = {}
+    for language, qa in chunk:
+        lang_totals = totals.setdefault(language, _new_totals())
+        lang_totals['questions'] += 1
+        lang_totals['audio_inputs'] += qa.get('question_source') == 'audio'
+        lang_totals['audio_outputs'] += bool(qa.get('audio_generated', False))
+
+        hypothesis = qa.get('answer', "")
+        if not isinstance(hypothesis, str):
+            hypothesis = str(hypothesis)
+        lang_totals['answer_chars'] += len(hypothesis)
+        # Quality score based on answer length and fallback phrases
+        if len(hypothesis) > 10 and not hypothesis.lower().startswith("unable to find"):
+            lang_totals['quality_answers'] += 1
+
+        if qa.get('wall_time_s') is not None:
+            lang_totals['latencies'].append(qa['wall_time_s'])
+        lang_totals['qa_seconds'] += qa.get('timings', {}).get('question_answering', 0)
+        lang_totals['output_tokens'] += qa.get('output_tokens', 0)
+
+        reference = references.get(language, {}).get(reference_key(qa.get('question_text', "")))
+        if reference is None:
+            continue
+
+        lang_totals['referenced'] += 1
+        hypothesis = hypothesis.strip()
+        # The sentence score also carries the n-gram statistics summed for corpus BLEU
+        bleu = _scorer['bleu'].sentence_score(hypothesis, [reference])
+        stats = [bleu.sys_len, bleu.ref_len] + list(bleu.counts) + list(bleu.totals)
+        lang_totals['bleu_stats'] = [a + b for a, b in zip(lang_totals['bleu_stats'], stats)]
+        if hypothesis:
+            lang_totals['rouge1_sum'] += _scorer['rouge'].score(reference, hypothesis)['rouge1'].fmeasure
+            lang_totals['bleu_sum'] += bleu.score
+
+    return totals
+
+def _chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _finalize(totals):
+    from sacrebleu.metrics import BLEU
+    
+    questions = totals['questions']
+    referenced = totals['referenced']
+    stats = totals['bleu_stats']
+    corpus_bleu = BLEU.compute_bleu(
+        correct=stats[2:2 + MAX_NGRAM_ORDER],
+        total=stats[2 + MAX_NGRAM_ORDER:],
+        sys_len=stats[0],
+        ref_len=stats[1],
+        smooth_method='exp'
+    ).score if referenced else 0.0
+    latencies = totals['latencies']
+
+    return {
+        'questions': questions,
+        'referenced': referenced,
+        'audio_input_success': round(totals['audio_inputs'] / questions * 100, 1),
+        'audio_output_success': round(totals['audio_outputs'] / questions * 100, 1),
+        'avg_answer_length': round(totals['answer_chars'] / questions, 1),
+        'answer_quality': round(totals['quality_answers'] / questions * 5, 1),  # scale 1 to 5
+        'rouge1_avg': round(totals['rouge1_sum'] / referenced, 3) if referenced else 0,
+        'bleu_avg': round(totals['bleu_sum'] / referenced, 2) if referenced else 0,
+        'bleu_corpus': round(corpus_bleu, 2),
+        'latency_p50_s': round(percentile(latencies, 50), 3) if latencies else None,
+        'latency_p95_s': round(percentile(latencies, 95), 3) if latencies else None,
+        'tokens_per_second': round(totals['output_tokens'] / totals['qa_seconds'], 1) if totals['qa_seconds'] else None
+    }
+
+def score_records(records, references=None, workers=None, chunk_size=CHUNK_SIZE):
+    """Score a stream of (language, record) pairs into per-language metrics.
+
+    Records are consumed in chunks and only running totals are kept, so
+    memory does not grow with the number of answers. With several workers,
+    chunks are scored in a process pool with a bounded number in flight.
+    """
+    if references is None:
+        references = load_references()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    totals = {}
+    rng = random.Random(0)
+    chunks = _chunks(records, chunk_size)
+
+    first = next(chunks, None)
+    if first is None:
+        return {}
+    if workers <= 1 or len(first) < chunk_size:
+        # Small inputs are not worth starting a pool for
+        _init_scorer(references)
+        _merge_totals(totals, _score_chunk(first), rng)
+        for chunk in chunks:
+            _merge_totals(totals, _score_chunk(chunk), rng)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_scorer,
+                                 initargs=(references,)) as executor:
+            in_flight = deque([executor.submit(_score_chunk, first)])
+            for chunk in chunks:
+                in_flight.append(executor.submit(_score_chunk, chunk))
+                if len(in_flight) >= workers * 2:
+                    _merge_totals(totals, in_flight.popleft().result(), rng)
+            while in_flight:
+                _merge_totals(totals, in_flight.popleft().result(), rng)
+
+    return {language: _finalize(lang_totals) for language, lang_totals in totals.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score QA results against reference answers")
+    parser.add_argument('results', nargs='?', default='../results/qa_results.json',
+                        help="qa_results.json or a .jsonl stream of records")
+    parser.add_argument('--references', default=REFERENCES_PATH)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', default=None, help="Write the metrics as JSON")
+    args = parser.parse_args()
+
+    metrics = score_records(iter_records(args.results), load_references(args.references),
+                            args.workers, args.chunk_size)
+    print(json.dumps(metrics, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
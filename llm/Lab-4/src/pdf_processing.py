@@ -1,27 +1,250 @@
-import pdfplumber
+import hashlib
+import json
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from retrieval import BM25Index
+import telemetry
 
-def extract_text_from_pdf(pdf_path):
-    """Extract clean text from PDF file"""
-    text = ""
+# Bump when the extraction or cleaning logic changes so cached text is redone
+EXTRACTOR_VERSION = 1
+EXTRACTION_CACHE_DIR = '../data/cache/extraction'
+MANIFEST_NAME = 'ingest_manifest.json'
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extraction_cache_path(content_hash, cache_dir=EXTRACTION_CACHE_DIR):
+    """Cache file for a PDF's text, keyed by content hash and extractor settings"""
+    settings = json.dumps({'extractor': 'pdfplumber', 'version': EXTRACTOR_VERSION}, sort_keys=True)
+    key = hashlib.sha256(f"{content_hash}:{settings}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{key}.txt")
+
+def clean_text(text):
+    """Collapse newlines and whitespace runs into single spaces"""
+    text = re.sub(r'\n+', '\n', text)  # Remove multiple newlines
+    text = re.sub(r'\s+', ' ', text)   # Normalize whitespace
+    return text.strip()
+
+def _page_texts(pages):
+    """Raw text of each page that has any"""
+    texts = []
+    for page in pages:
+        page_text = page.extract_text()
+        if page_text:
+            texts.append(page_text)
+        # Drop the page's parsed layout objects once its text is out
+        page.flush_cache()
+    return texts
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract raw text for pages [start, end) in a worker process"""
+    import pdfplumber
+    
+    # pdfplumber numbers pages from 1; only the requested pages are built
+    with pdfplumber.open(pdf_path, pages=range(start + 1, end + 1)) as pdf:
+        return _page_texts(pdf.pages)
+
+def iter_pdf_text(pdf_path, pages_per_chunk=1, workers=1):
+    """Yield cleaned text for each chunk of pages_per_chunk pages, in order
+    
+    Only the pages currently being extracted are held in memory, so
+    consumers can start chunking or indexing before extraction finishes.
+    With workers > 1, up to 2 * workers chunks are extracted ahead in a
+    process pool.
+    """
+    import pdfplumber
+    
+    with pdfplumber.open(pdf_path) as pdf:
+        num_pages = len(pdf.pages)
+        ranges = [(start, min(start + pages_per_chunk, num_pages))
+                  for start in range(0, num_pages, pages_per_chunk)]
+        
+        if workers <= 1 or len(ranges) == 1:
+            # One open document for every chunk; reopening it per chunk
+            # would rebuild every page object each time
+            for start, end in ranges:
+                chunk = clean_text("\n".join(_page_texts(pdf.pages[start:end])))
+                if chunk:
+                    yield chunk
+            return
+    
+    workers = min(workers, len(ranges))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.submit(_extract_page_range, pdf_path, start, end))
+            if len(pending) >= 2 * workers:
+                chunk = clean_text("\n".join(pending.popleft().result()))
+                if chunk:
+                    yield chunk
+        while pending:
+            chunk = clean_text("\n".join(pending.popleft().result()))
+            if chunk:
+                yield chunk
+
+def extract_text_from_pdf(pdf_path, cache_dir=EXTRACTION_CACHE_DIR, workers=None):
+    """Extract clean text from PDF file
+    
+    Results are cached on disk by file content hash, so an unchanged PDF is
+    only parsed once. Pass cache_dir=None to always re-extract.
+    """
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        cache_path = None
+        if cache_dir:
+            cache_path = extraction_cache_path(file_hash(pdf_path), cache_dir)
+            if os.path.exists(cache_path):
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    return f.read()
         
-        # Clean up text
-        text = re.sub(r'\n+', '\n', text)  # Remove multiple newlines
-        text = re.sub(r'\s+', ' ', text)   # Normalize whitespace
-        return text.strip()
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # Each task reopens the PDF, so hand workers several pages at a time
+        pages_per_chunk = 8 if workers > 1 else 1
+        with telemetry.span('extraction'):
+            text = " ".join(iter_pdf_text(pdf_path, pages_per_chunk=pages_per_chunk, workers=workers))
+        
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+        
+        return text
     
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
         return ""
 
+def load_cached_text(content_hash, cache_dir=EXTRACTION_CACHE_DIR):
+    """Read previously extracted text for a content hash"""
+    with open(extraction_cache_path(content_hash, cache_dir), 'r', encoding='utf-8') as f:
+        return f.read()
+
+def ingest_directory(pdf_dir, cache_dir=EXTRACTION_CACHE_DIR, workers=None):
+    """Extract every PDF under pdf_dir, reprocessing only added or modified files
+    
+    A manifest in cache_dir records size, mtime and content hash per file so
+    unchanged files are skipped without re-hashing. Returns a dict mapping
+    each PDF path to its content hash (use load_cached_text to read it) and
+    prints a summary of added / modified / removed / unchanged files.
+    Files whose extraction fails are reported and left out of both the
+    result and the manifest, so the next ingest retries them.
+    """
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    
+    summary = {'added': 0, 'modified': 0, 'removed': 0, 'unchanged': 0}
+    documents = {}
+    new_manifest = {}
+    failed = []
+    
+    for root, _, files in os.walk(pdf_dir):
+        for name in sorted(files):
+            if not name.lower().endswith('.pdf'):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            entry = manifest.get(path)
+            
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime \
+                    and os.path.exists(extraction_cache_path(entry['hash'], cache_dir)):
+                summary['unchanged'] += 1
+                content_hash = entry['hash']
+            else:
+                content_hash = file_hash(path)
+                if not os.path.exists(extraction_cache_path(content_hash, cache_dir)):
+                    print(f"Extracting {path}...")
+                    extract_text_from_pdf(path, cache_dir=cache_dir, workers=workers)
+                    # extract_text_from_pdf only writes the cache when extraction succeeded
+                    if not os.path.exists(extraction_cache_path(content_hash, cache_dir)):
+                        failed.append(path)
+                        continue
+                summary['modified' if entry else 'added'] += 1
+            
+            new_manifest[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': content_hash}
+            documents[path] = content_hash
+    
+    summary['removed'] = len(set(manifest) - set(new_manifest) - set(failed))
+    summary['failed'] = len(failed)
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(new_manifest, f, ensure_ascii=False, indent=2)
+    
+    print(f"Ingested {pdf_dir}: {summary}")
+    for path in failed:
+        print(f"Failed to extract {path}; it will be retried on the next ingest")
+    return documents
+
 def prepare_context(text, max_length=1000):
-    """Prepare context for QA model by truncating if necessary"""
-    if len(text) > max_length:
+    """Prepare context for QA model by truncating if necessary
+    
+    Pass max_length=None to keep the full text, e.g. for windowed QA.
+    """
+    if max_length is not None and len(text) > max_length:
         return text[:max_length] + "..."
     return text
+
+def iter_passages(chunks, passage_words=120, overlap_words=30):
+    """Yield overlapping passages from a stream of text chunks
+    
+    Only the words of the passage being assembled are buffered, so this can
+    be fed directly from iter_pdf_text.
+    """
+    step = max(passage_words - overlap_words, 1)
+    words = []
+    emitted = False
+    for chunk in chunks:
+        words.extend(chunk.split())
+        while len(words) >= passage_words:
+            yield " ".join(words[:passage_words])
+            emitted = True
+            words = words[step:]
+    # Emit the tail unless it is fully covered by the previous passage
+    if words and (not emitted or len(words) > overlap_words):
+        yield " ".join(words)
+
+def chunk_text(text, passage_words=120, overlap_words=30):
+    """Split text into overlapping passages of roughly passage_words words"""
+    return list(iter_passages([text], passage_words, overlap_words))
+
+def load_or_build_index(text, language, index_dir, passage_words=120, overlap_words=30):
+    """Load the passage index for a document, rebuilding it if the text changed"""
+    source_hash = hashlib.sha256(
+        f"{passage_words}:{overlap_words}:{text}".encode('utf-8')
+    ).hexdigest()
+    
+    if os.path.exists(os.path.join(index_dir, 'meta.json')):
+        index = BM25Index.load(index_dir)
+        if index.meta.get('source_hash') == source_hash:
+            return index
+    
+    print(f"Building passage index for {language} in {index_dir}...")
+    passages = chunk_text(text, passage_words, overlap_words)
+    index = BM25Index.build(passages, language, source_hash=source_hash)
+    index.save(index_dir)
+    return BM25Index.load(index_dir)
+
+def retrieve_context(index, question, top_k=3):
+    """Join the top_k passages for a question into a single QA context"""
+    hits = index.search(question, top_k=top_k)
+    return " ".join(text for _, _, text in hits)
+
+if __name__ == "__main__":
+    import sys
+    
+    if len(sys.argv) != 3 or sys.argv[1] != 'ingest':
+        print("Usage: python pdf_processing.py ingest <pdf_dir>")
+        sys.exit(1)
+    ingest_directory(sys.argv[2])
@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+_SENTINEL = object()
+
+
+class Stage:
+    """One step of a pipeline and the workers that run it.
+
+    kind='thread' runs func in worker threads (for I/O-bound work such as
+    TTS requests). kind='process' runs func in a process pool whose workers
+    are set up once with initializer (for CPU-bound model inference); func
+    and the items must then be picklable.
+
+    Process workers are spawned by default. start_method='fork' forks them
+    from this process instead, so they inherit whatever it has loaded
+    (see shared_models); they are all forked when the pipeline starts.
+    """
+
+    def __init__(self, name, func, workers=1, kind='thread', initializer=None, initargs=(),
+                 start_method='spawn'):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown stage kind: {kind}")
+        if start_method not in ('spawn', 'fork', 'forkserver'):
+            raise ValueError(f"Unknown start method: {start_method}")
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.kind = kind
+        self.initializer = initializer
+        self.initargs = initargs
+        self.start_method = start_method
+
+
+class _StageFailure:
+    """Carries an exception past the remaining stages for one item"""
+
+    def __init__(self, stage_name, error):
+        self.stage_name = stage_name
+        self.error = error
+
+
+def run_pipeline(items, stages, queue_size=4, on_result=None, monitor=None, monitor_interval=0.5):
+    """Push items through stages concurrently and return outputs in input order.
+
+    Stages are connected by bounded queues of queue_size items, so a fast
+    stage cannot run arbitrarily far ahead of a slow one. Each stage has its
+    own worker pool, which keeps every stage busy at the same time: total
+    wall time approaches that of the slowest stage rather than the sum.
+    If any item fails, the first error is raised once the pipeline drains.
+    If the caller's side fails instead (on_result raises, or the pipeline
+    is interrupted), queued items are dropped, pending process tasks are
+    cancelled and the error is raised without waiting for the stages.
+    
+    With on_result, each finished item is passed to it as soon as it leaves
+    the last stage (in completion order) instead of being collected, and
+    an empty list is returned.
+
+    With monitor, a background thread passes it {stage name: busy seconds}
+    every monitor_interval seconds while the pipeline runs: the time the
+    stage's workers have spent processing items so far (including items
+    still in progress), summed over its workers. A stage whose busy time
+    grows as fast as its worker count allows is the bottleneck; the others
+    wait on its queues (e.g. to rebalance CPU budgets, see cpu_scheduler).
+    """
+    items = list(items)
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    pools = []
+    threads = []
+    finished = threading.Event()
+    aborted = threading.Event()
+    # Per stage: seconds spent on finished items, and start times of items in progress
+    busy = [0.0] * len(stages)
+    running = [{} for _ in stages]
+    busy_lock = threading.Lock()
+
+    # Stage threads block on their queues in short waits so that an aborted
+    # pipeline stops them instead of leaving them stuck on a full queue
+    def put(q, entry):
+        while not aborted.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def get(q):
+        while not aborted.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _SENTINEL
+
+    def feed():
+        for seq, item in enumerate(items):
+            put(queues[0], (seq, item))
+        for _ in range(stages[0].workers):
+            put(queues[0], _SENTINEL)
+
+    def make_worker(index, stage, pool, remaining, lock):
+        inbox, outbox = queues[index], queues[index + 1]
+        next_workers = stages[index + 1].workers if index + 1 < len(stages) else 1
+        token = object()
+
+        def work():
+            while True:
+                entry = get(inbox)
+                if entry is _SENTINEL:
+                    break
+                seq, item = entry
+                if not isinstance(item, _StageFailure):
+                    started = time.perf_counter()
+                    with busy_lock:
+                        running[index][token] = started
+                    try:
+                        if pool is not None:
+                            item = pool.submit(stage.func, item).result()
+                        else:
+                            item = stage.func(item)
+                    except Exception as e:
+                        print(f"Pipeline stage '{stage.name}' failed: {e}")
+                        item = _StageFailure(stage.name, e)
+                    finally:
+                        with busy_lock:
+                            del running[index][token]
+                            busy[index] += time.perf_counter() - started
+                put(outbox, (seq, item))
+
+            # The last worker of a stage to finish closes the next queue
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    for _ in range(next_workers):
+                        put(outbox, _SENTINEL)
+
+        return work
+
+    def busy_seconds():
+        now = time.perf_counter()
+        with busy_lock:
+            return {stage.name: busy[index] + sum(now - started for started in running[index].values())
+                    for index, stage in enumerate(stages)}
+
+    def watch():
+        while not finished.wait(monitor_interval):
+            monitor(busy_seconds())
+
+    try:
+        for index, stage in enumerate(stages):
+            pool = None
+            if stage.kind == 'process':
+                pool = ProcessPoolExecutor(
+                    max_workers=stage.workers,
+                    mp_context=multiprocessing.get_context(stage.start_method),
+                    initializer=stage.initializer,
+                    initargs=stage.initargs
+                )
+                pools.append(pool)
+                if stage.start_method == 'fork':
+                    # Fork every worker now, before the stage threads start
+                    for future in [pool.submit(os.getpid) for _ in range(stage.workers)]:
+                        future.result()
+            elif stage.initializer is not None:
+                stage.initializer(*stage.initargs)
+
+            remaining, lock = [stage.workers], threading.Lock()
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=make_worker(index, stage, pool, remaining, lock),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                threads.append(thread)
+
+        threads.append(threading.Thread(target=feed, name="feeder", daemon=True))
+        if monitor is not None:
+            threading.Thread(target=watch, name="monitor", daemon=True).start()
+        for thread in threads:
+            thread.start()
+
+        outputs = [None] * len(items)
+        failures = []
+        while True:
+            entry = queues[-1].get()
+            if entry is _SENTINEL:
+                break
+            seq, item = entry
+            if isinstance(item, _StageFailure):
+                failures.append(item)
+            elif on_result is not None:
+                on_result(item)
+            else:
+                outputs[seq] = item
+
+        for thread in threads:
+            thread.join()
+    except BaseException:
+        aborted.set()
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    else:
+        for pool in pools:
+            pool.shutdown()
+    finally:
+        finished.set()
+
+    if failures:
+        raise RuntimeError(f"Stage '{failures[0].stage_name}' failed") from failures[0].error
+    return [] if on_result is not None else outputs
@@ -1,111 +1,622 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForQuestionAnswering
+from collections import OrderedDict
+from answer_cache import answer_key, document_hash
+from backends import ARTIFACT_DIR, load_model, model_size_mb
+from lexical_qa import SentenceIndex
+import hashlib
+import telemetry
+import threading
+import time
 import torch
 
+# Model checkpoint and head type used for each language
+MODEL_CONFIGS = {
+    'en': {'name': "google/flan-t5-base", 'type': 'seq2seq', 'label': "FLAN-T5"},
+    'mr': {'name': "l3cube-pune/marathi-bert", 'type': 'qa', 'label': "MahaBERT"},
+    'fr': {'name': "camembert-base", 'type': 'qa', 'label': "CamemBERT"},
+}
+
+# Documents whose sentence index is kept for the lexical tier and fallback answers
+SENTENCE_INDEX_CACHE_SIZE = 8
+
+def decode_spans(start_logits, end_logits, candidate_mask, max_answer_tokens=50, n_best=20):
+    """Top-N answer spans for a batch of extractive QA outputs.
+    
+    Every (start, end) pair with start <= end < start + max_answer_tokens
+    whose tokens are both allowed by candidate_mask (context tokens only,
+    no question or special tokens) is scored as start + end logit in one
+    batched tensor op. Returns, per example, a list of
+    (start, end, score, confidence) sorted best first, where confidence is
+    the span probability under the start/end softmaxes over the candidates.
+    """
+    start_logits = start_logits.float().masked_fill(~candidate_mask, float('-inf'))
+    end_logits = end_logits.float().masked_fill(~candidate_mask, float('-inf'))
+    seq_len = start_logits.shape[1]
+    
+    positions = torch.arange(seq_len)
+    offsets = positions[None, :] - positions[:, None]
+    band = (offsets >= 0) & (offsets < max_answer_tokens)
+    
+    scores = start_logits[:, :, None] + end_logits[:, None, :]
+    scores = scores.masked_fill(~band, float('-inf'))
+    log_norm = torch.logsumexp(start_logits, dim=1) + torch.logsumexp(end_logits, dim=1)
+    
+    top_scores, top_indices = torch.topk(scores.flatten(1), min(n_best, seq_len * seq_len), dim=1)
+    confidences = torch.exp(top_scores - log_norm[:, None])
+    
+    spans = []
+    for row_scores, row_indices, row_confidences in zip(top_scores.tolist(), top_indices.tolist(),
+                                                        confidences.tolist()):
+        spans.append([
+            (index // seq_len, index % seq_len, score, confidence)
+            for score, index, confidence in zip(row_scores, row_indices, row_confidences)
+            if score != float('-inf')
+        ])
+    return spans
+
+def context_token_mask(encoded, rows):
+    """Boolean mask of the context (second sequence) tokens of encoded rows"""
+    return torch.tensor([
+        [sequence_id == 1 for sequence_id in encoded.sequence_ids(row)] for row in rows
+    ])
+
 class MultilingualQASystem:
-    def __init__(self):
-        self.models = {}
+    def __init__(self, max_models=None, max_memory_mb=None, preload=False, backends=None,
+                 artifact_dir=ARTIFACT_DIR, model_configs=None, min_confidence=0.0,
+                 deterministic=False, answer_cache=None, fused_sessions=False):
+        """Models are loaded on first use per language.
+
+        max_models / max_memory_mb bound how many models stay resident;
+        the least recently used model is evicted when a budget is exceeded.
+        Pass preload=True to load every model up front (the old behaviour).
+        backends maps a language to 'eager', 'int8', 'compile' or 'onnx'
+        (default eager); converted artifacts are cached under artifact_dir.
+        model_configs overrides MODEL_CONFIGS, e.g. to point at local models.
+        Extractive answers whose span probability is below min_confidence
+        are replaced by the fallback answer.
+        deterministic=True makes FLAN-T5 decode greedily instead of sampling.
+        With an AnswerCache, answers are looked up before any model runs;
+        sampled FLAN-T5 answers are never cached.
+        fused_sessions=True makes open_document reuse FLAN-T5's encoder
+        states across questions (see DocumentSession).
+        """
+        self.model_configs = model_configs or MODEL_CONFIGS
+        self.models = OrderedDict()
         self.tokenizers = {}
-        self.load_models()
+        self.model_sizes_mb = {}
+        self.max_models = max_models
+        self.max_memory_mb = max_memory_mb
+        self.cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.backends = dict(backends or {})
+        self.artifact_dir = artifact_dir
+        self.min_confidence = min_confidence
+        self.sentence_indexes = OrderedDict()
+        self.deterministic = deterministic
+        self.answer_cache = answer_cache
+        self.fused_sessions = fused_sessions
+        if preload:
+            self.load_models()
     
     def load_models(self):
-        """Load all three language models"""
+        """Load all three language models (subject to the memory budget)"""
+        for language in self.model_configs:
+            self._get_model(language)
+    
+    def _get_model(self, language):
+        """Return (tokenizer, model) for a language, loading it on a miss"""
+        if language in self.models:
+            self.cache_stats['hits'] += 1
+            self.models.move_to_end(language)
+            return self.tokenizers[language], self.models[language]
+        
+        self.cache_stats['misses'] += 1
+        self._load_model(language)
+        self._evict_if_needed(keep=language)
+        return self.tokenizers[language], self.models[language]
+    
+    def _load_model(self, language):
+        """Load tokenizer and model weights for a single language"""
+        from transformers import AutoTokenizer
+        
+        config = self.model_configs[language]
+        backend = self.backend_for(language)
+        print(f"Loading {config['label']} for {language} ({backend})...")
+        
+        self.tokenizers[language] = AutoTokenizer.from_pretrained(config['name'])
+        model = load_model(language, config, backend, self.artifact_dir)
+        
+        self.models[language] = model
+        self.model_sizes_mb[language] = model_size_mb(model)
+    
+    def backend_for(self, language):
+        return self.backends.get(language, 'eager')
+    
+    def _over_budget(self):
+        if self.max_models is not None and len(self.models) > self.max_models:
+            return True
+        if self.max_memory_mb is not None and self.resident_memory_mb() > self.max_memory_mb:
+            return True
+        return False
+    
+    def _evict_if_needed(self, keep=None):
+        """Evict least recently used models until the budget is met"""
+        while self._over_budget():
+            victim = next((lang for lang in self.models if lang != keep), None)
+            if victim is None:
+                # A single model larger than the budget stays loaded
+                break
+            self.unload_model(victim)
+            self.cache_stats['evictions'] += 1
+    
+    def unload_model(self, language):
+        """Drop a model and its tokenizer from memory"""
+        if language not in self.models:
+            return
+        print(f"Unloading {self.model_configs[language]['label']} ({language})...")
+        del self.models[language]
+        self.tokenizers.pop(language, None)
+        self.model_sizes_mb.pop(language, None)
+    
+    def resident_memory_mb(self):
+        """Total size of the currently loaded models"""
+        return sum(self.model_sizes_mb.values())
+    
+    def get_cache_stats(self):
+        """Return hit/miss/eviction counters and the resident model set"""
+        stats = dict(self.cache_stats)
+        stats['loaded'] = list(self.models.keys())
+        stats['resident_memory_mb'] = round(self.resident_memory_mb(), 1)
+        return stats
+    
+    def sentence_index(self, context, language):
+        """The SentenceIndex of a document, built once and kept in a small LRU"""
+        key = (language, hashlib.sha1(context.encode('utf-8')).hexdigest())
+        if key in self.sentence_indexes:
+            self.sentence_indexes.move_to_end(key)
+            return self.sentence_indexes[key]
         
-        # English - FLAN-T5
-        print("Loading FLAN-T5 for English...")
-        self.tokenizers['en'] = AutoTokenizer.from_pretrained("google/flan-t5-base")
-        self.models['en'] = AutoModelForSeq2SeqLM.from_pretrained("google/flan-t5-base")
+        index = SentenceIndex(context, language)
+        self.sentence_indexes[key] = index
+        while len(self.sentence_indexes) > SENTENCE_INDEX_CACHE_SIZE:
+            self.sentence_indexes.popitem(last=False)
+        return index
+    
+    def generation_options(self):
+        """Decoding arguments for FLAN-T5's generate()"""
+        if self.deterministic:
+            return {'do_sample': False, 'num_beams': 1}
+        return {'do_sample': True, 'temperature': 0.7}
+    
+    def model_identity(self, language):
+        """Everything about the model that can change its answers, for cache keys"""
+        config = self.model_configs[language]
+        decoding = 'greedy' if self.deterministic else 'sampled'
+        return f"{config['name']}|{self.backend_for(language)}|{decoding}|{self.min_confidence}"
+    
+    def answer_cache_key(self, question, context_hash, language, method):
+        """Key for an answer, or None when answers of this language cannot be cached"""
+        if self.answer_cache is None:
+            return None
+        if self.model_configs[language]['type'] == 'seq2seq' and not self.deterministic:
+            # Sampled answers differ run to run
+            return None
+        return answer_key(question, language, context_hash, f"{self.model_identity(language)}|{method}")
+    
+    def _cached_answer(self, question, context, language, method, compute):
+        if self.answer_cache is None:
+            return compute()
         
-        # Marathi - MahaBERT (using multilingual BERT for QA)
-        print("Loading MahaBERT for Marathi...")
-        self.tokenizers['mr'] = AutoTokenizer.from_pretrained("l3cube-pune/marathi-bert")
-        self.models['mr'] = AutoModelForQuestionAnswering.from_pretrained("l3cube-pune/marathi-bert")
+        context_hash = document_hash(context)
+        key = self.answer_cache_key(question, context_hash, language, method)
+        if key is not None:
+            cached = self.answer_cache.get(key)
+            if cached is not None:
+                telemetry.add_count('cached_answers', 1)
+                return cached
         
-        # French - CamemBERT
-        print("Loading CamemBERT for French...")
-        self.tokenizers['fr'] = AutoTokenizer.from_pretrained("camembert-base")
-        self.models['fr'] = AutoModelForQuestionAnswering.from_pretrained("camembert-base")
+        answer = compute()
+        if key is not None:
+            self.answer_cache.put(key, answer, context_hash)
+        return answer
     
     def answer_question(self, question, context, language):
         """Generate answer for given question and context"""
-        
-        if language == 'en':
-            return self._answer_with_flan_t5(question, context)
+        return self._cached_answer(question, context, language, 'answer',
+                                   lambda: self._answer_question(question, context, language))
+    
+    def _answer_question(self, question, context, language):
+        if self.model_configs[language]['type'] == 'seq2seq':
+            return self._flan_t5_batch([question], [context], language)[0]
         else:
             return self._answer_with_bert(question, context, language)
     
+    def stream_answer(self, question, context, language):
+        """Yield the answer to a question as text chunks while it is generated.
+        
+        FLAN-T5 answers arrive a few tokens at a time; extractive and cached
+        answers arrive as one chunk. The joined chunks are cached like
+        answer_question's answers.
+        """
+        context_hash = key = None
+        if self.answer_cache is not None:
+            context_hash = document_hash(context)
+            key = self.answer_cache_key(question, context_hash, language, 'answer')
+        if key is not None:
+            cached = self.answer_cache.get(key)
+            if cached is not None:
+                telemetry.add_count('cached_answers', 1)
+                yield cached
+                return
+        
+        if self.model_configs[language]['type'] == 'seq2seq':
+            chunks = []
+            for chunk in self._stream_flan_t5(question, context, language):
+                chunks.append(chunk)
+                yield chunk
+            answer = "".join(chunks).strip()
+        else:
+            answer = self._answer_question(question, context, language)
+            yield answer
+        if key is not None:
+            self.answer_cache.put(key, answer, context_hash)
+    
+    def _stream_flan_t5(self, question, context, language):
+        """Run generate() in a background thread and yield its text as it is decoded.
+
+        Traces are per thread, so the generate span and output token count
+        are measured on the helper thread and recorded here once it ends.
+        """
+        from transformers import TextIteratorStreamer
+        
+        tokenizer, model = self._get_model(language)
+        with telemetry.span('tokenization'):
+            inputs = tokenizer([self._flan_t5_prompt(question, context)], return_tensors="pt",
+                               max_length=512, truncation=True)
+        telemetry.add_count('input_tokens', int(inputs['attention_mask'].sum()))
+        
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+        measured = {}
+        
+        def generate():
+            try:
+                start = time.perf_counter()
+                with torch.no_grad():
+                    outputs = model.generate(**inputs, max_length=150, num_return_sequences=1,
+                                             streamer=streamer, **self.generation_options())
+                measured['seconds'] = time.perf_counter() - start
+                measured['tokens'] = int((outputs[:, 1:] != tokenizer.pad_token_id).sum())
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+        
+        thread = threading.Thread(target=generate, name=f"generate-{language}", daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+        telemetry.add_span('generate', measured['seconds'])
+        telemetry.add_count('output_tokens', measured['tokens'])
+    
+    def open_document(self, context, language, **options):
+        """Start a DocumentSession that tokenizes (and, for seq2seq models,
+        encodes) the context once for any number of questions about it.
+        
+        options are passed to DocumentSession (max_length, stride,
+        max_windows, max_question_tokens, reuse_encoder); reuse_encoder
+        defaults to fused_sessions.
+        """
+        from document_session import DocumentSession
+        options.setdefault('reuse_encoder', self.fused_sessions)
+        return DocumentSession(self, context, language, **options)
+    
+    def answer_questions_batch(self, items, batch_size=8):
+        """Answer many (question, context, language) items in batched passes.
+        
+        Items are grouped by language and sorted by input length so each
+        padded batch holds similarly sized inputs. Answers are returned in
+        the same order as the input items. Cached answers are served
+        without running a model.
+        """
+        answers = [None] * len(items)
+        keys = [None] * len(items)
+        hashes = {}
+        
+        by_language = {}
+        for idx, (question, context, language) in enumerate(items):
+            if self.answer_cache is not None:
+                if context not in hashes:
+                    hashes[context] = document_hash(context)
+                keys[idx] = self.answer_cache_key(question, hashes[context], language, 'answer')
+            if keys[idx] is not None:
+                answers[idx] = self.answer_cache.get(keys[idx])
+                if answers[idx] is not None:
+                    telemetry.add_count('cached_answers', 1)
+                    continue
+            by_language.setdefault(language, []).append(idx)
+        
+        for language, indices in by_language.items():
+            # Character length is a cheap proxy for token length when bucketing
+            indices = sorted(indices, key=lambda i: len(items[i][0]) + len(items[i][1]))
+            
+            for start in range(0, len(indices), batch_size):
+                bucket = indices[start:start + batch_size]
+                questions = [items[i][0] for i in bucket]
+                contexts = [items[i][1] for i in bucket]
+                
+                if self.model_configs[language]['type'] == 'seq2seq':
+                    batch_answers = self._flan_t5_batch(questions, contexts, language)
+                else:
+                    batch_answers = self._bert_batch(questions, contexts, language)
+                
+                for i, answer in zip(bucket, batch_answers):
+                    answers[i] = answer
+                    if keys[i] is not None:
+                        self.answer_cache.put(keys[i], answer, hashes[items[i][1]])
+        
+        return answers
+    
+    def answer_question_windowed(self, question, context, language, max_length=384,
+                                 stride=128, max_windows=16, batch_size=8):
+        """Answer against a long document using overlapping token windows.
+        
+        The full context is split into windows of max_length tokens that
+        overlap by stride tokens. Windows are scored in batched passes and
+        the best scoring answer across all windows is returned. Only the
+        first max_windows windows are scored to keep latency bounded.
+        """
+        def compute():
+            if self.model_configs[language]['type'] == 'seq2seq':
+                return self._flan_t5_windowed(question, context, language, max_length, stride, max_windows,
+                                              batch_size)
+            return self._bert_windowed(question, context, language, max_length, stride, max_windows, batch_size)
+        
+        method = f"windowed:{max_length}:{stride}:{max_windows}"
+        return self._cached_answer(question, context, language, method, compute)
+    
+    def _bert_windowed(self, question, context, language, max_length, stride, max_windows,
+                       batch_size, n_best=20, max_answer_tokens=50):
+        """Pick the best span over all context windows for extractive models"""
+        tokenizer, model = self._get_model(language)
+        
+        with telemetry.span('tokenization'):
+            encoded = tokenizer(
+                question,
+                context,
+                max_length=max_length,
+                stride=stride,
+                truncation='only_second',
+                return_overflowing_tokens=True,
+                return_offsets_mapping=True,
+                padding=True,
+                return_tensors="pt"
+            )
+        
+        num_windows = min(len(encoded['input_ids']), max_windows)
+        if len(encoded['input_ids']) > max_windows:
+            print(f"Scoring {max_windows} of {len(encoded['input_ids'])} windows")
+        
+        model_inputs = {k: v for k, v in encoded.items()
+                        if k in ('input_ids', 'attention_mask', 'token_type_ids')}
+        
+        telemetry.add_count('input_tokens', int(encoded['attention_mask'][:num_windows].sum()))
+        candidate_mask = context_token_mask(encoded, range(num_windows))
+        
+        best = None
+        for start in range(0, num_windows, batch_size):
+            end = min(start + batch_size, num_windows)
+            with telemetry.span('forward'), torch.no_grad():
+                outputs = model(**{k: v[start:end] for k, v in model_inputs.items()})
+            
+            with telemetry.span('decoding'):
+                spans = decode_spans(outputs.start_logits, outputs.end_logits, candidate_mask[start:end],
+                                     max_answer_tokens, n_best)
+            for row, window_spans in enumerate(spans):
+                # Raw logit sums are comparable across windows; probabilities are per window
+                if window_spans and (best is None or window_spans[0][2] > best[1][2]):
+                    best = (start + row, window_spans[0])
+        
+        if best is None or best[1][3] < self.min_confidence:
+            return self._get_fallback_answer(context, language)
+        
+        window, (start_token, end_token, _, _) = best
+        offsets = encoded['offset_mapping'][window]
+        telemetry.add_count('output_tokens', end_token - start_token + 1)
+        best_span = (int(offsets[start_token][0]), int(offsets[end_token][1]))
+        
+        answer = context[best_span[0]:best_span[1]].strip()
+        return self._clean_bert_answer(answer, context, language)
+    
+    def _flan_t5_windowed(self, question, context, language, max_length, stride, max_windows, batch_size):
+        """Generate an answer per context window and keep the most likely one.
+
+        Windows are always decoded greedily: the likelihood of a sampled
+        answer says little about how well a window answers the question.
+        """
+        tokenizer, model = self._get_model(language)
+        
+        # Window the context on its own; the prompt is added around each window
+        with telemetry.span('tokenization'):
+            encoded = tokenizer(
+                context,
+                max_length=max_length,
+                stride=stride,
+                truncation=True,
+                return_overflowing_tokens=True,
+                return_offsets_mapping=True,
+                add_special_tokens=False
+            )
+        
+        windows = []
+        for offsets in encoded['offset_mapping'][:max_windows]:
+            if offsets:
+                windows.append(context[offsets[0][0]:offsets[-1][1]])
+        if len(encoded['offset_mapping']) > max_windows:
+            print(f"Scoring {max_windows} of {len(encoded['offset_mapping'])} windows")
+        if not windows:
+            windows = [context]
+        
+        best_score, best_answer = float('-inf'), ""
+        for start in range(0, len(windows), batch_size):
+            batch = windows[start:start + batch_size]
+            with telemetry.span('tokenization'):
+                inputs = tokenizer(
+                    [self._flan_t5_prompt(question, window) for window in batch],
+                    return_tensors="pt",
+                    max_length=512,
+                    truncation=True,
+                    padding=True
+                )
+            telemetry.add_count('input_tokens', int(inputs['attention_mask'].sum()))
+            
+            with telemetry.span('generate'), torch.no_grad():
+                outputs = model.generate(
+                    **inputs,
+                    max_length=150,
+                    num_return_sequences=1,
+                    do_sample=False,
+                    num_beams=1,
+                    output_scores=True,
+                    return_dict_in_generate=True
+                )
+                token_scores = model.compute_transition_scores(
+                    outputs.sequences, outputs.scores, normalize_logits=True
+                )
+            
+            # Mean log-probability of the generated tokens, ignoring padding
+            # (padding steps after EOS score -inf, so they are zeroed, not multiplied)
+            generated = outputs.sequences[:, 1:]
+            mask = generated != tokenizer.pad_token_id
+            telemetry.add_count('output_tokens', int(mask.sum()))
+            scores = (torch.where(mask, token_scores, torch.zeros_like(token_scores)).sum(dim=1)
+                      / mask.sum(dim=1).clamp(min=1))
+            
+            with telemetry.span('decoding'):
+                for sequence, score in zip(outputs.sequences, scores.tolist()):
+                    if score > best_score:
+                        best_score = score
+                        best_answer = tokenizer.decode(sequence, skip_special_tokens=True)
+        
+        if "Answer:" in best_answer:
+            best_answer = best_answer.split("Answer:")[-1].strip()
+        
+        return best_answer
+    
+    @staticmethod
+    def _flan_t5_prompt(question, context):
+        return f"Answer the following question based on the context:\nQuestion: {question}\nContext: {context}\nAnswer:"
+    
     def _answer_with_flan_t5(self, question, context):
         """Use FLAN-T5 for English QA - Fixed temperature warning"""
-        prompt = f"Answer the following question based on the context:\nQuestion: {question}\nContext: {context}\nAnswer:"
+        return self._flan_t5_batch([question], [context], 'en')[0]
+    
+    def _flan_t5_batch(self, questions, contexts, language='en'):
+        """Run one padded generate call for a batch of FLAN-T5 prompts"""
+        prompts = [self._flan_t5_prompt(q, c) for q, c in zip(questions, contexts)]
         
-        inputs = self.tokenizers['en'](
-            prompt, 
-            return_tensors="pt", 
-            max_length=512, 
-            truncation=True
-        )
+        tokenizer, model = self._get_model(language)
+        with telemetry.span('tokenization'):
+            inputs = tokenizer(
+                prompts, 
+                return_tensors="pt", 
+                max_length=512, 
+                truncation=True,
+                padding=True
+            )
+        telemetry.add_count('input_tokens', int(inputs['attention_mask'].sum()))
         
-        with torch.no_grad():
-            outputs = self.models['en'].generate(
+        with telemetry.span('generate'), torch.no_grad():
+            outputs = model.generate(
                 **inputs,
                 max_length=150,
                 num_return_sequences=1,
-                do_sample=True,
-                temperature=0.7
+                **self.generation_options()
             )
+        telemetry.add_count('output_tokens', int((outputs[:, 1:] != tokenizer.pad_token_id).sum()))
         
-        answer = self.tokenizers['en'].decode(outputs[0], skip_special_tokens=True)
+        answers = []
+        with telemetry.span('decoding'):
+            for output in outputs:
+                answer = tokenizer.decode(output, skip_special_tokens=True)
+                
+                # Clean up the answer (remove the prompt)
+                if "Answer:" in answer:
+                    answer = answer.split("Answer:")[-1].strip()
+                answers.append(answer)
         
-        # Clean up the answer (remove the prompt)
-        if "Answer:" in answer:
-            answer = answer.split("Answer:")[-1].strip()
-        
-        return answer
+        return answers
     
     def _answer_with_bert(self, question, context, language):
         """Use BERT-based models for Marathi and French QA - Fixed offset_mapping error"""
+        return self._bert_batch([question], [context], language)[0]
+    
+    def _bert_batch(self, questions, contexts, language):
+        """Run one padded forward pass for a batch of extractive QA pairs"""
+        
+        tokenizer, model = self._get_model(language)
         
         # Prepare inputs with better handling
-        inputs = self.tokenizers[language](
-            question, 
-            context, 
-            return_tensors="pt",
-            max_length=512,
-            truncation=True,
-            padding=True,
-            add_special_tokens=True
-        )
-        
-        if 'offset_mapping' in inputs:
-            del inputs['offset_mapping']
+        with telemetry.span('tokenization'):
+            inputs = tokenizer(
+                questions, 
+                contexts, 
+                return_tensors="pt",
+                max_length=512,
+                truncation='only_second',
+                padding=True,
+                add_special_tokens=True,
+                return_offsets_mapping=True
+            )
+        telemetry.add_count('input_tokens', int(inputs['attention_mask'].sum()))
         
-        with torch.no_grad():
-            outputs = self.models[language](**inputs)
+        # Question, special and padding tokens can never start or end an answer
+        candidate_mask = context_token_mask(inputs, range(len(questions)))
+        offsets = inputs.pop('offset_mapping')
         
-        # Get answer span with improved logic
-        start_scores = outputs.start_logits[0]
-        end_scores = outputs.end_logits[0]
+        with telemetry.span('forward'), torch.no_grad():
+            outputs = model(**inputs)
         
-        # Find the best start and end positions
-        start_idx = torch.argmax(start_scores).item()
-        end_idx = torch.argmax(end_scores).item()
+        with telemetry.span('decoding'):
+            spans = decode_spans(outputs.start_logits, outputs.end_logits, candidate_mask)
         
-        # Ensure end comes after start
-        if end_idx < start_idx:
-            end_idx = start_idx + 10  # Default span of 10 tokens
+        answers = []
+        for row, context in enumerate(contexts):
+            if not spans[row] or spans[row][0][3] < self.min_confidence:
+                answers.append(self._get_fallback_answer(context, language))
+                continue
+            start_token, end_token, _, _ = spans[row][0]
+            telemetry.add_count('output_tokens', end_token - start_token + 1)
+            answer = context[int(offsets[row][start_token][0]):int(offsets[row][end_token][1])]
+            answers.append(self._clean_bert_answer(answer, context, language))
         
-        # Limit answer length to reasonable size
-        if end_idx - start_idx > 50:
-            end_idx = start_idx + 50
+        return answers
+    
+    def answer_candidates(self, question, context, language, n_best=5):
+        """Top n_best (answer, confidence) spans from an extractive model"""
+        if self.model_configs[language]['type'] == 'seq2seq':
+            raise ValueError(f"{self.model_configs[language]['label']} generates answers; it has no spans to rank")
         
-        # Ensure we don't go beyond input length
-        max_len = len(inputs['input_ids'][0])
-        end_idx = min(end_idx, max_len - 1)
+        tokenizer, model = self._get_model(language)
+        inputs = tokenizer(question, context, return_tensors="pt", max_length=512,
+                           truncation='only_second', return_offsets_mapping=True)
+        candidate_mask = context_token_mask(inputs, [0])
+        offsets = inputs.pop('offset_mapping')[0]
         
-        # Decode answer
-        answer_tokens = inputs['input_ids'][0][start_idx:end_idx+1]
-        answer = self.tokenizers[language].decode(answer_tokens, skip_special_tokens=True)
+        with torch.no_grad():
+            outputs = model(**inputs)
+        
+        candidates = []
+        for start_token, end_token, _, confidence in decode_spans(
+                outputs.start_logits, outputs.end_logits, candidate_mask, n_best=n_best)[0]:
+            answer = context[int(offsets[start_token][0]):int(offsets[end_token][1])].strip()
+            candidates.append((answer, confidence))
+        return candidates
+    
+    def _clean_bert_answer(self, answer, context, language):
+        """Strip leaked question words and fall back when nothing is left"""
         
-        # Clean up the answer
         answer = answer.strip()
         
         if language == 'mr':
@@ -120,29 +631,19 @@ class MultilingualQASystem:
                 if answer.startswith(word):
                     answer = answer[len(word):].strip()
         
-        if not answer or len(answer) < 3:
-            return self._get_fallback_answer(context, language)
-        
-        if any(char in answer for char in ['##', '[UNK]', '[CLS]', '[SEP]']):
+        if not answer:
             return self._get_fallback_answer(context, language)
         
         return answer
 
-    
     def _get_fallback_answer(self, context, language):
         """Generate fallback answer when main method fails"""
         try:
-            # Get first meaningful sentence from context
-            if language == 'mr':
-                sentences = context.split('।')  # Marathi sentence separator
-                for sentence in sentences[:3]:  # Check first 3 sentences
-                    if len(sentence.strip()) > 20:
-                        return sentence.strip()[:200] + "..."
-            elif language == 'fr':
-                sentences = context.split('.')
-                for sentence in sentences[:3]:  # Check first 3 sentences
-                    if len(sentence.strip()) > 20:
-                        return sentence.strip()[:200] + "..."
+            # First meaningful sentence, from the document's cached sentence index
+            if language in ('mr', 'fr'):
+                sentences = self.sentence_index(context, language).sentences
+                if sentences:
+                    return sentences[0][:200] + "..."
             
             return context[:200].strip() + "..."
             
@@ -0,0 +1,140 @@
+from speech_processing import audio_file_hash
+import hashlib
+import json
+import os
+
+RESULTS_STREAM_PATH = '../results/qa_results.jsonl'
+RESULTS_PATH = '../results/qa_results.json'
+LANGUAGE_ORDER = ['en', 'mr', 'fr']
+
+def item_key(item):
+    """Identity of a work item: language, question and a hash of its input.
+
+    The input hash covers the audio file when the question is spoken, so a
+    re-recorded question is processed again on resume.
+    """
+    if 'result_key' not in item:
+        if item['audio_question_path']:
+            input_hash = audio_file_hash(item['audio_question_path'])
+        else:
+            input_hash = hashlib.sha256(item['question_text'].encode('utf-8')).hexdigest()
+        item['result_key'] = f"{item['lang_code']}:{item['question_text']}:{input_hash}"
+    return item['result_key']
+
+def _read_lines(path):
+    """Parsed lines of a JSONL stream, ignoring a torn final line"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A crash mid-write leaves at most one partial line at the end
+                continue
+
+def _drop_partial_line(path):
+    """Cut a torn final line so appended records start on a fresh line"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def load_completed_keys(path=RESULTS_STREAM_PATH):
+    """Keys of the items already written to a results stream"""
+    return {entry['key'] for entry in _read_lines(path) if entry.get('record_type') != 'document'}
+
+class ResultsWriter:
+    """Appends QA records to a JSONL stream as they are produced.
+
+    Every line is flushed to the OS immediately; every checkpoint_every
+    records (and on close) the file is fsynced, so a crash loses at most
+    the records written since the last checkpoint.
+    """
+
+    def __init__(self, path=RESULTS_STREAM_PATH, checkpoint_every=10, resume=False):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.completed = set()
+        if resume:
+            _drop_partial_line(path)
+            self.completed = load_completed_keys(path)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self._since_checkpoint = 0
+
+    def is_done(self, item):
+        return item_key(item) in self.completed
+
+    def write_record(self, item, record):
+        key = item_key(item)
+        self._write({'record_type': 'qa', 'key': key, 'language': item['lang_code'],
+                     'number': item['number'], **record})
+        self.completed.add(key)
+
+    def write_document(self, language, timings):
+        self._write({'record_type': 'document', 'language': language, 'timings': timings})
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        os.fsync(self._file.fileno())
+        self._since_checkpoint = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.checkpoint()
+            self._file.close()
+
+def compact(stream_path=RESULTS_STREAM_PATH, output_path=RESULTS_PATH):
+    """Rebuild the qa_results.json layout from a results stream.
+
+    Records are ordered by language and question number; when a question
+    was written more than once (e.g. across resumed runs, or after its
+    audio changed and it was processed again), the last record wins.
+    """
+    records, document_timings = {}, {}
+    for entry in _read_lines(stream_path):
+        language = entry['language']
+        if entry.get('record_type') == 'document':
+            document_timings[language] = entry['timings']
+            continue
+        # Keyed by question number, not by key: a changed input gives a new key
+        records.setdefault(language, {})[entry['number']] = entry
+
+    languages = [lang for lang in LANGUAGE_ORDER if lang in records]
+    languages += sorted(set(records) - set(languages))
+    results = {}
+    for language in languages:
+        entries = sorted(records[language].values(), key=lambda entry: entry['number'])
+        results[language] = {'language': language}
+        if language in document_timings:
+            results[language]['document_timings'] = document_timings[language]
+        results[language]['questions_answers'] = [
+            {field: value for field, value in entry.items()
+             if field not in ('record_type', 'key', 'language', 'number')}
+            for entry in entries
+        ]
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact a JSONL results stream into qa_results.json")
+    parser.add_argument('stream', nargs='?', default=RESULTS_STREAM_PATH)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+    compact(args.stream, args.output)
+    print(f"Results compacted to {args.output}")
@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# Devanagari words are matched as a whole so vowel signs (matras) and the
+# virama do not split them; the danda (।, ॥) is excluded as punctuation.
+TOKEN_PATTERN = re.compile(r"[\u0900-\u0963\u0966-\u097F]+|\w+")
+
+
+def tokenize(text):
+    """Lowercased lexical tokens, Devanagari-aware"""
+    text = unicodedata.normalize('NFC', text).lower()
+    return TOKEN_PATTERN.findall(text)
+
+
+class BM25Index:
+    """BM25 passage index stored as flat NumPy arrays.
+
+    Postings are kept in CSR layout (term_offsets -> postings_docs /
+    postings_tf) so a saved index can be memory-mapped on load instead of
+    being rebuilt or read fully into memory.
+    """
+
+    def __init__(self, vocab, term_offsets, postings_docs, postings_tf, doc_lengths,
+                 passage_offsets, passage_data, meta):
+        self.vocab = vocab
+        self.term_offsets = term_offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_lengths = doc_lengths
+        self.passage_offsets = passage_offsets
+        self.passage_data = passage_data
+        self.meta = meta
+
+        num_docs = len(doc_lengths)
+        doc_freq = np.diff(term_offsets).astype(np.float64)
+        self.idf = np.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    @classmethod
+    def build(cls, passages, language, k1=1.5, b=0.75, source_hash=None):
+        """Build an index from an iterable of passage strings"""
+        vocab = {}
+        postings = []
+        doc_lengths = []
+        encoded_passages = []
+
+        for doc_id, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            doc_lengths.append(len(tokens))
+            encoded_passages.append(passage.encode('utf-8'))
+            for term, tf in Counter(tokens).items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, tf))
+
+        term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(p) for p in postings])
+        postings_docs = np.array([d for p in postings for d, _ in p], dtype=np.int32)
+        postings_tf = np.array([tf for p in postings for _, tf in p], dtype=np.float32)
+
+        passage_offsets = np.zeros(len(encoded_passages) + 1, dtype=np.int64)
+        passage_offsets[1:] = np.cumsum([len(p) for p in encoded_passages])
+        passage_data = np.frombuffer(b"".join(encoded_passages), dtype=np.uint8)
+
+        doc_lengths = np.array(doc_lengths, dtype=np.float32)
+        meta = {
+            'language': language,
+            'num_passages': len(doc_lengths),
+            'avg_doc_length': float(doc_lengths.mean()) if len(doc_lengths) else 0.0,
+            'k1': k1,
+            'b': b,
+            'source_hash': source_hash,
+        }
+        return cls(vocab, term_offsets, postings_docs, postings_tf, doc_lengths,
+                   passage_offsets, passage_data, meta)
+
+    def save(self, index_dir):
+        """Write the index arrays and metadata to a directory"""
+        os.makedirs(index_dir, exist_ok=True)
+        arrays = {
+            'term_offsets': self.term_offsets,
+            'postings_docs': self.postings_docs,
+            'postings_tf': self.postings_tf,
+            'doc_lengths': self.doc_lengths,
+            'passage_offsets': self.passage_offsets,
+            'passage_data': self.passage_data,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(index_dir, f"{name}.npy"), array)
+
+        with open(os.path.join(index_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Load a saved index with its arrays memory-mapped read-only"""
+        def array(name):
+            return np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode='r')
+
+        with open(os.path.join(index_dir, 'vocab.json'), 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        return cls(vocab, array('term_offsets'), array('postings_docs'), array('postings_tf'),
+                   array('doc_lengths'), array('passage_offsets'), array('passage_data'), meta)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def passage(self, doc_id):
+        start, end = self.passage_offsets[doc_id], self.passage_offsets[doc_id + 1]
+        return bytes(self.passage_data[start:end]).decode('utf-8')
+
+    def search(self, query, top_k=3):
+        """Return the top_k (passage_id, score, text) tuples for a query"""
+        if len(self) == 0:
+            return []
+
+        k1, b = self.meta['k1'], self.meta['b']
+        avg_doc_length = self.meta['avg_doc_length'] or 1.0
+        scores = np.zeros(len(self), dtype=np.float64)
+
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            norm = k1 * (1 - b + b * self.doc_lengths[docs] / avg_doc_length)
+            scores[docs] += self.idf[term_id] * tf * (k1 + 1) / (tf + norm)
+
+        top_k = min(top_k, len(self))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(doc_id), float(scores[doc_id]), self.passage(doc_id)) for doc_id in best]
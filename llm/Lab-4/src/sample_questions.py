@@ -21,3 +21,9 @@ LANGUAGE_CODES = {
     'mr': 'mr-IN', 
     'fr': 'fr-FR'
 }
+
+PDF_PATHS = {
+    'en': '../data/pdfs/english.pdf',
+    'mr': '../data/pdfs/marathi.pdf', 
+    'fr': '../data/pdfs/french.pdf'
+}
@@ -0,0 +1,476 @@
+"""Resident QA server that keeps Whisper and the QA models warm.
+
+Clients send one JSON request per line over TCP and get one JSON response
+per line back, tagged with the request id (responses on a connection can
+arrive out of order):
+
+    {"id": 1, "language": "en", "question": "What is AI?"}
+    {"id": 2, "language": "fr", "audio_path": "input/question_fr_1.mp3",
+     "deadline_ms": 2000, "speak": true}
+    {"id": 3, "language": "en", "audio_path": "uploads/long_question.wav", "stream": true}
+    {"id": 4, "type": "stats"}
+
+audio_path is resolved inside the server's audio directory (--audio-dir);
+paths that point anywhere else are rejected. A request's own "context"
+must be a string of at most --max-context-chars characters.
+
+Questions are grouped per language into micro-batches: a batch is run as
+soon as it holds max-batch requests or the oldest one has waited
+max-wait-ms. Each language queue is bounded; a full queue rejects new
+requests with an "overloaded" error instead of letting latency grow, and
+requests whose deadline passes before they are served get a
+"deadline exceeded" error.
+
+Audio requests with "stream": true are transcribed window by window
+outside the ASR micro-batches; a {"id": ..., "partial_transcript": ...}
+line is sent after each window and the question is answered as soon as
+the last window is done.
+
+Requests with "speak": true and "stream_answer": true skip the QA
+micro-batches: the answer is generated token by token and each sentence
+is synthesized as soon as it is complete, with an {"id": ...,
+"answer_segment": ..., "audio_path": ...} line per sentence before the
+final response (whose audio_output_path joins the segments).
+
+    python server.py --port 8700 --max-batch 8 --max-wait-ms 10
+"""
+from concurrent.futures import ThreadPoolExecutor
+from answer_streaming import concatenate_audio, iter_sentences, segment_formats, segment_path, synthesize_segment
+from pdf_processing import retrieve_context
+from sample_questions import LANGUAGE_CODES
+import argparse
+import asyncio
+import json
+import os
+import time
+
+OVERLOADED = "overloaded"
+DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+class MicroBatcher:
+    """Collects submitted payloads into batches for one language.
+
+    run_batch is a blocking function taking a list of payloads and
+    returning one result per payload; it runs on the given executor so
+    the event loop keeps accepting requests while a batch is computed.
+    """
+
+    def __init__(self, run_batch, executor, max_batch=8, max_wait=0.01, queue_size=64):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = {'served': 0, 'rejected': 0, 'expired': 0, 'batches': 0}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, payload, deadline):
+        """Queue a payload and wait for its result until the loop-time deadline"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self.queue.put_nowait((payload, deadline, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            raise RuntimeError(OVERLOADED)
+
+        try:
+            return await asyncio.wait_for(future, timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.stats['expired'] += 1
+            raise RuntimeError(DEADLINE_EXCEEDED)
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        flush_at = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = flush_at - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+
+            # Requests that timed out while queued are not worth computing
+            live = [(payload, future) for payload, deadline, future in batch
+                    if not future.done() and deadline > loop.time()]
+            if not live:
+                continue
+
+            self.stats['batches'] += 1
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.run_batch, [payload for payload, _ in live]
+                )
+            except Exception as e:
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(live, results):
+                if not future.done():
+                    future.set_result(result)
+                    self.stats['served'] += 1
+
+
+class QAServer:
+    """Serves text and audio questions from resident models.
+
+    contexts maps each language to its prepared document text, or to a
+    BM25Index when questions should be answered against retrieved passages.
+    Audio questions are only read from files under audio_dir.
+    """
+
+    def __init__(self, qa_system, speech_processor, contexts, max_batch=8, max_wait=0.01,
+                 queue_size=64, deadline=30.0, top_k=3, output_dir='../data/audio/server',
+                 audio_dir='../data/audio', max_context_chars=20000):
+        self.qa_system = qa_system
+        self.speech_processor = speech_processor
+        self.contexts = contexts
+        self.deadline = deadline
+        self.top_k = top_k
+        self.output_dir = output_dir
+        self.audio_dir = os.path.realpath(audio_dir)
+        self.max_context_chars = max_context_chars
+        self.batch_options = {'max_batch': max_batch, 'max_wait': max_wait, 'queue_size': queue_size}
+
+        # Models are not shared between threads: one executor each for ASR and QA
+        self.asr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asr')
+        self.qa_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qa')
+        self.tts_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tts')
+        self.qa_batchers = {}
+        self.asr_batchers = {}
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8700):
+        for language in self.contexts:
+            qa = MicroBatcher(self.qa_system.answer_questions_batch, self.qa_executor, **self.batch_options)
+            asr = MicroBatcher(self._transcriber(language), self.asr_executor, **self.batch_options)
+            qa.start()
+            asr.start()
+            self.qa_batchers[language] = qa
+            self.asr_batchers[language] = asr
+
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for batcher in list(self.qa_batchers.values()) + list(self.asr_batchers.values()):
+            await batcher.stop()
+        for executor in (self.asr_executor, self.qa_executor, self.tts_executor):
+            executor.shutdown(wait=True)
+        if self.speech_processor is not None:
+            self.speech_processor.close()
+        if self.qa_system.answer_cache is not None:
+            self.qa_system.answer_cache.close()
+
+    def _transcriber(self, language):
+        def transcribe(paths):
+            return self.speech_processor.speech_to_text_batch(paths, LANGUAGE_CODES[language])
+        return transcribe
+
+    def _audio_file(self, path):
+        """Real path of a client's audio_path, which must name a file under audio_dir"""
+        if not isinstance(path, str):
+            raise ValueError("audio_path must be a string")
+        resolved = os.path.realpath(os.path.join(self.audio_dir, path))
+        if os.path.commonpath([self.audio_dir, resolved]) != self.audio_dir or not os.path.isfile(resolved):
+            raise ValueError(f"audio_path must name a file under the server's audio directory: {path}")
+        return resolved
+
+    def _request_context(self, request, language):
+        """The request's own context if it sent a valid one, else the language's document"""
+        context = request.get('context')
+        if context is None:
+            return self.contexts[language]
+        if not isinstance(context, str):
+            raise ValueError("context must be a string")
+        if len(context) > self.max_context_chars:
+            raise ValueError(f"context is longer than {self.max_context_chars} characters")
+        return context or self.contexts[language]
+
+    def stats(self):
+        stats = {
+            'qa': {language: batcher.stats for language, batcher in self.qa_batchers.items()},
+            'asr': {language: batcher.stats for language, batcher in self.asr_batchers.items()},
+            'models': self.qa_system.get_cache_stats()
+        }
+        if self.qa_system.answer_cache is not None:
+            stats['answers'] = self.qa_system.answer_cache.get_stats()
+        return stats
+
+    async def handle_request(self, request, send_partial=None):
+        """Answer one decoded request and return the response dict
+        
+        send_partial is an async callable receiving partial-transcript
+        messages of streamed audio requests and the answer segments of
+        streamed spoken answers.
+        """
+        start = time.perf_counter()
+        response = {'id': request.get('id')}
+        if request.get('type') == 'stats':
+            response['stats'] = self.stats()
+            return response
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + request.get('deadline_ms', self.deadline * 1000) / 1000
+        language = request.get('language')
+        try:
+            if language not in self.qa_batchers:
+                raise ValueError(f"Unsupported language: {language}")
+
+            if request.get('audio_path'):
+                if self.speech_processor is None:
+                    raise ValueError("Audio questions need a speech processor")
+                audio_path = self._audio_file(request['audio_path'])
+                if request.get('stream') and send_partial is not None:
+                    question = await self._stream_transcription(request, audio_path, language, deadline,
+                                                                send_partial)
+                else:
+                    question = await self.asr_batchers[language].submit(audio_path, deadline)
+                response['question_transcribed'] = question
+            elif request.get('question'):
+                question = request['question']
+            else:
+                raise ValueError("Request needs a 'question' or an 'audio_path'")
+
+            context = self._request_context(request, language)
+            if not isinstance(context, str):
+                context = retrieve_context(context, question, top_k=self.top_k)
+
+            if request.get('speak') and request.get('stream_answer') and send_partial is not None:
+                response['answer'], response['audio_output_path'] = await self._stream_spoken_answer(
+                    request, question, context, language, deadline, send_partial
+                )
+            else:
+                answer = await self.qa_batchers[language].submit((question, context, language), deadline)
+                response['answer'] = answer
+
+                if request.get('speak'):
+                    response['audio_output_path'] = await asyncio.wait_for(
+                        loop.run_in_executor(self.tts_executor, self._speak, request.get('id'), answer, language),
+                        timeout=max(0.0, deadline - loop.time())
+                    )
+        except asyncio.TimeoutError:
+            response['error'] = DEADLINE_EXCEEDED
+        except Exception as e:
+            response['error'] = str(e)
+
+        response['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return response
+
+    async def _stream_transcription(self, request, audio_path, language, deadline, send_partial):
+        """Transcribe on the ASR executor, forwarding each partial transcript"""
+        loop = asyncio.get_running_loop()
+        partials = asyncio.Queue()
+        
+        def transcribe():
+            try:
+                for partial in self.speech_processor.speech_to_text_stream(
+                        audio_path, LANGUAGE_CODES[language]):
+                    loop.call_soon_threadsafe(partials.put_nowait, partial)
+            finally:
+                loop.call_soon_threadsafe(partials.put_nowait, None)
+        
+        done = loop.run_in_executor(self.asr_executor, transcribe)
+        while True:
+            partial = await asyncio.wait_for(partials.get(), timeout=max(0.0, deadline - loop.time()))
+            if partial is None:
+                # The stream ended without a final transcript: surface its error
+                await done
+                raise RuntimeError("transcription ended early")
+            if partial['final']:
+                return partial['transcript']
+            await send_partial({'id': request.get('id'), 'partial_transcript': partial['transcript'],
+                                'end_s': partial['end_s']})
+    
+    async def _stream_spoken_answer(self, request, question, context, language, deadline, send_partial):
+        """Generate on the QA executor and speak each finished sentence on the TTS executor.
+
+        Returns the answer and the path of the joined audio (None if any
+        sentence could not be synthesized, or sentences came out in
+        different formats).
+        """
+        loop = asyncio.get_running_loop()
+        sentences = asyncio.Queue()
+        
+        def generate():
+            try:
+                for sentence in iter_sentences(self.qa_system.stream_answer(question, context, language)):
+                    loop.call_soon_threadsafe(sentences.put_nowait, sentence)
+            finally:
+                loop.call_soon_threadsafe(sentences.put_nowait, None)
+        
+        done = loop.run_in_executor(self.qa_executor, generate)
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, f"answer_{language}_{request.get('id')}.mp3")
+        texts, audio_paths = [], []
+        while True:
+            sentence = await asyncio.wait_for(sentences.get(), timeout=max(0.0, deadline - loop.time()))
+            if sentence is None:
+                break
+            audio_path = await asyncio.wait_for(
+                loop.run_in_executor(self.tts_executor, synthesize_segment, self.speech_processor, sentence,
+                                     language, segment_path(output_path, len(texts))),
+                timeout=max(0.0, deadline - loop.time())
+            )
+            await send_partial({'id': request.get('id'), 'answer_segment': sentence, 'index': len(texts),
+                                'audio_path': audio_path})
+            texts.append(sentence)
+            audio_paths.append(audio_path)
+        # Surfaces an error raised during generation
+        await done
+        
+        combined = None
+        if audio_paths and all(audio_paths) and len(segment_formats(audio_paths)) == 1:
+            combined = await loop.run_in_executor(self.tts_executor, concatenate_audio, audio_paths, output_path)
+        return " ".join(texts), combined
+    
+    def _speak(self, request_id, answer, language):
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, f"answer_{language}_{request_id}.mp3")
+        if self.speech_processor.text_to_speech(answer, LANGUAGE_CODES[language], output_path):
+            return output_path
+        return None
+
+    async def _handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def send(response):
+            async with write_lock:
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+                await writer.drain()
+
+        async def respond(request):
+            await send(await self.handle_request(request, send))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    await send({'id': None, 'error': f"Bad request: {e}"})
+                    continue
+                task = asyncio.create_task(respond(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+
+def load_contexts(context_mode, answer_cache=None):
+    """Prepared text (truncate) or a passage index (retrieval) per language
+
+    With an answer_cache, answers about an older version of a document are
+    invalidated.
+    """
+    from main import load_context, index_dir, track_document
+    from retrieval import BM25Index
+
+    contexts = {}
+    for language in ['en', 'mr', 'fr']:
+        context = load_context(language, context_mode)
+        track_document(answer_cache, language, context_mode, context)
+        contexts[language] = BM25Index.load(index_dir(language)) if context_mode == 'retrieval' else context
+    return contexts
+
+
+async def serve(args, backends):
+    from answer_cache import AnswerCache
+    from main import AUDIO_CACHE_DIR, TRANSCRIPTION_CACHE_DIR, TTS_CACHE_DIR
+    from qa_models import MultilingualQASystem
+    from speech_processing import SpeechProcessor
+
+    answer_cache = None
+    if args.answer_cache_size > 0:
+        answer_cache = AnswerCache(max_entries=args.answer_cache_size, ttl_seconds=args.answer_cache_ttl,
+                                   db_path=args.answer_cache_db)
+
+    print("Loading models...")
+    qa_system = MultilingualQASystem(backends=backends, preload=True, deterministic=args.deterministic,
+                                     answer_cache=answer_cache)
+    speech_processor = SpeechProcessor(transcription_cache_dir=TRANSCRIPTION_CACHE_DIR,
+                                       audio_cache_dir=AUDIO_CACHE_DIR,
+                                       tts_cache_dir=TTS_CACHE_DIR, tts_endpoint=args.tts_endpoint)
+    server = QAServer(
+        qa_system, speech_processor, load_contexts(args.context_mode, answer_cache),
+        max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000, queue_size=args.queue_size,
+        deadline=args.deadline_ms / 1000, top_k=args.top_k, audio_dir=args.audio_dir,
+        max_context_chars=args.max_context_chars
+    )
+    await server.start(args.host, args.port)
+    print(f"QA server listening on {args.host}:{args.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident multilingual QA server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--context-mode', choices=['truncate', 'retrieval'], default='truncate')
+    parser.add_argument('--top-k', type=int, default=3,
+                        help="Number of retrieved passages passed to the QA model")
+    parser.add_argument('--max-batch', type=int, default=8, help="Largest micro-batch per language")
+    parser.add_argument('--max-wait-ms', type=float, default=10.0,
+                        help="How long the first request of a batch waits for others")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="Queued requests per language before new ones are rejected")
+    parser.add_argument('--deadline-ms', type=float, default=30000.0,
+                        help="Default per-request deadline (requests may set deadline_ms)")
+    parser.add_argument('--audio-dir', default='../data/audio',
+                        help="Directory audio questions are read from; other audio_path values are rejected")
+    parser.add_argument('--max-context-chars', type=int, default=20000,
+                        help="Longest context a request may send in place of the document")
+    parser.add_argument('--tts-endpoint', default=None,
+                        help="Use an HTTP TTS server (e.g. local_tts_server.py) instead of gTTS")
+    parser.add_argument('--backend', nargs='+', default=[], metavar='LANG=BACKEND',
+                        help="QA inference backend per language, e.g. en=int8 fr=onnx")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="Decode FLAN-T5 answers greedily so they can be cached")
+    parser.add_argument('--answer-cache-size', type=int, default=4096,
+                        help="Answers kept in memory (0 disables the answer cache)")
+    parser.add_argument('--answer-cache-ttl', type=float, default=24 * 3600,
+                        help="Seconds a cached answer stays valid")
+    parser.add_argument('--answer-cache-db', default=None,
+                        help="Also keep answers in this SQLite file across restarts")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args, dict(option.split('=', 1) for option in args.backend)))
+    except KeyboardInterrupt:
+        pass
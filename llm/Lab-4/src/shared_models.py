@@ -0,0 +1,184 @@
+"""Load model weights once and share them with forked worker processes.
+
+Every spawned worker otherwise loads its own copy of the QA models and
+Whisper. Here the parent loads them, runs one warm-up pass, freezes its
+heap from the garbage collector and forks the workers, which then read
+the weights through copy-on-write pages: inference never writes to
+them, so they stay shared and each extra worker costs only the memory
+it actually dirties (activations, caches, interpreter state).
+
+Per-process memory comes from /proc/<pid>/smaps_rollup (Linux):
+uss_mb is memory private to the process, shared_mb is memory it maps
+together with at least one other process, and pss_mb charges shared
+pages proportionally, so summed PSS is the real footprint of a group.
+
+Compare N forked workers against N workers that each load their own
+copy with:
+
+    python shared_models.py --workers 1 2 4 --baseline
+"""
+from functools import partial
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+
+# Warm-up context, long enough to run every layer at a realistic sequence length
+SAMPLE_CONTEXT = ("Artificial intelligence helps doctors diagnose diseases earlier by finding "
+                  "patterns in medical images and patient records. ") * 8
+
+def fork_context():
+    """multiprocessing context for workers that inherit preloaded models"""
+    # The tokenizers' Rust thread pool does not survive fork; keep it off in
+    # the children instead of having each of them warn about it
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    return multiprocessing.get_context('fork')
+
+def preload_qa_system(qa_system):
+    """Load every QA model so forked workers inherit the weights"""
+    for language in qa_system.model_configs:
+        if qa_system.backend_for(language) == 'onnx':
+            raise ValueError(f"onnx sessions ({language}) cannot be shared with forked workers")
+    qa_system.load_models()
+    return qa_system
+
+def preload_speech_processor(speech_processor):
+    """Load Whisper so forked workers inherit the weights"""
+    speech_processor.whisper_model
+    return speech_processor
+
+def prepare_fork():
+    """Move everything allocated so far out of the garbage collector's reach.
+
+    Collections in the children would otherwise touch (and so copy) the
+    pages of every object inherited from the parent.
+    """
+    gc.collect()
+    gc.freeze()
+
+def process_memory(pid='self'):
+    """rss_mb, pss_mb, uss_mb and shared_mb of a process, or None off Linux"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                value = value.split()
+                if len(value) == 2 and value[1] == 'kB':
+                    fields[name] = int(value[0]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss_mb': round(fields['Rss'], 1),
+        'pss_mb': round(fields['Pss'], 1),
+        'uss_mb': round(fields['Private_Clean'] + fields['Private_Dirty'], 1),
+        'shared_mb': round(fields['Shared_Clean'] + fields['Shared_Dirty'], 1)
+    }
+
+def memory_report(workers, parent=None):
+    """Totals over per-worker samples ({name: process_memory()}) and the parent's"""
+    samples = dict(workers)
+    if parent is not None:
+        samples['parent'] = parent
+    samples = {name: sample for name, sample in samples.items() if sample is not None}
+    worker_samples = [sample for name, sample in samples.items() if name != 'parent']
+    return {
+        'processes': samples,
+        'workers': len(worker_samples),
+        'total_pss_mb': round(sum(sample['pss_mb'] for sample in samples.values()), 1),
+        'worker_uss_mb': round(sum(sample['uss_mb'] for sample in worker_samples), 1),
+        'mean_worker_uss_mb': round(sum(sample['uss_mb'] for sample in worker_samples)
+                                    / len(worker_samples), 1) if worker_samples else None
+    }
+
+def format_memory_report(report):
+    lines = [f"{'process':>24} {'RSS MB':>9} {'PSS MB':>9} {'unique MB':>10} {'shared MB':>10}"]
+    for name, sample in report['processes'].items():
+        lines.append(f"{name:>24} {sample['rss_mb']:>9.1f} {sample['pss_mb']:>9.1f} "
+                     f"{sample['uss_mb']:>10.1f} {sample['shared_mb']:>10.1f}")
+    lines.append(f"{report['workers']} workers: {report['worker_uss_mb']:.1f} MB unique in total, "
+                 f"{report['total_pss_mb']:.1f} MB PSS including the parent")
+    return "\n".join(lines)
+
+def _worker(build, task, components, results):
+    if components is None:
+        components = build()
+    task(components)
+    results.put((os.getpid(), process_memory()))
+
+def measure_workers(workers, build, task, share=True):
+    """Memory report of workers processes that each run task(components).
+
+    With share=True, build() and one warm-up task run here and the workers
+    are forked from this process; otherwise each spawned worker calls
+    build() itself (build and task must then be picklable).
+    """
+    components = None
+    if share:
+        components = build()
+        task(components)
+        prepare_fork()
+        context = fork_context()
+    else:
+        context = multiprocessing.get_context('spawn')
+
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(build, task, components, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # Sample every worker before any exits, while its pages are still mapped
+    samples = dict(results.get() for _ in processes)
+    parent = process_memory() if share else None
+    for process in processes:
+        process.join()
+    if share:
+        gc.unfreeze()
+    return memory_report({f"worker {pid}": sample for pid, sample in samples.items()}, parent)
+
+def build_components(components=('qa',)):
+    """The models a pipeline worker holds: QA models and/or Whisper"""
+    built = {}
+    if 'qa' in components:
+        from qa_models import MultilingualQASystem
+        built['qa'] = preload_qa_system(MultilingualQASystem())
+    if 'whisper' in components:
+        from speech_processing import SpeechProcessor
+        built['whisper'] = preload_speech_processor(SpeechProcessor())
+    return built
+
+def answer_samples(built):
+    """One sample question per language, enough to touch every QA model's weights"""
+    from sample_questions import SAMPLE_QUESTIONS
+
+    if 'qa' in built:
+        for language in built['qa'].model_configs:
+            built['qa'].answer_question(SAMPLE_QUESTIONS[language][0], SAMPLE_CONTEXT, language)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker memory with shared vs separate model weights")
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--components', nargs='+', choices=['qa', 'whisper'], default=['qa'])
+    parser.add_argument('--baseline', action='store_true',
+                        help="Also measure spawned workers that each load their own models")
+    parser.add_argument('--output', default=None, help="Write the reports as JSON")
+    args = parser.parse_args()
+
+    build = partial(build_components, tuple(args.components))
+    reports = []
+    for workers in args.workers:
+        for share in ([True, False] if args.baseline else [True]):
+            report = measure_workers(workers, build, answer_samples, share=share)
+            report['mode'] = 'shared' if share else 'separate'
+            reports.append(report)
+            print(f"\n{report['mode'].upper()} WEIGHTS, {workers} workers")
+            print(format_memory_report(report))
+
+    print(f"\n{'mode':>10} {'workers':>8} {'mean unique MB':>15} {'total PSS MB':>13}")
+    for report in reports:
+        print(f"{report['mode']:>10} {report['workers']:>8} {report['mean_worker_uss_mb']:>15.1f} "
+              f"{report['total_pss_mb']:>13.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
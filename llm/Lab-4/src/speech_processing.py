@@ -1,41 +1,196 @@
-import whisper
-from gtts import gTTS
-import pyttsx3
+from audio_preprocessing import TRIM_TOP_DB, audio_duration, iter_audio_windows, preprocess_audio
+from collections import OrderedDict
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
+import shutil
+import string
+import telemetry
+import tempfile
+import threading
+
+# whisper, torch, gtts and pyttsx3 are imported where they are first needed,
+# so TTS-only and text-only runs never pay for loading them
+
+# Map our locale codes to the language codes Whisper and gTTS expect
+LANG_MAP = {
+    'en-US': 'en',
+    'mr-IN': 'mr',  # Marathi
+    'fr-FR': 'fr'   # French
+}
+
+# Recordings longer than this are transcribed window by window instead of
+# being decoded whole
+LONG_AUDIO_SECONDS = 60
+# Tokens of the previous windows given to Whisper as the prompt for the next one
+STREAM_PROMPT_TOKENS = 223
+# Punctuation ignored when matching words repeated across a window overlap
+_STITCH_PUNCTUATION = string.punctuation + "“”‘’«»।"
+
+def audio_file_hash(path, block_size=1 << 20):
+    """SHA-256 of an audio file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _stitch_words(text):
+    return [word.strip(_STITCH_PUNCTUATION).lower() for word in text.split()]
+
+def stitch_transcripts(transcript, addition, max_overlap_words=20, max_skip=2):
+    """Append the text of the next window, dropping words repeated from the overlap.
+    
+    The longest run (at least two words) of transcript's last words that
+    reappears at the start of addition is removed from addition, allowing up
+    to max_skip garbled words before it where the window cut a word in half.
+    """
+    addition = addition.strip()
+    if not transcript:
+        return addition
+    if not addition:
+        return transcript
+    
+    previous = _stitch_words(transcript)[-max_overlap_words:]
+    words = addition.split()
+    current = _stitch_words(addition)[:max_overlap_words + max_skip]
+    for size in range(min(len(previous), len(current)), 1, -1):
+        for skip in range(min(max_skip, len(current) - size) + 1):
+            if current[skip:skip + size] == previous[-size:]:
+                return " ".join([transcript] + words[skip + size:])
+    return f"{transcript} {addition}"
 
 class SpeechProcessor:
-    def __init__(self):
-        print("Loading Whisper model (this may take a few minutes on first run)...")
-        self.whisper_model = whisper.load_model("base")
+    def __init__(self, whisper_model_name="base", transcription_cache_size=256,
+                 transcription_cache_dir=None, load_whisper=True, tts_cache_dir=None,
+                 tts_endpoint=None, audio_cache_dir=None, trim_top_db=TRIM_TOP_DB):
+        """transcription_cache_dir enables an on-disk layer under the in-memory LRU.
         
-        try:
-            self.offline_tts = pyttsx3.init()
-        except:
-            self.offline_tts = None
+        Audio is decoded and silence-trimmed in process (see
+        audio_preprocessing) and Whisper receives the array; audio_cache_dir
+        keeps the decoded arrays as memory-mapped .npy files and
+        trim_top_db=None disables trimming.
+        
+        Whisper is loaded on the first transcription that misses the cache;
+        load_whisper=False disables it entirely for TTS-only use.
+        tts_cache_dir enables the content-addressed audio cache, and
+        tts_endpoint swaps gTTS for an HTTP server speaking the same
+        protocol as local_tts_server.py (e.g. for offline load tests).
+        """
+        self.whisper_model_name = whisper_model_name
+        self.load_whisper = load_whisper
+        self._whisper_model = None
+        
+        self.transcription_cache = OrderedDict()
+        self.transcription_cache_size = transcription_cache_size
+        self.transcription_cache_dir = transcription_cache_dir
+        self.transcription_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self.audio_cache_dir = audio_cache_dir
+        self.trim_top_db = trim_top_db
+        
+        self.tts_cache_dir = tts_cache_dir
+        self.tts_endpoint = tts_endpoint
+        self.tts_stats = {'hits': 0, 'misses': 0}
+        self.offline_tts = None  # OfflineTTSWorker, started on first fallback
         
         print("Speech processing initialized successfully!")
     
+    @property
+    def whisper_model(self):
+        if self._whisper_model is None and self.load_whisper:
+            import whisper
+            
+            print("Loading Whisper model (this may take a few minutes on first run)...")
+            self._whisper_model = whisper.load_model(self.whisper_model_name)
+        return self._whisper_model
+    
+    def _transcription_key(self, file_hash, whisper_lang, variant=None):
+        """Cache key: audio content hash + Whisper model name + language + preprocessing
+        
+        variant names how the audio was fed to Whisper; by default the
+        silence trimming setting.
+        """
+        key = f"{file_hash}:{self.whisper_model_name}:{whisper_lang}"
+        if variant is None and self.trim_top_db is not None:
+            variant = f"trim{self.trim_top_db}"
+        if variant:
+            key += f":{variant}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+    
+    def load_audio(self, audio_file_path, file_hash=None):
+        """16 kHz float32 samples of a file, decoded and trimmed once"""
+        return preprocess_audio(audio_file_path, cache_dir=self.audio_cache_dir,
+                                file_hash=file_hash, top_db=self.trim_top_db)
+    
+    def _transcribe_audio(self, audio, whisper_lang, key):
+        """Run Whisper's windowed transcribe on samples and cache the text"""
+        with telemetry.span('transcription'):
+            result = self.whisper_model.transcribe(
+                audio, 
+                language=whisper_lang,
+                verbose=False
+            )
+        
+        transcribed_text = result["text"].strip()
+        self._store_transcription(key, transcribed_text)
+        return transcribed_text
+    
+    def _get_cached_transcription(self, key):
+        if key in self.transcription_cache:
+            self.transcription_cache.move_to_end(key)
+            self.transcription_stats['memory_hits'] += 1
+            return self.transcription_cache[key]
+        
+        if self.transcription_cache_dir:
+            cache_path = os.path.join(self.transcription_cache_dir, f"{key}.txt")
+            if os.path.exists(cache_path):
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                self.transcription_stats['disk_hits'] += 1
+                self._store_transcription(key, text, write_disk=False)
+                return text
+        
+        self.transcription_stats['misses'] += 1
+        return None
+    
+    def _store_transcription(self, key, text, write_disk=True):
+        self.transcription_cache[key] = text
+        self.transcription_cache.move_to_end(key)
+        while len(self.transcription_cache) > self.transcription_cache_size:
+            self.transcription_cache.popitem(last=False)
+        
+        if write_disk and self.transcription_cache_dir:
+            os.makedirs(self.transcription_cache_dir, exist_ok=True)
+            cache_path = os.path.join(self.transcription_cache_dir, f"{key}.txt")
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+    
     def speech_to_text(self, audio_file_path, language_code=None):
         """Convert speech to text using OpenAI Whisper (free)"""
+        duration = audio_duration(audio_file_path) if os.path.exists(audio_file_path) else None
+        if duration is not None and duration > LONG_AUDIO_SECONDS:
+            # Long recordings are never decoded whole
+            for partial in self.speech_to_text_stream(audio_file_path, language_code):
+                pass
+            return partial['transcript']
+        
         try:
-            lang_map = {
-                'en-US': 'en',
-                'mr-IN': 'mr',  # Marathi
-                'fr-FR': 'fr'   # French
-            }
+            whisper_lang = LANG_MAP.get(language_code, None)
             
-            whisper_lang = lang_map.get(language_code, None)
+            file_hash = audio_file_hash(audio_file_path)
+            key = self._transcription_key(file_hash, whisper_lang)
+            cached = self._get_cached_transcription(key)
+            if cached is not None:
+                print(f"Transcription (cached): {cached}")
+                return cached
             
             print(f"Transcribing audio in {whisper_lang}...")
             
-            # Transcribe with Whisper
-            result = self.whisper_model.transcribe(
-                audio_file_path, 
-                language=whisper_lang,
-                verbose=False
-            )
-            
-            transcribed_text = result["text"].strip()
+            # Whisper gets the preprocessed samples rather than the file path
+            audio = self.load_audio(audio_file_path, file_hash)
+            transcribed_text = self._transcribe_audio(audio, whisper_lang, key)
             print(f"Transcription: {transcribed_text}")
             return transcribed_text
         
@@ -43,32 +198,221 @@ class SpeechProcessor:
             print(f"Error in speech recognition: {e}")
             return f"Could not transcribe audio: {e}"
     
+    def speech_to_text_stream(self, audio_file_path, language_code=None, window_seconds=30.0,
+                              overlap_seconds=2.0):
+        """Transcribe a recording window by window, yielding partial transcripts
+        
+        The file is decoded as a stream of overlapping windows (at most one
+        window of audio is held at a time). After each window a dict is
+        yielded with the window's span ('start_s', 'end_s'), its own 'text',
+        the 'transcript' stitched so far and 'final' set on the last one, so
+        callers can show progress and start QA as soon as 'final' arrives.
+        The stitched transcript shares the transcription cache.
+        """
+        try:
+            import whisper
+            
+            whisper_lang = LANG_MAP.get(language_code, None)
+            window_seconds = min(window_seconds, whisper.audio.CHUNK_LENGTH)
+            key = self._transcription_key(
+                audio_file_hash(audio_file_path), whisper_lang,
+                variant=f"stream{window_seconds:g}/{overlap_seconds:g}"
+            )
+            cached = self._get_cached_transcription(key)
+            if cached is not None:
+                yield {'start_s': 0.0, 'end_s': None, 'text': cached, 'transcript': cached, 'final': True}
+                return
+            
+            print(f"Streaming transcription in {whisper_lang}...")
+            transcript = ""
+            prompt_tokens = []
+            windows = iter_audio_windows(audio_file_path, window_seconds, overlap_seconds)
+            current = next(windows, None)
+            if current is None:
+                # An empty recording still ends with a final (empty) transcript
+                yield {'start_s': 0.0, 'end_s': 0.0, 'text': "", 'transcript': "", 'final': True}
+                return
+            while current is not None:
+                start_s, audio = current
+                following = next(windows, None)
+                
+                mel = whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(audio), n_mels=self.whisper_model.dims.n_mels
+                ).to(self.whisper_model.device)
+                options = whisper.DecodingOptions(
+                    language=whisper_lang,
+                    without_timestamps=True,
+                    prompt=prompt_tokens[-STREAM_PROMPT_TOKENS:] or None,
+                    fp16=self.whisper_model.device.type == 'cuda'
+                )
+                with telemetry.span('transcription'):
+                    result = whisper.decode(self.whisper_model, mel, options)
+                text = result.text.strip()
+                prompt_tokens = (prompt_tokens + result.tokens)[-STREAM_PROMPT_TOKENS:]
+                transcript = stitch_transcripts(transcript, text)
+                
+                if following is None:
+                    self._store_transcription(key, transcript)
+                yield {'start_s': start_s, 'end_s': start_s + len(audio) / whisper.audio.SAMPLE_RATE,
+                       'text': text, 'transcript': transcript, 'final': following is None}
+                current = following
+        
+        except Exception as e:
+            print(f"Error in speech recognition: {e}")
+            message = f"Could not transcribe audio: {e}"
+            yield {'start_s': None, 'end_s': None, 'text': "", 'transcript': message, 'final': True}
+    
+    def speech_to_text_batch(self, audio_file_paths, language_code=None, batch_size=8):
+        """Transcribe several short clips with one batched Whisper decode per batch
+        
+        Clips up to 30 seconds (after silence trimming) are padded into a
+        single mel batch; longer clips fall back to the regular chunked
+        transcribe call, and recordings over LONG_AUDIO_SECONDS to the
+        streaming one. Results are returned in input order. The batched
+        decode has no temperature fallback, so its transcripts are cached
+        under their own keys rather than shared with speech_to_text.
+        """
+        whisper_lang = LANG_MAP.get(language_code, None)
+        results = [None] * len(audio_file_paths)
+        variant = "batch" if self.trim_top_db is None else f"batch:trim{self.trim_top_db}"
+        
+        pending = []
+        for i, path in enumerate(audio_file_paths):
+            try:
+                file_hash = audio_file_hash(path)
+                key = self._transcription_key(file_hash, whisper_lang, variant=variant)
+            except Exception as e:
+                print(f"Error in speech recognition: {e}")
+                results[i] = f"Could not transcribe audio: {e}"
+                continue
+            cached = self._get_cached_transcription(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, path, file_hash, key))
+        
+        if not pending:
+            return results
+        
+        import torch
+        import whisper
+        
+        for start in range(0, len(pending), batch_size):
+            batch = []
+            for i, path, file_hash, key in pending[start:start + batch_size]:
+                try:
+                    duration = audio_duration(path)
+                    if duration is not None and duration > LONG_AUDIO_SECONDS:
+                        results[i] = self.speech_to_text(path, language_code)
+                        continue
+                    audio = self.load_audio(path, file_hash)
+                    if len(audio) > whisper.audio.N_SAMPLES:
+                        # Decoded by transcribe, so cached under speech_to_text's key
+                        transcribe_key = self._transcription_key(file_hash, whisper_lang)
+                        results[i] = self._get_cached_transcription(transcribe_key)
+                        if results[i] is None:
+                            results[i] = self._transcribe_audio(audio, whisper_lang, transcribe_key)
+                        continue
+                except Exception as e:
+                    print(f"Error in speech recognition: {e}")
+                    results[i] = f"Could not transcribe audio: {e}"
+                    continue
+                mel = whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(audio), n_mels=self.whisper_model.dims.n_mels
+                )
+                batch.append((i, key, mel))
+            
+            if not batch:
+                continue
+            
+            print(f"Transcribing {len(batch)} clips in {whisper_lang}...")
+            mels = torch.stack([mel for _, _, mel in batch]).to(self.whisper_model.device)
+            options = whisper.DecodingOptions(
+                language=whisper_lang,
+                without_timestamps=True,
+                fp16=self.whisper_model.device.type == 'cuda'
+            )
+            try:
+                with telemetry.span('transcription'):
+                    decoded = whisper.decode(self.whisper_model, mels, options)
+            except Exception as e:
+                print(f"Error in speech recognition: {e}")
+                for i, _, _ in batch:
+                    results[i] = f"Could not transcribe audio: {e}"
+                continue
+            
+            for (i, key, _), result in zip(batch, decoded):
+                text = result.text.strip()
+                self._store_transcription(key, text)
+                results[i] = text
+        
+        return results
+    
     def text_to_speech(self, text, language_code, output_path):
         """Convert text to speech using multiple free methods"""
+        tts_lang = LANG_MAP.get(language_code, 'en')
+        online_engine = f"http:{self.tts_endpoint}" if self.tts_endpoint else 'gtts'
+        
+        if self._copy_cached_audio(text, tts_lang, online_engine, output_path):
+            return True
         
         # Try gTTS first (Google Text-to-Speech - free, no credentials)
-        if self._try_gtts(text, language_code, output_path):
+        with telemetry.span('tts'):
+            if self.tts_endpoint:
+                online_ok = self._try_http_tts(text, tts_lang, output_path)
+            else:
+                online_ok = self._try_gtts(text, language_code, output_path)
+        if online_ok:
+            self._store_cached_audio(text, tts_lang, online_engine, output_path)
             return True
         
         # Fallback to offline TTS
         print("gTTS failed, trying offline TTS...")
-        if self._try_offline_tts(text, output_path):
+        wav_path = output_path.replace('.mp3', '.wav')
+        if self._copy_cached_audio(text, tts_lang, 'pyttsx3', wav_path):
+            return True
+        with telemetry.span('tts'):
+            offline_ok = self._try_offline_tts(text, output_path)
+        if offline_ok:
+            self._store_cached_audio(text, tts_lang, 'pyttsx3', wav_path)
             return True
         
         print("All TTS methods failed")
         return False
     
+    def _tts_cache_path(self, text, tts_lang, engine, output_path):
+        key = hashlib.sha256(f"{engine}:{tts_lang}:{text}".encode('utf-8')).hexdigest()
+        extension = os.path.splitext(output_path)[1]
+        return os.path.join(self.tts_cache_dir, f"{key}{extension}")
+    
+    def _copy_cached_audio(self, text, tts_lang, engine, output_path):
+        """Materialize previously synthesized audio at output_path, if cached"""
+        if not self.tts_cache_dir:
+            return False
+        cache_path = self._tts_cache_path(text, tts_lang, engine, output_path)
+        if not os.path.exists(cache_path):
+            self.tts_stats['misses'] += 1
+            return False
+        
+        _copy_file(cache_path, output_path)
+        self.tts_stats['hits'] += 1
+        print(f"✓ Reused cached audio: {output_path}")
+        return True
+    
+    def _store_cached_audio(self, text, tts_lang, engine, output_path):
+        if not self.tts_cache_dir or not os.path.exists(output_path):
+            return
+        os.makedirs(self.tts_cache_dir, exist_ok=True)
+        cache_path = self._tts_cache_path(text, tts_lang, engine, output_path)
+        if not os.path.exists(cache_path):
+            _copy_file(output_path, cache_path)
+    
     def _try_gtts(self, text, language_code, output_path):
         """Try Google Text-to-Speech (gTTS)"""
         try:
-            # Map language codes
-            lang_map = {
-                'en-US': 'en',
-                'mr-IN': 'mr',  # Marathi
-                'fr-FR': 'fr'   # French
-            }
+            from gtts import gTTS
             
-            tts_lang = lang_map.get(language_code, 'en')
+            tts_lang = LANG_MAP.get(language_code, 'en')
             
             print(f"Generating speech in {tts_lang} using gTTS...")
             
@@ -83,16 +427,37 @@ class SpeechProcessor:
             print(f"gTTS failed: {e}")
             return False
     
+    def _try_http_tts(self, text, tts_lang, output_path, timeout=30):
+        """POST the text to a TTS HTTP endpoint and save the returned audio"""
+        try:
+            import urllib.request
+            
+            print(f"Generating speech in {tts_lang} using {self.tts_endpoint}...")
+            body = json.dumps({'text': text, 'lang': tts_lang}).encode('utf-8')
+            request = urllib.request.Request(
+                self.tts_endpoint, data=body, headers={'Content-Type': 'application/json'}
+            )
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                audio = response.read()
+            with open(output_path, 'wb') as f:
+                f.write(audio)
+            
+            print(f"✓ Generated audio using {self.tts_endpoint}: {output_path}")
+            return True
+        
+        except Exception as e:
+            print(f"HTTP TTS failed: {e}")
+            return False
+    
     def _try_offline_tts(self, text, output_path):
         """Try offline TTS as backup"""
         try:
             if self.offline_tts is None:
-                return False
+                self.offline_tts = OfflineTTSWorker()
             
             wav_path = output_path.replace('.mp3', '.wav')
             
-            self.offline_tts.save_to_file(text, wav_path)
-            self.offline_tts.runAndWait()
+            self.offline_tts.synthesize(text, wav_path)
             
             print(f"Generated audio using offline TTS: {wav_path}")
             return True
@@ -100,3 +465,125 @@ class SpeechProcessor:
         except Exception as e:
             print(f"Offline TTS failed: {e}")
             return False
+    
+    def close(self):
+        """Stop the offline TTS worker process, if it was started"""
+        if self.offline_tts is not None:
+            self.offline_tts.close()
+            self.offline_tts = None
+
+def _copy_file(source, destination):
+    """Copy source to destination through a temporary file and an atomic rename.
+
+    The TTS engines write their output files in place, so an output path
+    must never share its inode with a cache entry (as a hard link would).
+    The rename also keeps concurrent TTS workers from seeing half-copied audio.
+    """
+    directory, name = os.path.split(destination)
+    fd, temp_path = tempfile.mkstemp(dir=directory or '.', prefix=f".{name}.")
+    os.close(fd)
+    try:
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _offline_tts_loop(requests, responses):
+    """Worker process body: one pyttsx3 engine serving queued requests"""
+    try:
+        import pyttsx3
+        
+        engine = pyttsx3.init()
+    except Exception as e:
+        engine = None
+        init_error = str(e)
+    
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        
+        # Drain whatever else is queued so one runAndWait serves the batch
+        batch = [request]
+        while True:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                requests.put(None)
+                break
+            batch.append(request)
+        
+        if engine is None:
+            for request_id, _, _ in batch:
+                responses.put((request_id, f"pyttsx3 unavailable: {init_error}"))
+            continue
+        
+        try:
+            for _, text, wav_path in batch:
+                engine.save_to_file(text, wav_path)
+            engine.runAndWait()
+            for request_id, _, _ in batch:
+                responses.put((request_id, None))
+        except Exception as e:
+            for request_id, _, _ in batch:
+                responses.put((request_id, str(e)))
+
+class OfflineTTSWorker:
+    """Long-lived pyttsx3 process fed from a queue.
+    
+    The engine is initialised once in the worker, and requests queued while
+    it is busy are rendered together by a single runAndWait call. Safe to
+    call synthesize from several threads.
+    """
+    
+    def __init__(self):
+        context = multiprocessing.get_context('spawn')
+        self.requests = context.Queue()
+        self.responses = context.Queue()
+        self.process = context.Process(
+            target=_offline_tts_loop, args=(self.requests, self.responses), daemon=True
+        )
+        self.process.start()
+        
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._waiting = {}
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._receiver.start()
+    
+    def _receive(self):
+        while True:
+            response = self.responses.get()
+            if response is None:
+                break
+            request_id, error = response
+            with self._lock:
+                slot = self._waiting.pop(request_id, None)
+            if slot is not None:
+                slot['error'] = error
+                slot['done'].set()
+    
+    def synthesize(self, text, wav_path, timeout=120):
+        """Render text to wav_path in the worker, raising on failure"""
+        slot = {'done': threading.Event(), 'error': None}
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._waiting[request_id] = slot
+        
+        self.requests.put((request_id, text, wav_path))
+        if not slot['done'].wait(timeout):
+            with self._lock:
+                self._waiting.pop(request_id, None)
+            raise TimeoutError(f"Offline TTS timed out after {timeout}s")
+        if slot['error']:
+            raise RuntimeError(slot['error'])
+    
+    def close(self):
+        self.requests.put(None)
+        self.process.join(timeout=10)
+        self.responses.put(None)
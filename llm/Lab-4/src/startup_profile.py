@@ -0,0 +1,98 @@
+"""Report how long each component takes to import and initialise.
+
+Import costs are measured in a fresh interpreter per module, so modules
+shared between components are counted for each of them. Initialisation
+costs (loading Whisper, each QA model and the pyttsx3 engine) are only
+measured with --init, since they load full-size models.
+
+    python startup_profile.py
+    python startup_profile.py --init --output ../results/startup_profile.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# Entry points first, then the heavy third-party libraries they may pull in
+IMPORT_TARGETS = [
+    'main', 'server', 'create_comparison_table', 'metrics_engine', 'qa_models', 'speech_processing',
+    'pdf_processing', 'torch', 'transformers', 'whisper', 'pdfplumber', 'gtts', 'pyttsx3',
+    'pandas', 'rouge_score.rouge_scorer', 'sacrebleu'
+]
+
+_IMPORT_PROBE = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def import_cost(module):
+    """Seconds to import module in a fresh interpreter, or None if it fails"""
+    result = subprocess.run(
+        [sys.executable, '-c', _IMPORT_PROBE.format(module=module)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def _timed(func):
+    start = time.perf_counter()
+    try:
+        func()
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, str(e)
+
+
+def init_costs(languages):
+    """Seconds to initialise each lazily created component in this process"""
+    from qa_models import MultilingualQASystem
+    from speech_processing import SpeechProcessor
+
+    costs = {}
+    speech_processor = None
+
+    def create_speech_processor():
+        nonlocal speech_processor
+        speech_processor = SpeechProcessor()
+    costs['SpeechProcessor()'] = _timed(create_speech_processor)
+    costs['whisper model'] = _timed(lambda: speech_processor.whisper_model)
+
+    def init_pyttsx3():
+        import pyttsx3
+        pyttsx3.init()
+    costs['pyttsx3 engine'] = _timed(init_pyttsx3)
+
+    qa_system = MultilingualQASystem()
+    for language in languages:
+        costs[f"QA model ({language})"] = _timed(lambda: qa_system._get_model(language))
+    return costs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile import and initialisation cost per component")
+    parser.add_argument('--init', action='store_true',
+                        help="Also time loading Whisper, pyttsx3 and the QA models")
+    parser.add_argument('--languages', nargs='+', default=['en', 'mr', 'fr'])
+    parser.add_argument('--output', default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    report = {'imports': {}, 'init': {}}
+    print("IMPORT COST (fresh interpreter)")
+    print("-" * 50)
+    for module in IMPORT_TARGETS:
+        seconds = import_cost(module)
+        report['imports'][module] = seconds
+        print(f"{module:28} {'unavailable' if seconds is None else f'{seconds * 1000:9.1f} ms'}")
+
+    if args.init:
+        print("\nINITIALISATION COST")
+        print("-" * 50)
+        for component, (seconds, error) in init_costs(args.languages).items():
+            report['init'][component] = {'seconds': round(seconds, 3), 'error': error}
+            status = f"failed: {error}" if error else ""
+            print(f"{component:28} {seconds * 1000:9.1f} ms {status}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
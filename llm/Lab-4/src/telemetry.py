@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+import os
+import resource
+import sys
+import threading
+import time
+
+# Traces active on the current thread; spans and counts are added to all of them
+_local = threading.local()
+
+def _active_traces():
+    if not hasattr(_local, 'traces'):
+        _local.traces = []
+    return _local.traces
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        # Not Linux: fall back to the lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class PeakRSSSampler:
+    """Samples RSS in a background thread and keeps the peak seen"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+class Trace:
+    """Span durations and counters collected while the trace is active"""
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self.wall_time_s = 0.0
+        self.peak_memory_mb = 0.0
+
+    def to_dict(self):
+        return {
+            'wall_time_s': round(self.wall_time_s, 4),
+            'peak_memory_mb': round(self.peak_memory_mb, 1),
+            'spans': {name: round(seconds, 4) for name, seconds in self.spans.items()},
+            'counters': dict(self.counters)
+        }
+
+@contextmanager
+def trace(sample_memory=False):
+    """Collect every span and count recorded on this thread inside the block"""
+    current = Trace()
+    traces = _active_traces()
+    traces.append(current)
+    sampler = PeakRSSSampler(interval=0.01) if sample_memory else None
+    start = time.perf_counter()
+    try:
+        if sampler:
+            with sampler:
+                yield current
+            current.peak_memory_mb = sampler.peak_mb
+        else:
+            yield current
+    finally:
+        current.wall_time_s = time.perf_counter() - start
+        traces.remove(current)
+
+@contextmanager
+def span(name):
+    """Time a block and add its duration to the active traces"""
+    traces = _active_traces()
+    if not traces:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - start)
+
+def add_span(name, seconds):
+    """Add a duration measured elsewhere (e.g. on a helper thread) to the active traces"""
+    for active in _active_traces():
+        active.spans[name] = active.spans.get(name, 0.0) + seconds
+
+def add_count(name, value):
+    """Add to a counter (e.g. token counts) in the active traces"""
+    for active in _active_traces():
+        active.counters[name] = active.counters.get(name, 0) + value
+
+class MetricsRegistry:
+    """Aggregates trace results and writes them in Prometheus text format"""
+
+    def __init__(self, prefix='voice_qa'):
+        self.prefix = prefix
+        self.observations = {}
+        self.counters = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.observations.setdefault(key, []).append(seconds)
+
+    def inc(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_trace(self, trace_dict, **labels):
+        """Record the spans and counters of a Trace.to_dict() result"""
+        for name, seconds in trace_dict.get('spans', {}).items():
+            self.observe(name, seconds, **labels)
+        for name, value in trace_dict.get('counters', {}).items():
+            self.inc(name, value, **labels)
+        if 'wall_time_s' in trace_dict:
+            self.observe('wall_time', trace_dict['wall_time_s'], **labels)
+
+    @staticmethod
+    def _format_labels(labels, **extra):
+        pairs = list(labels) + sorted(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+    def export_prometheus(self, path):
+        """Write all metrics to a Prometheus text exposition file"""
+        lines = []
+        span_metric = f"{self.prefix}_span_seconds"
+        if self.observations:
+            lines.append(f"# HELP {span_metric} Duration of instrumented pipeline spans")
+            lines.append(f"# TYPE {span_metric} summary")
+        for (name, labels), values in sorted(self.observations.items()):
+            for quantile in (0.5, 0.95, 0.99):
+                label_text = self._format_labels(labels, span=name, quantile=quantile)
+                lines.append(f"{span_metric}{label_text} {percentile(values, quantile * 100):.6f}")
+            label_text = self._format_labels(labels, span=name)
+            lines.append(f"{span_metric}_sum{label_text} {sum(values):.6f}")
+            lines.append(f"{span_metric}_count{label_text} {len(values)}")
+
+        previous_name = None
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            if name != previous_name:
+                lines.append(f"# TYPE {metric} counter")
+                previous_name = name
+            lines.append(f"{metric}{self._format_labels(labels)} {value}")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
@@ -0,0 +1,50 @@
+import answer_cache
+from answer_cache import AnswerCache, answer_key, document_hash, normalize_question
+
+
+def test_trivially_different_questions_share_a_key():
+    doc = document_hash("Some document.")
+    assert normalize_question("  What is AI? ", 'en') == "what is ai"
+    assert answer_key("What is AI?", 'en', doc, 'model') == answer_key("what is  AI", 'en', doc, 'model')
+    assert answer_key("What is AI?", 'en', doc, 'model') != answer_key("What is AI?", 'en', doc, 'other')
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, 'time', lambda: now[0])
+    cache = AnswerCache(ttl_seconds=10)
+    cache.put('key', "answer", 'doc')
+    assert cache.get('key') == "answer"
+
+    now[0] += 11
+    assert cache.get('key') is None
+    assert cache.get_stats()['expired'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put('a', "A", 'doc')
+    cache.put('b', "B", 'doc')
+    cache.get('a')
+    cache.put('c', "C", 'doc')
+    assert cache.get('b') is None
+    assert cache.get('a') == "A"
+
+
+def test_changed_document_invalidates_its_answers(tmp_path):
+    cache = AnswerCache(db_path=str(tmp_path / 'answers.sqlite'))
+    assert not cache.track_document('en.pdf', 'v1')
+    cache.put('q1', "old answer", 'v1')
+    cache.put('q2', "other document", 'other')
+
+    assert cache.track_document('en.pdf', 'v2')
+    assert cache.get('q1') is None
+    assert cache.get('q2') == "other document"
+    cache.close()
+
+    # Both the answers and the tracked hashes persist in the SQLite tier
+    reopened = AnswerCache(db_path=str(tmp_path / 'answers.sqlite'))
+    assert reopened.get('q2') == "other document"
+    assert reopened.get_stats()['disk_hits'] == 1
+    assert not reopened.track_document('en.pdf', 'v2')
+    reopened.close()
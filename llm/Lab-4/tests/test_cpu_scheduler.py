@@ -0,0 +1,51 @@
+import pytest
+
+from cpu_scheduler import REBALANCE_WINDOW_S, CPUScheduler, parse_budgets
+
+
+def test_cores_are_split_by_worker_count():
+    scheduler = CPUScheduler(cpus=range(8))
+    plan = scheduler.allocate(asr_workers=1, qa_workers=3)
+    assert plan['cores'] == {'asr': 2, 'qa': 6}
+    assert plan['threads']['asr'] == 2
+    assert plan['threads']['qa-en'] == 2
+
+
+def test_overrides_fix_individual_budgets():
+    scheduler = CPUScheduler(cpus=range(4), overrides=parse_budgets(['qa-en=3']))
+    assert scheduler.budgets['qa-en'] == 3
+    assert scheduler.budgets['qa-fr'] == 2
+    with pytest.raises(ValueError):
+        parse_budgets(['gpu=2'])
+
+
+def test_observe_moves_a_core_toward_the_busier_stage():
+    scheduler = CPUScheduler(cpus=range(4))
+    assert not scheduler.observe({'asr': 0.0, 'qa': 0.0}, now=0.0)
+    # Within the window nothing is decided yet
+    assert not scheduler.observe({'asr': 0.1, 'qa': 1.0}, now=1.0)
+
+    assert scheduler.observe({'asr': 0.5, 'qa': REBALANCE_WINDOW_S}, now=REBALANCE_WINDOW_S)
+    assert scheduler.cores == {'asr': 1, 'qa': 3}
+    assert scheduler.utilization == {'asr': 0.1, 'qa': 1.0}
+
+    # ASR is now the bottleneck and gets its core back
+    now = 2 * REBALANCE_WINDOW_S
+    assert scheduler.observe({'asr': 0.5 + REBALANCE_WINDOW_S, 'qa': REBALANCE_WINDOW_S + 1}, now=now)
+    assert scheduler.cores == {'asr': 2, 'qa': 2}
+    assert scheduler.adjustments == 2
+
+
+def test_observe_keeps_the_split_when_stages_are_equally_busy():
+    scheduler = CPUScheduler(cpus=range(4))
+    scheduler.observe({'asr': 0.0, 'qa': 0.0}, now=0.0)
+    assert not scheduler.observe({'asr': 4.0, 'qa': 4.5}, now=REBALANCE_WINDOW_S)
+    assert scheduler.cores == {'asr': 2, 'qa': 2}
+
+
+def test_pinned_split_is_static():
+    scheduler = CPUScheduler(cpus=range(4), pin=True)
+    scheduler.observe({'asr': 0.0, 'qa': 0.0}, now=0.0)
+    assert not scheduler.observe({'asr': 0.0, 'qa': REBALANCE_WINDOW_S}, now=REBALANCE_WINDOW_S)
+    assert scheduler.stage_cpus('asr') == {0, 1}
+    assert scheduler.stage_cpus('qa') == {2, 3}
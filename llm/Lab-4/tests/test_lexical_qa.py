@@ -0,0 +1,42 @@
+from lexical_qa import CascadeQA, SentenceIndex, question_terms
+
+CONTEXT = ("Artificial intelligence helps doctors detect cancer in medical images. "
+           "Hospitals use scheduling software to manage staff. "
+           "Robotic surgery reduces recovery time for patients.")
+
+
+class FakeQASystem:
+    def __init__(self):
+        self.neural_calls = 0
+
+    def sentence_index(self, context, language):
+        return SentenceIndex(context, language)
+
+    def answer_question(self, question, context, language):
+        self.neural_calls += 1
+        return "neural answer"
+
+
+def test_question_words_are_not_terms():
+    assert question_terms("What is the cancer?", 'en') == {'cancer'}
+
+
+def test_best_sentence_covers_the_question():
+    index = SentenceIndex(CONTEXT, 'en')
+    sentence, confidence = index.best("What does robotic surgery reduce?")
+    assert sentence.startswith("Robotic surgery")
+    assert 0 < confidence <= 1
+    assert index.best("What is quantum chromodynamics?") == (None, 0.0)
+
+
+def test_cascade_escalates_only_unconfident_questions():
+    qa_system = FakeQASystem()
+    cascade = CascadeQA(qa_system, threshold=0.6)
+
+    assert cascade.answer_question("Robotic surgery recovery time?", CONTEXT, 'en').startswith("Robotic")
+    assert cascade.answer_question("Who invented the stethoscope?", CONTEXT, 'en') == "neural answer"
+
+    assert qa_system.neural_calls == 1
+    stats = cascade.tier_stats()
+    assert stats['lexical']['answered'] == 1
+    assert stats['neural']['hit_rate'] == 0.5
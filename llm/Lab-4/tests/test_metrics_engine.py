@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from metrics_engine import iter_records, score_records
+
+pytest.importorskip('rouge_score')
+pytest.importorskip('sacrebleu')
+
+REFERENCES = {'en': {"What is AI?": "AI is the simulation of human intelligence by machines."}}
+
+
+def record(answer, **fields):
+    return {'question_text': "What is  AI?", 'answer': answer, **fields}
+
+
+def test_scores_against_references_and_derives_throughput():
+    records = [
+        ('en', record("AI is the simulation of human intelligence by machines.", wall_time_s=1.0,
+                      question_source='audio', output_tokens=20, timings={'question_answering': 2.0})),
+        ('en', {'question_text': "Unreferenced?", 'answer': "Unable to find an answer", 'wall_time_s': 3.0}),
+    ]
+    metrics = score_records(records, REFERENCES, workers=1)['en']
+
+    assert metrics['questions'] == 2
+    assert metrics['referenced'] == 1
+    assert metrics['rouge1_avg'] == 1.0
+    assert metrics['bleu_avg'] == pytest.approx(100.0)
+    assert metrics['bleu_corpus'] == pytest.approx(100.0)
+    assert metrics['audio_input_success'] == 50.0
+    assert metrics['answer_quality'] == 2.5
+    assert metrics['tokens_per_second'] == 10.0
+    assert metrics['latency_p50_s'] is not None
+
+
+def test_chunked_scoring_matches_a_single_pass():
+    records = [('en', record(f"AI is machine intelligence number {i}.", wall_time_s=i / 10)) for i in range(25)]
+    single = score_records(records, REFERENCES, workers=1, chunk_size=1000)
+    chunked = score_records(records, REFERENCES, workers=1, chunk_size=4)
+    assert chunked == single
+
+
+def test_jsonl_stream_skips_documents_and_torn_lines(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    lines = [
+        json.dumps({'record_type': 'qa', 'language': 'fr', 'answer': "oui"}),
+        json.dumps({'record_type': 'document', 'language': 'fr', 'timings': {}}),
+        '{"record_type": "qa", "lang',
+    ]
+    path.write_text("\n".join(lines), encoding='utf-8')
+    assert [(language, qa['answer']) for language, qa in iter_records(str(path))] == [('fr', "oui")]
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Stage, run_pipeline
+
+
+def test_outputs_keep_input_order_across_workers():
+    def jitter(x):
+        time.sleep(0.001 * (x % 3))
+        return x
+
+    stages = [Stage('double', lambda x: x * 2, workers=3), Stage('jitter', jitter, workers=2)]
+    assert run_pipeline(range(30), stages, queue_size=2) == [x * 2 for x in range(30)]
+
+
+def test_on_result_receives_every_item():
+    seen = []
+    assert run_pipeline(range(10), [Stage('inc', lambda x: x + 1)], on_result=seen.append) == []
+    assert sorted(seen) == list(range(1, 11))
+
+
+def test_stage_failure_is_raised_after_the_pipeline_drains():
+    processed = []
+
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    stages = [Stage('check', fail_on_three), Stage('collect', processed.append)]
+    with pytest.raises(RuntimeError, match="Stage 'check' failed") as excinfo:
+        run_pipeline(range(6), stages)
+    assert isinstance(excinfo.value.__cause__, ValueError)
+    # The failed item skips the later stages; the others still go through
+    assert sorted(processed) == [0, 1, 2, 4, 5]
+
+
+def test_on_result_error_stops_the_stages():
+    def slow(x):
+        time.sleep(0.01)
+        return x
+
+    def on_result(item):
+        raise KeyError(item)
+
+    start = time.perf_counter()
+    with pytest.raises(KeyError):
+        run_pipeline(range(100), [Stage('a', slow), Stage('b', slow)], queue_size=1, on_result=on_result)
+    assert time.perf_counter() - start < 5
+
+    deadline = time.perf_counter() + 5
+    while any(thread.name.startswith(('a-', 'b-', 'feeder')) for thread in threading.enumerate()):
+        assert time.perf_counter() < deadline, "pipeline threads still running"
+        time.sleep(0.05)
+
+
+def test_monitor_reports_busy_seconds_per_stage():
+    samples = []
+
+    def slow(x):
+        time.sleep(0.02)
+        return x
+
+    run_pipeline(range(10), [Stage('slow', slow), Stage('fast', lambda x: x)],
+                 monitor=samples.append, monitor_interval=0.05)
+    assert samples
+    assert set(samples[-1]) == {'slow', 'fast'}
+    assert samples[-1]['slow'] >= samples[-1]['fast']
+
+
+def test_unknown_stage_kind_is_rejected():
+    with pytest.raises(ValueError):
+        Stage('bad', lambda x: x, kind='fiber')
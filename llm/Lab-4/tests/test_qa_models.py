@@ -0,0 +1,25 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+from qa_models import decode_spans
+
+
+def test_best_span_respects_the_candidate_mask_and_order():
+    start = torch.tensor([[5.0, 0.0, 4.0, 0.0, 0.0]])
+    end = torch.tensor([[0.0, 5.0, 0.0, 3.0, 0.0]])
+    # Position 0 is a question token: its high start logit must be ignored
+    mask = torch.tensor([[False, True, True, True, True]])
+
+    spans = decode_spans(start, end, mask)[0]
+    assert spans[0][:2] == (2, 3)
+    assert all(s <= e for s, e, _, _ in spans)
+    assert all(s > 0 and e > 0 for s, e, _, _ in spans)
+    assert [span[2] for span in spans] == sorted((span[2] for span in spans), reverse=True)
+    assert 0 < spans[0][3] <= 1
+
+
+def test_spans_are_capped_at_max_answer_tokens():
+    logits = torch.zeros(1, 6)
+    mask = torch.ones(1, 6, dtype=torch.bool)
+    spans = decode_spans(logits, logits, mask, max_answer_tokens=2, n_best=50)[0]
+    assert spans and all(e - s < 2 for s, e, _, _ in spans)
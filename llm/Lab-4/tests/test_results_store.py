@@ -0,0 +1,62 @@
+import json
+
+from results_store import ResultsWriter, compact, load_completed_keys
+
+
+def make_item(number, language='en', question=None):
+    return {'lang_code': language, 'number': number, 'audio_question_path': None,
+            'question_text': question or f"Question {number}?"}
+
+
+def test_resume_skips_written_items_and_drops_a_torn_line(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    writer = ResultsWriter(path)
+    writer.write_record(make_item(1), {'answer': "one"})
+    writer.write_record(make_item(2), {'answer': "two"})
+    writer.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"record_type": "qa", "key": "en:Ques')
+
+    writer = ResultsWriter(path, resume=True)
+    assert writer.is_done(make_item(1))
+    assert writer.is_done(make_item(2))
+    assert not writer.is_done(make_item(3))
+    writer.write_record(make_item(3), {'answer': "three"})
+    writer.close()
+
+    with open(path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['number'] for line in lines] == [1, 2, 3]
+    assert len(load_completed_keys(path)) == 3
+
+
+def test_without_resume_the_stream_starts_over(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    writer = ResultsWriter(path)
+    writer.write_record(make_item(1), {'answer': "one"})
+    writer.close()
+
+    writer = ResultsWriter(path)
+    assert not writer.is_done(make_item(1))
+    writer.close()
+    assert load_completed_keys(path) == set()
+
+
+def test_compact_orders_records_and_keeps_the_last_write(tmp_path):
+    stream, output = str(tmp_path / 'results.jsonl'), str(tmp_path / 'results.json')
+    writer = ResultsWriter(stream)
+    writer.write_record(make_item(2, 'fr'), {'answer': "deux"})
+    writer.write_record(make_item(2), {'answer': "old"})
+    writer.write_record(make_item(1), {'answer': "one"})
+    writer.write_document('en', {'pdf_extraction': 0.5})
+    # The same question re-recorded: a new key, but it replaces the old record
+    writer.write_record(make_item(2, question="Question 2, again?"), {'answer': "new"})
+    writer.close()
+
+    results = compact(stream, output)
+    assert list(results) == ['en', 'fr']
+    assert results['en']['document_timings'] == {'pdf_extraction': 0.5}
+    assert [qa['answer'] for qa in results['en']['questions_answers']] == ["one", "new"]
+    assert 'key' not in results['en']['questions_answers'][0]
+    with open(output, encoding='utf-8') as f:
+        assert json.load(f) == results
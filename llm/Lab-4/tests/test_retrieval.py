@@ -0,0 +1,31 @@
+import numpy as np
+
+from retrieval import BM25Index, tokenize
+
+PASSAGES = [
+    "Artificial intelligence helps doctors detect cancer in medical images.",
+    "Hospitals use AI to schedule staff and manage beds.",
+    "कृत्रिम बुद्धिमत्ता डॉक्टरांना रोगनिदानात मदत करते.",
+]
+
+
+def test_tokenize_keeps_devanagari_words_whole():
+    assert tokenize("कृत्रिम बुद्धिमत्ता। AI") == ["कृत्रिम", "बुद्धिमत्ता", "ai"]
+
+
+def test_search_ranks_the_matching_passage_first():
+    index = BM25Index.build(PASSAGES, 'en')
+    doc_id, score, text = index.search("How does AI detect cancer?", top_k=1)[0]
+    assert doc_id == 0 and score > 0 and text == PASSAGES[0]
+
+
+def test_saved_index_loads_memory_mapped_with_the_same_results(tmp_path):
+    index = BM25Index.build(PASSAGES, 'mr', source_hash='abc')
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert isinstance(loaded.postings_docs, np.memmap)
+    assert loaded.meta == index.meta
+    assert [loaded.passage(i) for i in range(len(loaded))] == PASSAGES
+    for query in ("AI beds", "रोगनिदानात मदत", "unrelated"):
+        assert loaded.search(query) == index.search(query)